@@ -0,0 +1,160 @@
+# accounts/answer_cache.py
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, punctuation and spacing so trivially different phrasings share a key"""
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+def answer_cache_key(question: str, chunk_ids: Sequence[int], model: str) -> str:
+    """
+    An answer is reusable only when the same question was asked over the
+    same retrieved chunks (in the same order) of the same model.
+    """
+    raw = "\x1f".join([normalize_question(question), ",".join(map(str, chunk_ids)), model])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """Base class for caches of generated chat answers"""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, answer: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class InMemoryAnswerCache(AnswerCache):
+    """Per-process LRU cache with a TTL on every entry"""
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 1024):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, answer)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, answer: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+
+
+class RedisAnswerCache(AnswerCache):
+    """
+    Cache shared by every worker through Redis. Entries expire via the key
+    TTL and Redis' own ``maxmemory-policy`` (e.g. allkeys-lru) evicts under
+    memory pressure. Hit/miss counters are kept in Redis too, so the stats
+    cover all workers. When Redis is unreachable lookups count as misses.
+    """
+
+    def __init__(self, url: str, ttl: int = 3600, prefix: str = "pdfchat:answer:"):
+        import redis
+
+        super().__init__(ttl)
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._stats_key = f"{prefix}stats"
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.client.get(self.prefix + key)
+            self.client.hincrby(self._stats_key, "hits" if value is not None else "misses", 1)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, answer: str):
+        try:
+            self.client.set(self.prefix + key, answer.encode("utf-8"), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Answer cache store failed: {e}")
+
+    def stats(self) -> dict:
+        try:
+            counts = {k.decode(): int(v) for k, v in self.client.hgetall(self._stats_key).items()}
+        except Exception as e:
+            logger.warning(f"Answer cache stats unavailable: {e}")
+            counts = {}
+        hits, misses = counts.get("hits", 0), counts.get("misses", 0)
+        return {
+            "backend": "redis",
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "ttl": self.ttl,
+        }
+
+
+_cache = None
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Process-wide cache chosen by settings.PDF_ANSWER_CACHE ("memory", "redis" or "off")"""
+    global _cache
+    backend = getattr(settings, "PDF_ANSWER_CACHE", "memory")
+    if backend == "off":
+        return None
+    if _cache is None:
+        ttl = getattr(settings, "PDF_ANSWER_CACHE_TTL", 3600)
+        if backend == "redis":
+            _cache = RedisAnswerCache(getattr(settings, "REDIS_URL", "redis://localhost:6379/0"), ttl=ttl)
+        else:
+            _cache = InMemoryAnswerCache(ttl=ttl, max_entries=getattr(settings, "PDF_ANSWER_CACHE_MAX_ENTRIES", 1024))
+    return _cache
+
+
+def set_answer_cache(cache: Optional[AnswerCache]):
+    global _cache
+    _cache = cache
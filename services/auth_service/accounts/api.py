@@ -1,7 +1,8 @@
 # accounts/views.py
-from .models import User, UserProfile
-from .serializers import SignupSerializer,LoginSerializer, UserProfileSerializer
-from .kafka_producer import produce_event
+from .models import User, UserProfile, UserRole
+from .serializers import SignupSerializer,LoginSerializer, UserProfileSerializer, IngestionJobSerializer
+from .outbox import outbox_stats, publish_event
+from django.db import transaction
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import generics, status
 from rest_framework.response import Response
@@ -9,18 +10,22 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.utils import timezone
 
-import os
 from django.conf import settings
 from rest_framework.views import APIView
-from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser
-from .models import PDFDocument, PDFChunk
-from .utils import extract_text_from_pdf, chunk_text
-import google.generativeai as genai
-from django.conf import settings
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from .models import PDFChunk
+from .models import PDFDocument, IngestionJob
+from .ingestion import get_ingestion_pool, initial_stages
+from .extraction_cache import sha256_of_file
+from .retrieval import chunk_filter, retrieve_chunks, retrieve_chunks_batch
+from django.db.models import Q
+from .llm import get_llm_executor, get_llm_provider
+from concurrent.futures import as_completed
+from .answer_cache import answer_cache_key, get_answer_cache
+from .context_packer import pack_context
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+from .renderers import EventStreamRenderer
+import uuid
 import json
 import logging
 
@@ -31,35 +36,20 @@ class SignupView(generics.CreateAPIView):
     permission_classes = [AllowAny]
 
     def perform_create(self, serializer):
-        user = serializer.save()
-        
-       
-        user_data = {
-            'user_id': str(user.id),
-            'email': user.email,
-            'username': user.username,
-            'user_type': user.user_type,
-            'is_verified': user.is_verified,
-            'created_at': user.created_at.isoformat()
-        }
-        
-       
-        logger.info(f"User {user.email} created successfully. Attempting to publish Kafka event...")
-        
-        try:
-           
-            result = produce_event(
-                "user_signed_up",
-                json.dumps(user_data)
-            )
-            logger.info(f"Kafka produce_event returned: {result}")
-            logger.info(f"User signup event published for user {user.email}")
-        except Exception as e:
-            logger.error(f"Failed to publish user signup event: {str(e)}")
-            logger.error(f"Exception type: {type(e).__name__}")
-            import traceback
-            logger.error(f"Full traceback: {traceback.format_exc()}")
-        
+        # The event is committed with the user or not at all; the outbox relay sends it
+        with transaction.atomic():
+            user = serializer.save()
+            user_data = {
+                'user_id': str(user.id),
+                'email': user.email,
+                'username': user.username,
+                'user_type': user.user_type,
+                'is_verified': user.is_verified,
+                'created_at': user.created_at.isoformat()
+            }
+            publish_event("user_signed_up", user_data, key=user.id)
+
+        logger.info(f"User {user.email} created successfully; signup event recorded in the outbox")
         return user
     
     def create(self, request, *args, **kwargs):
@@ -96,13 +86,10 @@ class LoginView(TokenObtainPairView):
             }
             
             try:
-                produce_event(
-                    "user_logged_in",
-                    json.dumps(user_data)
-                )
-                logger.info(f"User login event published for user {user.email}")
+                publish_event("user_logged_in", user_data, key=user.id)
+                logger.info(f"User login event recorded for user {user.email}")
             except Exception as e:
-                logger.error(f"Failed to publish user login event: {str(e)}")
+                logger.error(f"Failed to record user login event: {str(e)}")
 
         return response
 
@@ -137,28 +124,22 @@ class EmailVerificationView(generics.GenericAPIView):
             # In a real implementation, you would validate the token
             # For now, we'll just mark the user as verified
             if not user.is_verified:
-                user.is_verified = True
-                user.verification_date = timezone.now()
-                user.save()
-                
-                # Publish verification event to Kafka
-                user_data = {
-                    'user_id': str(user.id),
-                    'email': user.email,
-                    'username': user.username,
-                    'user_type': user.user_type,
-                    'verified_at': user.verification_date.isoformat()
-                }
-                
-                try:
-                    produce_event(
-                        "user_verified",
-                        json.dumps(user_data)
-                    )
-                    logger.info(f"User verification event published for user {user.email}")
-                except Exception as e:
-                    logger.error(f"Failed to publish user verification event: {str(e)}")
-                
+                with transaction.atomic():
+                    user.is_verified = True
+                    user.verification_date = timezone.now()
+                    user.save()
+
+                    # Recorded in the outbox with the update; the relay publishes it to Kafka
+                    user_data = {
+                        'user_id': str(user.id),
+                        'email': user.email,
+                        'username': user.username,
+                        'user_type': user.user_type,
+                        'verified_at': user.verification_date.isoformat()
+                    }
+                    publish_event("user_verified", user_data, key=user.id)
+                logger.info(f"User verification event recorded for user {user.email}")
+
                 return Response({
                     'message': 'Email verified successfully. Welcome notification will be sent.'
                 }, status=status.HTTP_200_OK)
@@ -191,12 +172,9 @@ logger = logging.getLogger(__name__)
 #     "models/gemini-pro"  # ✅ ONLY model for FREE tier
 # )
 
-from openai import OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
 class UploadPDFView(APIView):
 
     logger.info("UploadPDFView initialized")
@@ -208,22 +186,164 @@ class UploadPDFView(APIView):
         if not files:
             return Response({"error": "No files uploaded"}, status=400)
 
+        owner = request.user if request.user.is_authenticated else None
+        owner_key = owner.pk if owner else request.META.get("REMOTE_ADDR")
+        case_number = (request.data.get("case_number") or "").strip()[:100]
+        # Anonymous uploads are only searchable when published
+        is_public = str(request.data.get("public", "")).lower() in ("1", "true", "yes")
+        batch_id = uuid.uuid4()
+        pool = get_ingestion_pool()
+
+        jobs = []
         for file in files:
-            doc = PDFDocument.objects.create(file=file)
+            content_hash = sha256_of_file(file)
+            existing = PDFDocument.objects.filter(content_hash=content_hash).order_by("id").first()
+            if existing is not None and existing.file.storage.exists(existing.file.name):
+                # Same bytes already on disk: point at them instead of storing a copy
+                doc = PDFDocument.objects.create(file=existing.file.name, content_hash=content_hash,
+                                                 owner=owner, case_number=case_number, is_public=is_public)
+            else:
+                doc = PDFDocument.objects.create(file=file, content_hash=content_hash,
+                                                 owner=owner, case_number=case_number, is_public=is_public)
+            job = IngestionJob.objects.create(
+                batch_id=batch_id,
+                document=doc,
+                owner=owner,
+                stages=initial_stages(),
+            )
+            jobs.append(job)
+
+        for job in jobs:
+            pool.submit(job.id, owner_key)
+
+        return Response({
+            "message": "PDFs queued for processing",
+            "batch_id": str(batch_id),
+            "jobs": [
+                {"job_id": str(job.id), "document_id": job.document_id, "file": job.document.file.name}
+                for job in jobs
+            ],
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+def visible_jobs(user):
+    """Ingestion jobs the caller may see: their own, or anonymous uploads for anonymous callers"""
+    jobs = IngestionJob.objects.select_related("document")
+    if user.is_authenticated:
+        return jobs.filter(owner=user)
+    return jobs.filter(owner__isnull=True)
+
+
+class IngestionJobView(generics.RetrieveAPIView):
+    """Status of a background PDF ingestion job, with per-stage progress and timings"""
+    serializer_class = IngestionJobSerializer
+    lookup_url_kwarg = "job_id"
+
+    def get_queryset(self):
+        return visible_jobs(self.request.user)
+
+
+class IngestionBatchView(generics.ListAPIView):
+    """Status of every job created by one upload request"""
+    serializer_class = IngestionJobSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        return visible_jobs(self.request.user).filter(
+            batch_id=self.kwargs["batch_id"]
+        ).order_by("created_at")
+
 
-            pdf_path = os.path.join(settings.MEDIA_ROOT, doc.file.name)
-            text = extract_text_from_pdf(pdf_path)
 
-            chunks = chunk_text(text)
-            for chunk in chunks:
-                PDFChunk.objects.create(document=doc, content=chunk)
+def build_chat_messages(question, context):
+    prompt = f"""
+You are a legal mediation assistant.
+Answer ONLY using the provided context.
+Cite the chunks you rely on by their labels, e.g. [chunk 12, p. 3].
 
-        return Response({"message": "PDFs uploaded and processed successfully"})
+Context:
+{context.text}
 
+Question:
+{question}
+"""
+    return [
+        {"role": "system", "content": "You are a helpful legal assistant."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def answer_question(provider, cache, question, context):
+    """Answer from the cache when possible, otherwise ask the provider and cache the result"""
+    cache_key = answer_cache_key(question, context.chunk_ids, provider.model)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Answer cache hit for question: {question}")
+            return cached, True
+    answer = provider.complete(build_chat_messages(question, context))
+    if cache is not None and answer:
+        cache.set(cache_key, answer)
+    return answer, False
+
+
+def active_cases(user):
+    """Case numbers the user holds an active role on"""
+    return sorted(UserRole.objects.filter(user=user, is_active=True).exclude(case_number="")
+                  .values_list("case_number", flat=True).distinct())
+
+
+def access_filter(user, cases=None):
+    """
+    What a user may search: their own uploads, filings in cases they hold
+    an active role on, and documents published with ``is_public``.
+    Anonymous callers only see published documents; a missing owner never
+    grants access. Field names match on PDFDocument and PDFChunk, so it
+    applies to both.
+    """
+    if not user.is_authenticated:
+        return Q(is_public=True)
+    if cases is None:
+        cases = active_cases(user)
+    return Q(owner=user) | Q(case_number__in=cases) | Q(is_public=True)
+
+
+def request_chunk_filter(request):
+    """
+    Retrieval filter from optional document_id, case_number, page_from and
+    page_to in the request body, always narrowed by ``access_filter``.
+    Returns (filter, scope key, None) or (None, None, error response); the
+    key names the filter for retrieval's per-scope chunk id cache.
+    """
+    data = request.data
+    numbers = {}
+    for name in ("document_id", "page_from", "page_to"):
+        value = data.get(name)
+        if value in (None, ""):
+            numbers[name] = None
+            continue
+        try:
+            numbers[name] = int(value)
+        except (TypeError, ValueError):
+            return None, None, Response({"error": f"{name} must be an integer"},
+                                        status=status.HTTP_400_BAD_REQUEST)
+    case_number = (data.get("case_number") or "").strip() or None
+    metadata = chunk_filter(case_number=case_number, **numbers)
+    user = request.user
+    cases = active_cases(user) if user.is_authenticated else []
+    scope = access_filter(user, cases)
+    scope_key = (user.pk if user.is_authenticated else None, tuple(cases), case_number,
+                 numbers["document_id"], numbers["page_from"], numbers["page_to"])
+    return (scope & metadata if metadata is not None else scope), scope_key, None
 
 
 class ChatWithPDFView(APIView):
     logger.info("ChatWithPDFView initialized")
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [EventStreamRenderer]
 
     def post(self, request):
         question = request.data.get("question")
@@ -234,35 +354,180 @@ class ChatWithPDFView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 🔍 Simple retrieval (replace with vector search later)
-        chunks = PDFChunk.objects.all()[:5]
+        filters, scope_key, error = request_chunk_filter(request)
+        if error is not None:
+            return error
+
+        chunks = retrieve_chunks(question, k=settings.PDF_CHAT_TOP_K, filters=filters, cache_key=scope_key)
         logger.info(f"Retrieved {len(chunks)} chunks for question: {question}")
-        logger.info("Chunks content preview:")
-        # for c in chunks:
-        #     logger.info(c.content[:100])  # Log first 100 characters of each chunk
-        context = "\n".join(c.content for c in chunks)
-        # logger.info(f"Constructed context for question: {context}")
+        context = pack_context(chunks)
+        logger.info(
+            f"Packed {context.packed_tokens}/{context.budget} context tokens from {len(context.chunks)} chunks, "
+            f"dropped {context.dropped_tokens} over budget and {context.duplicate_tokens} duplicate"
+        )
+        provider = get_llm_provider()
+        cache = get_answer_cache()
 
-        prompt = f"""
-You are a legal mediation assistant.
-Answer ONLY using the provided context.
+        if self.wants_stream(request):
+            response = StreamingHttpResponse(
+                self.stream_answer(provider, question, context, cache),
+                content_type="text/event-stream",
+            )
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"  # let nginx pass tokens through unbuffered
+            return response
 
-Context:
-{context}
+        payload = {"citations": context.citations(), "context": context.stats()}
+        try:
+            payload["answer"], payload["cached"] = answer_question(provider, cache, question, context)
+        except Exception as e:
+            logger.error(f"Chat answer failed: {e}")
+            payload["error"] = "Answer generation failed"
+            return Response(payload, status=status.HTTP_502_BAD_GATEWAY)
+        return Response(payload)
+
+    @staticmethod
+    def wants_stream(request):
+        stream = request.data.get("stream")
+        if isinstance(stream, str):
+            stream = stream.lower() in ("1", "true", "yes")
+        return bool(stream) or "text/event-stream" in request.META.get("HTTP_ACCEPT", "")
+
+    @staticmethod
+    def stream_answer(provider, question, context, cache):
+        """Server-sent events: one ``token`` event per fragment, then ``done``"""
+        yield sse_event("sources", {
+            "chunk_ids": context.chunk_ids,
+            "citations": context.citations(),
+            "context": context.stats(),
+        })
+        cache_key = answer_cache_key(question, context.chunk_ids, provider.model)
+        cached = cache.get(cache_key) if cache is not None else None
+        if cached is not None:
+            logger.info(f"Answer cache hit for question: {question}")
+            yield sse_event("token", {"text": cached})
+            yield sse_event("done", {"model": provider.model, "cached": True})
+            return
+        parts = []
+        try:
+            for text in provider.stream(build_chat_messages(question, context)):
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            logger.error(f"Streaming chat answer failed: {e}")
+            yield sse_event("error", {"error": "Answer generation failed"})
+            return
+        # Only complete answers are cached; a client disconnect stops the generator before this
+        if cache is not None and parts:
+            cache.set(cache_key, "".join(parts))
+        yield sse_event("done", {"model": provider.model, "cached": False})
 
-Question:
-{question}
-"""
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful legal assistant."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.2,
+class AnswerCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        cache = get_answer_cache()
+        if cache is None:
+            return Response({"backend": "off"})
+        return Response(cache.stats())
+
+
+class OutboxStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(outbox_stats())
+
+
+class BatchChatView(APIView):
+    """
+    Answer a checklist of questions about one document. Retrieval for all
+    questions is a single vectorised pass; completions run concurrently on
+    the shared LLM pool. Results come back in question order, or with
+    ``stream`` as server-sent ``result`` events in completion order.
+    """
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [EventStreamRenderer]
+
+    def post(self, request):
+        document_id = request.data.get("document_id")
+        questions = request.data.get("questions")
+        max_questions = getattr(settings, "PDF_CHAT_BATCH_MAX_QUESTIONS", 50)
+
+        if not document_id:
+            return Response({"error": "document_id required"}, status=status.HTTP_400_BAD_REQUEST)
+        if (not isinstance(questions, list) or not questions
+                or not all(isinstance(q, str) and q.strip() for q in questions)):
+            return Response({"error": "questions must be a non-empty list of strings"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(questions) > max_questions:
+            return Response({"error": f"At most {max_questions} questions per batch"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        filters, scope_key, error = request_chunk_filter(request)
+        if error is not None:
+            return error
+        if not PDFDocument.objects.filter(access_filter(request.user), pk=document_id).exists():
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        retrieved = retrieve_chunks_batch(questions, k=settings.PDF_CHAT_TOP_K, filters=filters,
+                                          cache_key=scope_key)
+        contexts = [pack_context(chunks) for chunks in retrieved]
+        logger.info(
+            f"Retrieved chunks for {len(questions)} batch questions on document {document_id}, "
+            f"packed {sum(c.packed_tokens for c in contexts)} context tokens, "
+            f"dropped {sum(c.dropped_tokens for c in contexts)}"
         )
+        provider = get_llm_provider()
+        cache = get_answer_cache()
+        executor = get_llm_executor()
+        # Repeated checklist questions over the same chunks share one completion
+        by_key = {}
+        for i, (question, context) in enumerate(zip(questions, contexts)):
+            key = answer_cache_key(question, context.chunk_ids, provider.model)
+            if key not in by_key:
+                by_key[key] = (executor.submit(answer_question, provider, cache, question, context), [])
+            by_key[key][1].append(i)
+        futures = dict(by_key.values())
+
+        if ChatWithPDFView.wants_stream(request):
+            response = StreamingHttpResponse(
+                self.stream_results(futures, questions, contexts),
+                content_type="text/event-stream",
+            )
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"
+            return response
+
+        results = [None] * len(questions)
+        for future in as_completed(futures):
+            for i in futures[future]:
+                results[i] = self.result_payload(i, questions[i], contexts[i], future)
+        return Response({"document_id": document_id, "results": results})
+
+    @staticmethod
+    def result_payload(index, question, context, future):
+        payload = {
+            "index": index,
+            "question": question,
+            "chunk_ids": context.chunk_ids,
+            "pages": sorted({p for c in context.chunks for p in (c.page_start, c.page_end) if p is not None}),
+            "citations": context.citations(),
+            "context": context.stats(),
+        }
+        try:
+            payload["answer"], payload["cached"] = future.result()
+        except Exception as e:
+            logger.error(f"Batch question {index} failed: {e}")
+            payload["error"] = "Answer generation failed"
+        return payload
 
-        return Response({
-            "answer": response.choices[0].message.content
-        })
+    def stream_results(self, futures, questions, contexts):
+        try:
+            for future in as_completed(futures):
+                for i in futures[future]:
+                    yield sse_event("result", self.result_payload(i, questions[i], contexts[i], future))
+            yield sse_event("done", {"count": len(questions)})
+        finally:
+            # Client went away: drop questions that have not started yet
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,239 @@
+# accounts/benchmark.py
+
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows development machines
+    resource = None
+
+# Building blocks for synthetic filings: headings the chunker treats as
+# section starts, and the kind of tokens legal questions hinge on
+PARTIES = ["Sharma", "Iyer", "Mehta", "Khan", "Reddy", "Das", "Fernandes", "Kapoor", "Nair", "Bose"]
+STATUTES = ["Indian Penal Code", "Code of Civil Procedure", "Contract Act", "Evidence Act",
+            "Specific Relief Act", "Transfer of Property Act", "Arbitration Act"]
+HEADINGS = ["Section", "Clause", "Order", "Rule", "Article", "Paragraph"]
+PHRASES = [
+    "the petitioner submits that", "the respondent has failed to", "it is therefore prayed that",
+    "in view of the foregoing", "the learned counsel contended that", "without prejudice to",
+    "the agreement dated", "the evidence on record shows", "the court is of the view that",
+    "notwithstanding anything contained in", "the balance of convenience lies with",
+    "the suit property situated at", "the cheque was dishonoured on", "the witness deposed that",
+    "no documentary proof was produced", "the interim order shall continue", "costs are awarded to",
+]
+
+
+def synthetic_pages(rng: random.Random, pages: int, lines_per_page: int = 45) -> List[List[str]]:
+    """Lines of text for each page of a plausible-looking filing"""
+    out = []
+    for page in range(pages):
+        lines = []
+        for line in range(lines_per_page):
+            if line % 15 == 0:
+                heading = f"{rng.choice(HEADINGS)} {rng.randint(1, 500)}"
+                lines.append(f"{heading}. {rng.choice(STATUTES)}")
+                continue
+            a, b = rng.sample(PARTIES, 2)
+            words = f"{rng.choice(PHRASES)} {a} v. {b} ({rng.randint(1950, 2024)}) {rng.randint(1, 12)} SCC {rng.randint(1, 999)}"
+            lines.append(f"{words[0].upper()}{words[1:]}, {rng.choice(PHRASES)} {rng.choice(PARTIES)}.")
+        out.append(lines)
+    return out
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: Sequence[Sequence[str]]):
+    """
+    Write a minimal text-only PDF: one Helvetica content stream per page
+    and a classic xref table. Enough for pypdf's text extraction without
+    pulling a PDF library into the service.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        ops.extend(f"({_pdf_escape(line)}) Tj T*" for line in lines)
+        ops.append("ET")
+        stream = "\n".join(ops).encode("cp1252", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as fh:
+        fh.write(out)
+
+
+def synthetic_questions(rng: random.Random, count: int) -> List[str]:
+    templates = [
+        "What does {h} {n} of the {s} provide?",
+        "What did the court hold in {a} v. {b}?",
+        "Was the cheque dishonoured and what relief was sought by {a}?",
+        "What did the witness depose about {a}?",
+        "Which interim order applies under {h} {n}?",
+    ]
+    questions = []
+    for _ in range(count):
+        a, b = rng.sample(PARTIES, 2)
+        questions.append(rng.choice(templates).format(
+            h=rng.choice(HEADINGS), n=rng.randint(1, 500), s=rng.choice(STATUTES), a=a, b=b))
+    return questions
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (Linux only)"""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss() -> int:
+    """Lifetime peak RSS of this process in bytes"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class RSSSampler:
+    """Samples RSS on a background thread to find the peak within one stage"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss() or 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss() or 0) or peak_rss()
+
+
+class StageRecorder:
+    """Per-operation latencies and item counts for one pipeline stage"""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.latencies: List[float] = []
+        self.items = 0
+        self.seconds = 0.0
+        self.peak_rss = 0
+
+    @contextmanager
+    def running(self):
+        started = time.perf_counter()
+        with RSSSampler() as sampler:
+            yield self
+        self.seconds += time.perf_counter() - started
+        self.peak_rss = max(self.peak_rss, sampler.peak)
+
+    @contextmanager
+    def op(self, items: int = 1):
+        started = time.perf_counter()
+        yield
+        self.record(time.perf_counter() - started, items)
+
+    def record(self, seconds: float, items: int = 1):
+        self.latencies.append(seconds)
+        self.items += items
+
+    def summary(self) -> dict:
+        ms = np.asarray(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            "ops": len(self.latencies),
+            "items": self.items,
+            "unit": self.unit,
+            "seconds": round(self.seconds, 4),
+            "throughput": round(self.items / self.seconds, 2) if self.seconds else None,
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "peak_rss_mb": round(self.peak_rss / 2 ** 20, 1),
+        }
+
+
+def git_revision(cwd: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def append_history(path: str, record: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def previous_run(path: str, params: dict) -> Optional[dict]:
+    """Latest recorded run with the same parameters"""
+    if not os.path.exists(path):
+        return None
+    match = None
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("params") == params:
+                match = record
+    return match
+
+
+def regressions(current: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Stages whose throughput fell or p95 rose by more than ``threshold``"""
+    found = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if before.get("throughput") and now.get("throughput") is not None:
+            change = now["throughput"] / before["throughput"] - 1
+            if change < -threshold:
+                found.append(f"{name}: throughput {before['throughput']} -> {now['throughput']} {now['unit']}/s "
+                             f"({change:+.0%})")
+        if before.get("p95_ms") and now["p95_ms"] / before["p95_ms"] - 1 > threshold:
+            found.append(f"{name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms "
+                         f"({now['p95_ms'] / before['p95_ms'] - 1:+.0%})")
+    return found
@@ -0,0 +1,187 @@
+# accounts/chunking.py
+
+import math
+import re
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Iterable, Iterator, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a length-based estimate
+    tiktoken = None
+
+# Headings that open a new unit in judgments, statutes and agreements
+_SECTION_PATTERN = (
+    r"(?:Section|Sec\.|Clause|Para(?:graph)?|Article|Art\.|Rule|Schedule|Order|Chapter)\s+[\dIVXLC]+"
+)
+SECTION_MARKER = re.compile(_SECTION_PATTERN, re.IGNORECASE)
+# A segment ends after sentence punctuation followed by a capital, at a
+# blank line, or just before a section marker that starts a line
+_BOUNDARY = re.compile(
+    r"(?<=[.!?;:])\s+(?=[A-Z(\[\"'])|\n\s*\n|^(?=[ \t]*(?i:" + _SECTION_PATTERN + r"))",
+    re.MULTILINE,
+)
+_WORD = re.compile(r"\w+|[^\w\s]")
+# Ends every page in the offsets chunks report (and in the text files of
+# text_store), so the last word of a page and the first of the next stay apart
+PAGE_SEPARATOR = "\n"
+
+
+class TokenCounter:
+    """
+    Counts model tokens. Uses tiktoken when it is installed and otherwise
+    estimates roughly one token per four characters of each word.
+    """
+
+    def __init__(self, encoding: str = "o200k_base"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception:
+                self._encoding = None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return sum(max(1, math.ceil(len(w) / 4)) for w in _WORD.findall(text))
+
+
+@dataclass
+class Chunk:
+    """
+    A contiguous span of the document text. ``start``/``end`` are character
+    offsets into the page texts concatenated with ``PAGE_SEPARATOR`` after
+    each page; pages are 1-based.
+    """
+    content: str
+    page_start: int
+    page_end: int
+    start: int
+    end: int
+    token_count: int
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Chunk":
+        return cls(**data)
+
+
+@dataclass
+class _Segment:
+    text: str
+    page: int
+    start: int
+    tokens: int
+    opens_section: bool
+
+
+def _segments(pages: Iterable[str], counter: TokenCounter, max_tokens: int) -> Iterator[_Segment]:
+    offset = 0
+    for page_no, page in enumerate(pages, start=1):
+        page += PAGE_SEPARATOR
+        pos = 0
+        cuts = [m.start() if m.group() == "" else m.end() for m in _BOUNDARY.finditer(page)]
+        for cut in cuts + [len(page)]:
+            if cut <= pos:
+                continue
+            # Whitespace-only pieces are kept so segments tile the text exactly
+            yield from _split_long(page[pos:cut], page_no, offset + pos, counter, max_tokens)
+            pos = cut
+        offset += len(page)
+
+
+def _split_long(piece: str, page: int, start: int, counter: TokenCounter,
+                max_tokens: int) -> Iterator[_Segment]:
+    """Yield the piece as one segment, or slices of it that fit the budget"""
+    opens = bool(SECTION_MARKER.match(piece.lstrip()))
+    tokens = counter.count(piece)
+    if tokens <= max_tokens:
+        yield _Segment(piece, page, start, tokens, opens)
+        return
+    # Cut at word starts where possible, otherwise (one huge "word") anywhere
+    cuts = [m.start() for m in re.finditer(r"(?<=\s)\S", piece)]
+    if not cuts:
+        cuts = list(range(1, len(piece)))
+    parts = math.ceil(tokens / max_tokens)
+    step = max(1, len(cuts) // parts)
+    bounds = [0] + cuts[step - 1::step][:parts - 1] + [len(piece)]
+    for i, (a, b) in enumerate(zip(bounds, bounds[1:])):
+        for seg in _split_long(piece[a:b], page, start + a, counter, max_tokens):
+            seg.opens_section = opens and i == 0 and seg.start == start
+            yield seg
+
+
+def _emit(window) -> Optional[Chunk]:
+    raw = "".join(s.text for s in window)
+    lead = len(raw) - len(raw.lstrip())
+    content = raw.strip()
+    if not content:
+        return None
+    start = window[0].start + lead
+    return Chunk(
+        content=content,
+        page_start=window[0].page,
+        page_end=window[-1].page,
+        start=start,
+        end=start + len(content),
+        token_count=sum(s.tokens for s in window),
+    )
+
+
+def iter_chunks(pages: Iterable[str], max_tokens: int = 400, overlap_tokens: int = 50,
+                min_section_fill: float = 0.5,
+                counter: Optional[TokenCounter] = None) -> Iterator[Chunk]:
+    """
+    Lazily cut a stream of page texts into chunks of at most ``max_tokens``.
+
+    Chunks break between sentences, and preferably just before a
+    "Section"/"Clause"/"Para"-style heading once the window is at least
+    ``min_section_fill`` full. Roughly ``overlap_tokens`` of trailing
+    sentences are repeated at the start of the next chunk. Only the
+    current window of sentences is held in memory.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    counter = counter or TokenCounter()
+    window = deque()
+    window_tokens = 0
+    fresh = False  # window holds segments not yet emitted
+
+    for seg in _segments(pages, counter, max_tokens):
+        full = window_tokens + seg.tokens > max_tokens
+        section_break = seg.opens_section and window_tokens >= max_tokens * min_section_fill
+        if fresh and (full or section_break):
+            chunk = _emit(window)
+            if chunk is not None:
+                yield chunk
+            # Keep trailing sentences as overlap, but never a whole window
+            kept = deque()
+            kept_tokens = 0
+            for s in reversed(window):
+                if kept_tokens + s.tokens > overlap_tokens or len(kept) + 1 >= len(window):
+                    break
+                kept.appendleft(s)
+                kept_tokens += s.tokens
+            if section_break:
+                kept.clear()
+                kept_tokens = 0
+            window, window_tokens = kept, kept_tokens
+            while window and window_tokens + seg.tokens > max_tokens:
+                window_tokens -= window.popleft().tokens
+            fresh = False
+        window.append(seg)
+        window_tokens += seg.tokens
+        fresh = True
+
+    if fresh:
+        chunk = _emit(window)
+        if chunk is not None:
+            yield chunk
+
+
+def chunk_pages(pages: Iterable[str], max_tokens: int = 400, overlap_tokens: int = 50) -> List[Chunk]:
+    return list(iter_chunks(pages, max_tokens=max_tokens, overlap_tokens=overlap_tokens))
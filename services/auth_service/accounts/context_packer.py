@@ -0,0 +1,150 @@
+# accounts/context_packer.py
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+from django.conf import settings
+
+from .chunking import TokenCounter
+from .models import PDFChunk
+
+# Sentence-ish units; chunk overlap is cut on the same kind of boundary
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?;:])\s+|\n\s*\n")
+_WORDS = re.compile(r"\w+")
+SHINGLE_SIZE = 5
+
+_counter = None
+
+
+def get_token_counter() -> TokenCounter:
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter()
+    return _counter
+
+
+def citation_label(chunk: PDFChunk) -> str:
+    if chunk.page_start is None:
+        return f"[chunk {chunk.id}]"
+    if chunk.page_end in (None, chunk.page_start):
+        return f"[chunk {chunk.id}, p. {chunk.page_start}]"
+    return f"[chunk {chunk.id}, pp. {chunk.page_start}-{chunk.page_end}]"
+
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(_WORDS.findall(sentence.lower()))
+
+
+def _shingles(key: str) -> set:
+    words = key.split()
+    if len(words) < SHINGLE_SIZE:
+        return {key} if key else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+@dataclass
+class PackedContext:
+    """The context block sent to the model and an account of what was left out"""
+    text: str = ""
+    chunks: List[PDFChunk] = field(default_factory=list)
+    budget: int = 0
+    packed_tokens: int = 0
+    dropped_tokens: int = 0     # left out to stay within the budget
+    duplicate_tokens: int = 0   # repeated text removed before packing
+    dropped_chunk_ids: List[int] = field(default_factory=list)
+
+    @property
+    def chunk_ids(self) -> List[int]:
+        return [c.id for c in self.chunks]
+
+    def citations(self) -> List[dict]:
+        return [
+            {"chunk_id": c.id, "document_id": c.document_id, "page_start": c.page_start, "page_end": c.page_end}
+            for c in self.chunks
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "budget": self.budget,
+            "packed_tokens": self.packed_tokens,
+            "dropped_tokens": self.dropped_tokens,
+            "duplicate_tokens": self.duplicate_tokens,
+            "packed_chunk_ids": self.chunk_ids,
+            "dropped_chunk_ids": self.dropped_chunk_ids,
+        }
+
+
+def pack_context(chunks: Sequence[PDFChunk], budget: Optional[int] = None,
+                 duplicate_threshold: Optional[float] = None,
+                 min_partial: Optional[int] = None) -> PackedContext:
+    """
+    Pack retrieved chunks, best first, into at most ``budget`` tokens.
+
+    Sentences already packed from a higher-ranked chunk (the overlap
+    between neighbouring chunks, repeated boilerplate) are removed, and a
+    chunk whose remaining text is mostly covered by earlier ones, measured
+    on word shingles, is skipped. Each packed chunk is headed by a citation
+    label with its chunk id and pages. A chunk that does not fit is cut at
+    a sentence boundary when at least ``min_partial`` tokens of room are
+    left, otherwise dropped while smaller, lower-ranked chunks may still fit.
+    """
+    if budget is None:
+        budget = getattr(settings, "PDF_CONTEXT_TOKEN_BUDGET", 3000)
+    if duplicate_threshold is None:
+        duplicate_threshold = getattr(settings, "PDF_CONTEXT_DUPLICATE_THRESHOLD", 0.8)
+    if min_partial is None:
+        min_partial = getattr(settings, "PDF_CONTEXT_MIN_PARTIAL_TOKENS", 100)
+    counter = get_token_counter()
+    packed = PackedContext(budget=budget)
+    blocks, seen_sentences, seen_shingles = [], set(), set()
+
+    for chunk in chunks:
+        content = chunk.text
+        sentences = [s for s in _SENTENCE_BREAK.split(content.strip()) if s.strip()]
+        fresh, repeated = [], []
+        for sentence in sentences:
+            key = _sentence_key(sentence)
+            (repeated if key in seen_sentences else fresh).append((sentence, key))
+        shingles = set().union(*(_shingles(key) for _, key in fresh)) if fresh else set()
+        covered = len(shingles & seen_shingles) / len(shingles) if shingles else 1.0
+        if covered >= duplicate_threshold:
+            packed.duplicate_tokens += chunk.token_count or counter.count(content)
+            continue
+        if repeated:
+            packed.duplicate_tokens += counter.count(" ".join(s for s, _ in repeated))
+
+        header = citation_label(chunk)
+        header_tokens = counter.count(header) + 1
+        # The stored count is exact when nothing was trimmed
+        text_tokens = chunk.token_count if not repeated and chunk.token_count else None
+        if text_tokens is None:
+            text_tokens = counter.count(" ".join(s for s, _ in fresh))
+        room = budget - packed.packed_tokens - header_tokens
+
+        kept = fresh
+        if text_tokens > room:
+            kept, kept_tokens = [], 0
+            if room >= min_partial:
+                for sentence, key in fresh:
+                    tokens = counter.count(sentence)
+                    if kept_tokens + tokens > room:
+                        break
+                    kept.append((sentence, key))
+                    kept_tokens += tokens
+            if not kept:
+                packed.dropped_tokens += text_tokens
+                packed.dropped_chunk_ids.append(chunk.id)
+                continue
+            packed.dropped_tokens += text_tokens - kept_tokens
+            text_tokens = kept_tokens
+
+        blocks.append(f"{header}\n" + " ".join(s for s, _ in kept))
+        packed.chunks.append(chunk)
+        packed.packed_tokens += header_tokens + text_tokens
+        for _, key in kept:
+            seen_sentences.add(key)
+            seen_shingles.update(_shingles(key))
+
+    packed.text = "\n\n".join(blocks)
+    return packed
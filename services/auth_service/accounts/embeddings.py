@@ -0,0 +1,116 @@
+# accounts/embeddings.py
+
+import hashlib
+import re
+from typing import List, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_embedder = None
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise each row so that a dot product is a cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+class BaseEmbedder:
+    """Turns texts into L2-normalised float32 vectors of a fixed dimension"""
+
+    dim = 0
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the vector space so stale indexes can be detected"""
+        return f"{type(self).__name__}:{self.dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+
+class HashingEmbedder(BaseEmbedder):
+    """
+    Deterministic local embedder based on signed feature hashing of
+    unigrams and bigrams. Needs no network or model files, so it is the
+    embedder of choice for tests, benchmarks and offline development.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = int.from_bytes(
+                    hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(),
+                    "little",
+                )
+                sign = 1.0 if (h >> 63) & 1 else -1.0
+                vectors[row, h % self.dim] += sign
+        return normalize_rows(vectors)
+
+
+class OpenAIEmbedder(BaseEmbedder):
+    """Embeddings from the OpenAI embeddings endpoint"""
+
+    def __init__(self, model: str = None, dim: int = None, batch_size: int = 256):
+        from openai import OpenAI
+
+        self.model = model or getattr(settings, "PDF_EMBEDDING_MODEL", "text-embedding-3-small")
+        self.dim = dim or getattr(settings, "PDF_EMBEDDING_DIM", 1536)
+        self.batch_size = batch_size
+        self.client = OpenAI()
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{type(self).__name__}:{self.model}:{self.dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch = list(texts[start:start + self.batch_size])
+            response = self.client.embeddings.create(
+                model=self.model,
+                input=batch,
+                dimensions=self.dim,
+            )
+            for item in response.data:
+                vectors[start + item.index] = item.embedding
+        return normalize_rows(vectors)
+
+
+def get_embedder() -> BaseEmbedder:
+    """Return the process-wide embedder configured by settings.PDF_EMBEDDER"""
+    global _embedder
+    if _embedder is None:
+        path = getattr(settings, "PDF_EMBEDDER", "accounts.embeddings.OpenAIEmbedder")
+        _embedder = import_string(path)()
+    return _embedder
+
+
+def set_embedder(embedder: BaseEmbedder):
+    """Swap the process-wide embedder, e.g. for a HashingEmbedder in tests"""
+    global _embedder
+    _embedder = embedder
+
+
+def vector_to_bytes(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def bytes_to_vector(data) -> np.ndarray:
+    return np.frombuffer(bytes(data), dtype="<f4")
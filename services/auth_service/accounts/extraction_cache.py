@@ -0,0 +1,204 @@
+# accounts/extraction_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Optional
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_of_file(fileobj, block_size: int = 1024 * 1024) -> str:
+    """Hash an uploaded file (or any object with ``chunks``/``read``) without loading it whole"""
+    digest = hashlib.sha256()
+    if hasattr(fileobj, "chunks"):
+        for block in fileobj.chunks(block_size):
+            digest.update(block)
+    else:
+        for block in iter(lambda: fileobj.read(block_size), b""):
+            digest.update(block)
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def sha256_of_path(path: str) -> str:
+    with open(path, "rb") as fh:
+        return sha256_of_file(fh)
+
+
+class CachedExtraction:
+    """What the cache knows about one PDF; any part may be missing"""
+
+    def __init__(self, content_hash: str, text: Optional[str] = None,
+                 chunks: Any = None, embeddings: Optional[np.ndarray] = None,
+                 fingerprint: str = ""):
+        self.content_hash = content_hash
+        self.text = text
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.fingerprint = fingerprint
+
+    def embeddings_for(self, fingerprint: str) -> Optional[np.ndarray]:
+        """Cached embeddings, only if they came from the given embedder"""
+        if self.embeddings is not None and self.fingerprint == fingerprint:
+            return self.embeddings
+        return None
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extracted text, chunks and embeddings keyed by the
+    SHA-256 of the PDF bytes.
+
+    Each entry is a directory ``<root>/<hash[:2]>/<hash>/``. Its mtime is
+    bumped on every hit and the least recently used entries are evicted
+    whenever the total size exceeds ``max_bytes``, down to 90% of it so a
+    full cache is not walked again on the next write. The total is kept as
+    a running sum of this process's writes, so the shards are only walked
+    once at startup and when the sum says the budget is exceeded; the walk
+    also resyncs the sum with what other processes wrote.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total = None
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash)
+
+    def get(self, content_hash: str) -> Optional[CachedExtraction]:
+        if not content_hash:
+            return None
+        path = self._entry_dir(content_hash)
+        if not os.path.isdir(path):
+            self.misses += 1
+            return None
+        try:
+            entry = CachedExtraction(content_hash)
+            text_path = os.path.join(path, "text.txt")
+            if os.path.exists(text_path):
+                with open(text_path, encoding="utf-8") as fh:
+                    entry.text = fh.read()
+            chunks_path = os.path.join(path, "chunks.json")
+            if os.path.exists(chunks_path):
+                with open(chunks_path, encoding="utf-8") as fh:
+                    entry.chunks = json.load(fh)
+            meta_path = os.path.join(path, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path) as fh:
+                    entry.fingerprint = json.load(fh).get("fingerprint", "")
+                entry.embeddings = np.load(os.path.join(path, "embeddings.npy"))
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable extraction cache entry {content_hash}: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, content_hash: str, text: Optional[str] = None,
+            chunks: Any = None, embeddings: Optional[np.ndarray] = None,
+            fingerprint: str = ""):
+        """Store whichever parts are given, replacing those already cached"""
+        if not content_hash:
+            return
+        path = self._entry_dir(content_hash)
+        os.makedirs(path, exist_ok=True)
+        before = _dir_size(path)
+        if text is not None:
+            _atomic_write(os.path.join(path, "text.txt"), text.encode("utf-8"))
+        if chunks is not None:
+            _atomic_write(os.path.join(path, "chunks.json"), json.dumps(chunks).encode("utf-8"))
+        if embeddings is not None:
+            tmp = os.path.join(path, "embeddings.tmp.npy")
+            np.save(tmp, np.asarray(embeddings, dtype=np.float32))
+            os.replace(tmp, os.path.join(path, "embeddings.npy"))
+            _atomic_write(os.path.join(path, "meta.json"),
+                          json.dumps({"fingerprint": fingerprint}).encode("utf-8"))
+        os.utime(path)
+        grown = _dir_size(path) - before
+        with self._lock:
+            if self._total is not None:
+                self._total += grown
+            over = self._total is None or self._total > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its budget"""
+        with self._lock:
+            entries = []
+            total = 0
+            for shard in _scandir_dirs(self.root):
+                for entry in _scandir_dirs(shard.path):
+                    try:
+                        size = _dir_size(entry.path)
+                        entries.append((entry.stat().st_mtime, size, entry.path))
+                    except FileNotFoundError:
+                        # Evicted by another process mid-walk
+                        continue
+                    total += size
+            if total > self.max_bytes:
+                target = int(self.max_bytes * 0.9)
+                for _, size, path in sorted(entries):
+                    shutil.rmtree(path, ignore_errors=True)
+                    total -= size
+                    logger.info(f"Evicted extraction cache entry {os.path.basename(path)} ({size} bytes)")
+                    if total <= target:
+                        break
+            self._total = total
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "max_bytes": self.max_bytes}
+
+
+def _scandir_dirs(path):
+    try:
+        return [e for e in os.scandir(path) if e.is_dir()]
+    except FileNotFoundError:
+        return []
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for f in os.scandir(path):
+        try:
+            if f.is_file():
+                total += f.stat().st_size
+        except FileNotFoundError:
+            # A temporary file renamed into place meanwhile
+            continue
+    return total
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.{time.monotonic_ns()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+_cache = None
+
+
+def get_extraction_cache() -> ExtractionCache:
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache(
+            root=str(getattr(settings, "PDF_CACHE_DIR", os.path.join(settings.BASE_DIR, "pdf_cache"))),
+            max_bytes=getattr(settings, "PDF_CACHE_MAX_BYTES", 2 * 1024 ** 3),
+        )
+    return _cache
@@ -0,0 +1,335 @@
+# accounts/ingestion.py
+
+import logging
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .chunking import Chunk, iter_chunks
+from .chunk_store import store_chunks
+from .embeddings import get_embedder
+from .extraction_cache import get_extraction_cache
+from .models import IngestionJob, PDFChunk
+from .retrieval import index_chunks
+from .text_store import TEXT_LAYOUT, TextWriter, open_text, text_name_for
+from .utils import count_pdf_pages, iter_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('extract', 'chunk', 'embed', 'store')
+
+
+def initial_stages() -> dict:
+    return {
+        name: {'status': 'pending', 'done': 0, 'total': None, 'seconds': None}
+        for name in STAGES
+    }
+
+
+class JobReporter:
+    """Records per-stage progress and timings on an IngestionJob row"""
+
+    def __init__(self, job: IngestionJob, min_interval: float = 0.5):
+        self.job = job
+        self.min_interval = min_interval
+        self._last_save = 0.0
+        self.job.stages = initial_stages()
+
+    def save(self, force=False):
+        now = time.monotonic()
+        if force or now - self._last_save >= self.min_interval:
+            self.job.save(update_fields=['status', 'stage', 'stages', 'metrics', 'error',
+                                         'started_at', 'finished_at'])
+            self._last_save = now
+
+    def begin(self, name: str, total=None) -> dict:
+        info = self.job.stages[name]
+        info.update(status='running', total=total)
+        self.job.stage = name
+        self.save(force=True)
+        return info
+
+    def end(self, name: str, seconds: float, failed: bool = False):
+        info = self.job.stages[name]
+        info['seconds'] = round(seconds, 4)
+        if failed:
+            info['status'] = 'failed'
+        else:
+            info['status'] = 'done'
+            if info['total'] is None:
+                info['total'] = info['done']
+        self.save(force=True)
+
+    @contextmanager
+    def stage(self, name: str, total=None):
+        info = self.begin(name, total)
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield info
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.end(name, time.perf_counter() - started, failed=failed)
+
+    def skip(self, name: str, done: int = 0):
+        """Mark a stage as satisfied from the extraction cache"""
+        self.job.stages[name].update(status='cached', done=done, total=done, seconds=0.0)
+
+    def progress(self, info: dict, done: int, total=None):
+        info['done'] = done
+        if total is not None:
+            info['total'] = total
+        self.save()
+
+
+def extract_and_chunk(pdf_path: str, reporter: JobReporter, max_tokens: int,
+                      overlap_tokens: int, writer: Optional[TextWriter] = None) -> List[Chunk]:
+    """
+    Stream pages from the extractor straight into the chunker, so only the
+    pages in flight and the current chunk window are held as text. With a
+    ``writer`` each page is also appended to the document's text file.
+    Time spent waiting on the extractor is booked to the extract stage and
+    the rest to the chunk stage.
+    """
+    extract_info = reporter.begin('extract', total=count_pdf_pages(pdf_path))
+    chunk_info = reporter.begin('chunk')
+    extract_seconds = 0.0
+
+    def timed_pages():
+        nonlocal extract_seconds
+        pages = iter_pdf_pages(pdf_path)
+        done = 0
+        while True:
+            started = time.perf_counter()
+            page = next(pages, None)
+            extract_seconds += time.perf_counter() - started
+            if page is None:
+                return
+            done += 1
+            reporter.progress(extract_info, done)
+            if writer is not None:
+                writer.add_page(page)
+            yield page
+
+    started = time.perf_counter()
+    chunks = []
+    try:
+        for chunk in iter_chunks(timed_pages(), max_tokens=max_tokens, overlap_tokens=overlap_tokens):
+            chunks.append(chunk)
+            reporter.progress(chunk_info, len(chunks))
+    except Exception:
+        elapsed = time.perf_counter() - started
+        reporter.end('extract', extract_seconds, failed=True)
+        reporter.end('chunk', elapsed - extract_seconds, failed=True)
+        raise
+    elapsed = time.perf_counter() - started
+    reporter.end('extract', extract_seconds)
+    reporter.end('chunk', elapsed - extract_seconds)
+    return chunks
+
+
+def run_ingestion(job_id):
+    """Run every ingestion stage for one job; executed on a pool thread"""
+    close_old_connections()
+    try:
+        job = IngestionJob.objects.select_related('document').get(id=job_id)
+        job.status = 'RUNNING'
+        job.started_at = timezone.now()
+        reporter = JobReporter(job)
+        doc = job.document
+
+        try:
+            cache = get_extraction_cache()
+            cached = cache.get(doc.content_hash)
+            embedder = get_embedder()
+
+            chunk_params = {
+                'max_tokens': getattr(settings, 'PDF_CHUNK_MAX_TOKENS', 400),
+                'overlap_tokens': getattr(settings, 'PDF_CHUNK_OVERLAP_TOKENS', 50),
+            }
+            text_name = text_name_for(doc)
+            cached_chunks = cached.chunks if cached is not None else None
+            if isinstance(cached_chunks, dict) and cached_chunks.get('params') == chunk_params \
+                    and cached_chunks.get('layout') == TEXT_LAYOUT:
+                chunks = [Chunk.from_dict(c) for c in cached_chunks['items']]
+                vectors = cached.embeddings_for(embedder.fingerprint)
+                # Shared with the earlier upload; if it is gone, chunk text goes in the database
+                text = open_text(text_name)
+                reporter.skip('extract')
+                reporter.skip('chunk', done=len(chunks))
+            else:
+                writer = TextWriter(text_name)
+                try:
+                    chunks = extract_and_chunk(doc.file.path, reporter, writer=writer, **chunk_params)
+                except Exception:
+                    writer.abort()
+                    raise
+                text = writer.close()
+                vectors = None
+                cache.put(doc.content_hash, chunks={
+                    'params': chunk_params,
+                    # Cached offsets are only valid for text files in the same layout
+                    'layout': TEXT_LAYOUT,
+                    'items': [c.to_dict() for c in chunks],
+                })
+
+            if vectors is not None and len(vectors) == len(chunks):
+                reporter.skip('embed', done=len(chunks))
+            else:
+                batch_size = getattr(settings, 'PDF_INGEST_EMBED_BATCH', 256)
+                vectors = []
+                with reporter.stage('embed', total=len(chunks)) as info:
+                    for start in range(0, len(chunks), batch_size):
+                        vectors.extend(embedder.embed([c.content for c in chunks[start:start + batch_size]]))
+                        reporter.progress(info, len(vectors))
+                if vectors:
+                    cache.put(doc.content_hash, embeddings=vectors, fingerprint=embedder.fingerprint)
+
+            if text is not None and doc.text_file != text_name:
+                doc.text_file = text_name
+                doc.save(update_fields=['text_file'])
+
+            with reporter.stage('store', total=len(chunks)) as info:
+                stored = store_chunks(doc, chunks, vectors, text=text)
+                reporter.progress(info, len(stored.rows))
+                info['chunks_per_second'] = round(stored.chunks_per_second, 1)
+                job.metrics['store'] = stored.as_metrics()
+                index_chunks(stored.rows)
+
+            job.status = 'SUCCEEDED'
+            job.metrics['chunks'] = len(chunks)
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            logger.error(f"Full traceback: {traceback.format_exc()}")
+            job.status = 'FAILED'
+            job.error = str(e)
+
+        job.stage = ''
+        job.finished_at = timezone.now()
+        job.metrics['seconds'] = round((job.finished_at - job.started_at).total_seconds(), 4)
+        reporter.save(force=True)
+        logger.info(f"Ingestion job {job_id} finished with status {job.status}")
+    finally:
+        close_old_connections()
+
+
+class IngestionWorkerPool:
+    """
+    Bounded pool of ingestion threads with per-owner fairness.
+
+    Jobs wait in one FIFO queue per owner and are dispatched round-robin
+    across owners, with at most ``max_per_owner`` of one owner's jobs
+    running at a time. A user uploading a hundred exhibits therefore only
+    takes a share of the workers while other users' uploads keep moving.
+    """
+
+    def __init__(self, max_workers: int = 4, max_per_owner: int = 2):
+        self.max_workers = max_workers
+        self.max_per_owner = max_per_owner
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-ingest')
+        self._queues = OrderedDict()
+        self._running = {}
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, owner_key):
+        with self._lock:
+            self._queues.setdefault(owner_key, deque()).append(job_id)
+        self._dispatch()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'active': self._active,
+                'queued': sum(len(q) for q in self._queues.values()),
+                'owners_waiting': len(self._queues),
+            }
+
+    def _dispatch(self):
+        with self._lock:
+            while self._active < self.max_workers and self._queues:
+                owner_key = next(
+                    (key for key in self._queues
+                     if self._running.get(key, 0) < self.max_per_owner),
+                    None,
+                )
+                if owner_key is None:
+                    return
+                queue = self._queues.pop(owner_key)
+                job_id = queue.popleft()
+                if queue:
+                    # Re-append so the owner goes to the back of the rotation
+                    self._queues[owner_key] = queue
+                self._running[owner_key] = self._running.get(owner_key, 0) + 1
+                self._active += 1
+                self._executor.submit(self._run, job_id, owner_key)
+
+    def _run(self, job_id, owner_key):
+        try:
+            run_ingestion(job_id)
+        except Exception as e:
+            logger.error(f"Unhandled error in ingestion job {job_id}: {e}")
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._running[owner_key] -= 1
+                if not self._running[owner_key]:
+                    del self._running[owner_key]
+            self._dispatch()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ingestion_pool() -> IngestionWorkerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = IngestionWorkerPool(
+                max_workers=getattr(settings, 'PDF_INGEST_WORKERS', 4),
+                max_per_owner=getattr(settings, 'PDF_INGEST_MAX_PER_OWNER', 2),
+            )
+        return _pool
+
+
+def resume_jobs(pool: IngestionWorkerPool, older_than=None) -> List:
+    """
+    Finish jobs left QUEUED or RUNNING by a process that died, since the
+    worker pool only lives in memory. ``store_chunks`` commits a document's
+    chunks in one transaction, so a job whose document has chunks died
+    after storing them: they are (re)indexed, which skips ids already in
+    the indexes, and the job is marked done. Other jobs are rerun from the
+    start. Only safe while no other process is working on the same jobs;
+    ``older_than`` limits it to jobs created before that time.
+    """
+    jobs = IngestionJob.objects.filter(status__in=('QUEUED', 'RUNNING'))
+    if older_than is not None:
+        jobs = jobs.filter(created_at__lt=older_than)
+    resumed = []
+    for job in jobs.order_by('created_at'):
+        stored = list(PDFChunk.objects.select_related('document').filter(document_id=job.document_id))
+        if stored:
+            index_chunks(stored)
+            claimed = IngestionJob.objects.filter(id=job.id, status=job.status).update(
+                status='SUCCEEDED', stage='', finished_at=timezone.now())
+        else:
+            claimed = IngestionJob.objects.filter(id=job.id, status=job.status).update(
+                status='QUEUED', stage='', stages=initial_stages(), started_at=None, error='')
+            if claimed:
+                pool.submit(job.id, job.owner_id or 'anonymous')
+        if claimed:
+            resumed.append(job.id)
+    logger.info(f"Resumed {len(resumed)} ingestion jobs")
+    return resumed
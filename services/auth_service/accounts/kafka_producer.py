@@ -3,75 +3,156 @@
 
 from kafka import KafkaProducer
 from django.conf import settings
+import atexit
 import json
 import logging
+import threading
+import time
+
+import event_schema
 
 logger = logging.getLogger(__name__)
 
+
+def producer_config(**overrides):
+    """kafka-python producer settings shared by SafeKafkaProducer and the outbox relay"""
+    config = dict(
+        bootstrap_servers=[settings.KAFKA_BOOTSTRAP_SERVERS],
+        api_version=(0, 10, 1),
+        acks=getattr(settings, 'KAFKA_ACKS', 1),
+        linger_ms=getattr(settings, 'KAFKA_LINGER_MS', 20),
+        batch_size=getattr(settings, 'KAFKA_BATCH_SIZE', 64 * 1024),
+        compression_type=getattr(settings, 'KAFKA_COMPRESSION', 'gzip') or None,
+        max_block_ms=getattr(settings, 'KAFKA_MAX_BLOCK_MS', 5000),
+        request_timeout_ms=10000,
+        retries=3,
+    )
+    config.update(overrides)
+    return config
+
+
+def serialize_message(message):
+    """Bytes go out as-is, strings are assumed to be JSON already, anything else is dumped once"""
+    if isinstance(message, bytes):
+        return message
+    if isinstance(message, str):
+        return message.encode('utf-8')
+    return json.dumps(message).encode('utf-8')
+
+
+def encode_message(topic, message, event_id=None):
+    """
+    Payload dicts for events in the shared schema registry are sent in its
+    compact binary encoding; other topics keep the JSON format, with the
+    ``event_id`` added when there is one.
+    """
+    if isinstance(message, dict):
+        if topic in event_schema.registry:
+            return event_schema.encode(topic, message, event_id=event_id)
+        if event_id is not None:
+            message = {**message, 'event_id': str(event_id)}
+    return serialize_message(message)
+
+
 class SafeKafkaProducer:
+    """
+    Kafka producer for ad-hoc sends such as the ``test_kafka`` command.
+    Application events go through the outbox (``accounts.outbox``), not
+    through this class.
+
+    The connection is made lazily on first use and retried at most every
+    30 seconds, so importing this module never waits on the broker.
+    kafka-python batches sends per partition (``linger_ms``/``batch_size``)
+    on its own I/O thread; ``send_message`` hands the event over and
+    returns, ``send_and_wait`` blocks for the acknowledgement.
+    """
+
     def __init__(self):
         self.producer = None
-        # self.enabled = getattr(settings, 'KAFKA_ENABLED', False)
-        self.enabled=False
-        
+        self.enabled = getattr(settings, 'KAFKA_ENABLED', False)
+        self._connect_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._next_connect = 0.0
+        self.counters = {'sent': 0, 'delivered': 0, 'failed': 0}
+
         logger.info(f"Initializing Kafka producer. Enabled: {self.enabled}")
         logger.info(f"Kafka bootstrap servers: {getattr(settings, 'KAFKA_BOOTSTRAP_SERVERS', 'NOT SET')}")
-        
-        if self.enabled:
-            try:
-                self.producer = KafkaProducer(
-                    bootstrap_servers=[settings.KAFKA_BOOTSTRAP_SERVERS],
-                    value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                    api_version=(0, 10, 1),
-                    request_timeout_ms=10000,
-                    retries=3
-                )
-                logger.info("Kafka producer initialized successfully")
-            except Exception as e:
-                logger.warning(f"Failed to initialize Kafka producer: {e}")
-                logger.warning(f"Exception type: {type(e).__name__}")
-                import traceback
-                logger.warning(f"Full traceback: {traceback.format_exc()}")
-                self.enabled = False
-        else:
+        if not self.enabled:
             logger.info("Kafka producer disabled by configuration")
-    
-    def send_message(self, topic, message):
-        logger.debug(f"send_message called with topic: {topic}, enabled: {self.enabled}, producer: {self.producer is not None}")
-        
-        if not self.enabled or not self.producer:
-            logger.info(f"Kafka disabled. Would send to {topic}: {message}")
+
+    def _create_producer(self):
+        with self._connect_lock:
+            if self.producer is None and time.monotonic() >= self._next_connect:
+                try:
+                    self.producer = KafkaProducer(**producer_config())
+                    logger.info("Kafka producer initialized successfully")
+                except Exception as e:
+                    logger.warning(f"Failed to initialize Kafka producer: {e}")
+                    self._next_connect = time.monotonic() + 30
+        return self.producer
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.counters[name] += 1
+
+    def _record_failure(self, topic, error):
+        self._count('failed')
+        logger.error(f"Failed to deliver message to {topic}: {error}")
+
+    def _send(self, topic, message, key):
+        if not self.enabled:
+            logger.debug(f"Kafka disabled. Would send to {topic}: {message}")
+            return None
+        producer = self._create_producer()
+        if producer is None:
+            self._record_failure(topic, 'producer unavailable')
+            return None
+        try:
+            future = producer.send(topic, value=encode_message(topic, message),
+                                   key=serialize_message(key) if key is not None else None)
+        except Exception as e:
+            self._record_failure(topic, e)
+            return None
+        self._count('sent')
+        future.add_callback(lambda metadata: self._count('delivered'))
+        future.add_errback(lambda e: self._record_failure(topic, e))
+        return future
+
+    def send_message(self, topic, message, key=None):
+        """Hand an event to the producer without waiting; False if Kafka is disabled or unreachable"""
+        return self._send(topic, message, key) is not None
+
+    def send_and_wait(self, topic, message, key=None, timeout=10):
+        """Send one event and block until it is acknowledged"""
+        future = self._send(topic, message, key)
+        if future is None:
             return False
-        
         try:
-            logger.debug(f"Attempting to send message to topic {topic}")
-            
-            # Convert message to dict if it's a string
-            if isinstance(message, str):
-                message_data = json.loads(message)
-            else:
-                message_data = message
-                
-            logger.debug(f"Sending message data: {message_data}")
-            future = self.producer.send(topic, message_data)
-            logger.debug(f"Message sent, flushing...")
-            self.producer.flush(timeout=10)
-            logger.info(f"Successfully sent message to {topic}: {message_data}")
+            future.get(timeout=timeout)
             return True
         except Exception as e:
             logger.error(f"Failed to send message to {topic}: {e}")
-            logger.error(f"Exception type: {type(e).__name__}")
-            import traceback
-            logger.error(f"Full traceback: {traceback.format_exc()}")
             return False
-    
-    def close(self):
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self.counters, enabled=self.enabled)
+
+    def close(self, timeout=10):
+        """Deliver what send_message handed over, then disconnect; registered to run at exit"""
         if self.producer:
-            self.producer.close()
+            try:
+                self.producer.flush(timeout=timeout)
+                self.producer.close(timeout=timeout)
+            except Exception as e:
+                logger.warning(f"Error while closing Kafka producer: {e}")
+            self.producer = None
 
 # Global instance
 kafka_producer = SafeKafkaProducer()
+# send_message does not wait, so flush whatever is still batched when the process exits
+atexit.register(kafka_producer.close)
 
-def produce_event(topic, message):
+def produce_event(topic, message, key=None):
     """Legacy function for backward compatibility"""
-    return kafka_producer.send_message(topic, message)
+    return kafka_producer.send_message(topic, message, key=key)
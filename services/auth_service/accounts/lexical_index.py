@@ -0,0 +1,382 @@
+# accounts/lexical_index.py
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from itertools import islice, repeat
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .vector_index import atomic_save, member
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 2
+MAX_TF = 65535
+
+# Words, numbers and joined forms such as "s.302", "u/s" or "2019/1234"
+_TOKEN = re.compile(r"[a-z0-9]+(?:[./\-][a-z0-9]+)*")
+_PARTS = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "what when where which who whom why how with does did do".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms for BM25. Joined tokens are kept whole and also split
+    into their parts, so "s.302" matches both "s.302" and "302".
+    """
+    terms = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(p for p in _PARTS.findall(token) if p not in STOPWORDS)
+    return terms
+
+
+@dataclass
+class _Run:
+    """
+    Documents added since the base was built: their chunk ids and lengths,
+    and their postings sorted by term then document. Documents are numbered
+    consecutively from ``first_doc``.
+    """
+    first_doc: int
+    doc_ids: np.ndarray
+    doc_lens: np.ndarray
+    terms: np.ndarray
+    docs: np.ndarray
+    tfs: np.ndarray
+
+    @classmethod
+    def from_postings(cls, first_doc: int, doc_ids, doc_lens, terms, docs, tfs) -> "_Run":
+        terms = np.asarray(terms, dtype=np.uint32)
+        docs = np.asarray(docs, dtype=np.uint32)
+        order = np.lexsort((docs, terms))
+        return cls(first_doc, np.asarray(doc_ids, dtype=np.int64), np.asarray(doc_lens, dtype=np.uint32),
+                   terms[order], docs[order], np.asarray(tfs, dtype=np.uint16)[order])
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = np.searchsorted(self.terms, [term_id, term_id + 1])
+        return self.docs[start:end], self.tfs[start:end]
+
+    def merge(self, newer: "_Run") -> "_Run":
+        return _Run.from_postings(
+            self.first_doc,
+            np.concatenate([self.doc_ids, newer.doc_ids]),
+            np.concatenate([self.doc_lens, newer.doc_lens]),
+            np.concatenate([self.terms, newer.terms]),
+            np.concatenate([self.docs, newer.docs]),
+            np.concatenate([self.tfs, newer.tfs]),
+        )
+
+
+# Append-only files holding what was added since the base was built
+_TAIL_FILES = ("tail_vocab.txt", "tail_doc_ids.bin", "tail_doc_lens.bin",
+               "tail_terms.bin", "tail_docs.bin", "tail_tfs.bin")
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over chunk text.
+
+    Postings are stored compactly: per term, a run of uint32 document
+    numbers and uint16 term frequencies. The base, built from the whole
+    corpus, lives in CSR form (``term_offsets``/``post_docs``/``post_tfs``),
+    saved as ``.npy`` files and memory-mapped on load.
+
+    Chunks added later never touch the base. Each ``add`` becomes a small
+    sorted run that is searched alongside it; runs of similar size are
+    merged in memory, so there are only a few. On disk the new documents,
+    postings and vocabulary entries are appended to tail files, so a save
+    writes only what was added. ``build`` (``manage.py rebuild_pdf_index``)
+    folds everything into a new base.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        self.vocab: Dict[str, int] = {}
+        self.total_len = 0
+        self.n_base_terms = 0
+
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.uint32)
+        self.post_tfs = np.zeros(0, dtype=np.uint16)
+        self.base_doc_ids = np.zeros(0, dtype=np.int64)
+        self.base_doc_lens = np.zeros(0, dtype=np.uint32)
+
+        self._n_docs = 0
+        self._runs: List[_Run] = []
+        self._tail_vocab: List[str] = []   # terms added since the base was built, in id order
+        self._pending: List[_Run] = []     # runs added since the last save
+        self._saved_terms = 0              # entries of _tail_vocab already on disk
+        self._saved_bytes = dict.fromkeys(_TAIL_FILES, 0)
+        self._known = None                 # set of chunk ids, built on the first add()
+        self._base_dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._n_docs
+
+    # ---------------------------------------------------------------- build
+
+    def _term_id(self, term: str) -> int:
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            term_id = self.vocab[term] = len(self.vocab)
+            self._tail_vocab.append(term)
+        return term_id
+
+    def add(self, items: Iterable[Tuple[int, str]]):
+        """Index (chunk id, text) pairs; chunk ids already indexed are skipped"""
+        items = list(items)
+        if not items:
+            return
+        with self._lock:
+            if self._known is None:
+                self._known = set(self.base_doc_ids.tolist())
+                for run in self._runs:
+                    self._known.update(run.doc_ids.tolist())
+            first_doc = self._n_docs
+            doc_ids, doc_lens = array("q"), array("I")
+            terms, docs, tfs = array("I"), array("I"), array("H")
+            for chunk_id, text in items:
+                chunk_id = int(chunk_id)
+                if chunk_id in self._known:
+                    continue
+                self._known.add(chunk_id)
+                counts = Counter(tokenize(text))
+                doc = first_doc + len(doc_ids)
+                terms.extend(self._term_id(term) for term in counts)
+                docs.extend(repeat(doc, len(counts)))
+                tfs.extend(min(tf, MAX_TF) for tf in counts.values())
+                doc_ids.append(chunk_id)
+                doc_lens.append(sum(counts.values()))
+            if not doc_ids:
+                return
+            run = _Run.from_postings(first_doc, doc_ids, doc_lens, terms, docs, tfs)
+            self._pending.append(run)
+            self._runs.append(run)
+            # Merge while the newest run has caught up with the one before it
+            while len(self._runs) >= 2 and len(self._runs[-2].terms) <= 2 * len(self._runs[-1].terms):
+                newer, older = self._runs.pop(), self._runs.pop()
+                self._runs.append(older.merge(newer))
+            self._n_docs += len(doc_ids)
+            self.total_len += int(run.doc_lens.sum())
+
+    def build(self, items: Iterable[Tuple[int, str]]):
+        """Index everything from scratch into a new base"""
+        with self._lock:
+            self.__init__(self.k1, self.b)
+            doc_ids, doc_lens = array("q"), array("I")
+            terms, docs, tfs = array("I"), array("I"), array("H")
+            for chunk_id, text in items:
+                counts = Counter(tokenize(text))
+                terms.extend(self._term_id(term) for term in counts)
+                docs.extend(repeat(len(doc_ids), len(counts)))
+                tfs.extend(min(tf, MAX_TF) for tf in counts.values())
+                doc_ids.append(int(chunk_id))
+                doc_lens.append(sum(counts.values()))
+            terms = np.frombuffer(terms, dtype=np.uint32)
+            docs = np.frombuffer(docs, dtype=np.uint32)
+            order = np.lexsort((docs, terms))
+            self.post_docs = docs[order]
+            self.post_tfs = np.frombuffer(tfs, dtype=np.uint16)[order]
+            counts = np.bincount(terms, minlength=len(self.vocab))
+            self.term_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+            self.base_doc_ids = np.array(doc_ids, dtype=np.int64)
+            self.base_doc_lens = np.array(doc_lens, dtype=np.uint32)
+            self.n_base_terms = len(self.vocab)
+            self.total_len = int(self.base_doc_lens.sum())
+            self._n_docs = len(doc_ids)
+            self._tail_vocab = []
+            self._base_dirty = True
+
+    # --------------------------------------------------------------- search
+
+    def search_batch(self, queries: Sequence[str], k: int = 5,
+                     allowed: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Top ``k`` (chunk id, BM25 score) pairs per query, best first.
+        ``allowed`` is a sorted array of chunk ids to restrict results to.
+        """
+        with self._lock:
+            # Everything read here is replaced rather than modified by add(),
+            # so later adds never race with this search
+            n_docs, total_len, runs = self._n_docs, self.total_len, tuple(self._runs)
+            n_base_terms, offsets = self.n_base_terms, self.term_offsets
+            post_docs, post_tfs = self.post_docs, self.post_tfs
+            base_ids, base_lens = self.base_doc_ids, self.base_doc_lens
+        if not n_docs:
+            return [[] for _ in queries]
+        avg_len = (total_len / n_docs) or 1.0
+
+        results = []
+        for query in queries:
+            term_ids = {self.vocab.get(t) for t in tokenize(query)}
+            all_ids, all_scores = [], []
+            for term_id in term_ids:
+                if term_id is None:
+                    continue
+                # (chunk ids, lengths, positions into them, term frequencies) per source
+                sources = []
+                if term_id < n_base_terms:
+                    start, end = offsets[term_id], offsets[term_id + 1]
+                    sources.append((base_ids, base_lens, np.asarray(post_docs[start:end]),
+                                    np.asarray(post_tfs[start:end])))
+                for run in runs:
+                    docs, tfs = run.postings(term_id)
+                    if len(docs):
+                        sources.append((run.doc_ids, run.doc_lens, docs - run.first_doc, tfs))
+                df = sum(len(source[2]) for source in sources)
+                if not df:
+                    continue
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for ids, lens, docs, tfs in sources:
+                    chunk_ids = np.asarray(ids[docs])
+                    if allowed is not None:
+                        keep = member(chunk_ids, allowed)
+                        chunk_ids, docs, tfs = chunk_ids[keep], docs[keep], tfs[keep]
+                    if not len(chunk_ids):
+                        continue
+                    tf = tfs.astype(np.float32)
+                    norm = self.k1 * (1 - self.b + self.b * np.asarray(lens[docs], dtype=np.float32) / avg_len)
+                    all_ids.append(chunk_ids)
+                    all_scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+            if not all_ids:
+                results.append([])
+                continue
+            ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+            top = np.argsort(-scores, kind="stable")[:k]
+            results.append([(int(ids[i]), float(scores[i])) for i in top])
+        return results
+
+    def search(self, query: str, k: int = 5, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        return self.search_batch([query], k, allowed)[0]
+
+    # ---------------------------------------------------------- persistence
+
+    def save(self, path: str):
+        """
+        Persist under ``path``. The base is only rewritten after ``build``;
+        otherwise the documents, postings and vocabulary added since the
+        last save are appended to the tail files. meta.json, written last,
+        records how much of each tail file is valid, so a save that died
+        half way is cut off by the next one and never read.
+        """
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            if self._base_dirty or not os.path.exists(os.path.join(path, "meta.json")):
+                atomic_save(os.path.join(path, "term_offsets.npy"), self.term_offsets)
+                atomic_save(os.path.join(path, "post_docs.npy"), np.asarray(self.post_docs))
+                atomic_save(os.path.join(path, "post_tfs.npy"), np.asarray(self.post_tfs))
+                atomic_save(os.path.join(path, "doc_ids.npy"), np.asarray(self.base_doc_ids))
+                atomic_save(os.path.join(path, "doc_lens.npy"), np.asarray(self.base_doc_lens))
+                vocab_path = os.path.join(path, "vocab.json")
+                with open(vocab_path + ".tmp", "w", encoding="utf-8") as fh:
+                    json.dump(list(islice(self.vocab, self.n_base_terms)), fh)
+                os.replace(vocab_path + ".tmp", vocab_path)
+                # Everything since build() is in _pending, so the tail starts over
+                self._saved_terms = 0
+                self._saved_bytes = dict.fromkeys(_TAIL_FILES, 0)
+                self._base_dirty = False
+
+            pending = self._pending
+            new_terms = self._tail_vocab[self._saved_terms:]
+            data = {
+                "tail_vocab.txt": "".join(f"{term}\n" for term in new_terms).encode("utf-8"),
+                "tail_doc_ids.bin": b"".join(r.doc_ids.tobytes() for r in pending),
+                "tail_doc_lens.bin": b"".join(r.doc_lens.tobytes() for r in pending),
+                "tail_terms.bin": b"".join(r.terms.tobytes() for r in pending),
+                "tail_docs.bin": b"".join(r.docs.tobytes() for r in pending),
+                "tail_tfs.bin": b"".join(r.tfs.tobytes() for r in pending),
+            }
+            for name, chunk in data.items():
+                self._saved_bytes[name] = _append_at(os.path.join(path, name), self._saved_bytes[name], chunk)
+            self._saved_terms += len(new_terms)
+            self._pending = []
+
+            meta = {
+                "version": INDEX_FORMAT_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "docs": self._n_docs,
+                "terms": len(self.vocab),
+                "base_docs": int(len(self.base_doc_ids)),
+                "base_terms": self.n_base_terms,
+                "total_len": self.total_len,
+                "tail_bytes": self._saved_bytes,
+            }
+            meta_path = os.path.join(path, "meta.json")
+            with open(meta_path + ".tmp", "w") as fh:
+                json.dump(meta, fh)
+            os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> Optional["BM25Index"]:
+        """Load an index saved with ``save``; returns None if there is none"""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        if meta.get("version") != INDEX_FORMAT_VERSION:
+            logger.warning(f"Ignoring BM25 index at {path} with unknown format {meta.get('version')}")
+            return None
+
+        mode = "r" if mmap else None
+        index = cls(k1=meta["k1"], b=meta["b"])
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as fh:
+            index.vocab = {term: i for i, term in enumerate(json.load(fh))}
+        index.n_base_terms = len(index.vocab)
+        index.term_offsets = np.load(os.path.join(path, "term_offsets.npy"))
+        index.post_docs = np.load(os.path.join(path, "post_docs.npy"), mmap_mode=mode)
+        index.post_tfs = np.load(os.path.join(path, "post_tfs.npy"), mmap_mode=mode)
+        index.base_doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode=mode)
+        index.base_doc_lens = np.load(os.path.join(path, "doc_lens.npy"), mmap_mode=mode)
+        index.total_len = meta["total_len"]
+        index._n_docs = meta["docs"]
+
+        sizes = meta["tail_bytes"]
+
+        def tail(name, dtype):
+            with open(os.path.join(path, name), "rb") as fh:
+                return np.frombuffer(fh.read(sizes[name]), dtype=dtype)
+
+        with open(os.path.join(path, "tail_vocab.txt"), "rb") as fh:
+            for term in fh.read(sizes["tail_vocab.txt"]).decode("utf-8").splitlines():
+                index._term_id(term)
+        doc_ids = tail("tail_doc_ids.bin", np.int64)
+        if len(doc_ids):
+            index._runs.append(_Run.from_postings(
+                len(index.base_doc_ids), doc_ids, tail("tail_doc_lens.bin", np.uint32),
+                tail("tail_terms.bin", np.uint32), tail("tail_docs.bin", np.uint32),
+                tail("tail_tfs.bin", np.uint16),
+            ))
+        index._saved_terms = len(index._tail_vocab)
+        index._saved_bytes = dict(sizes)
+        return index
+
+
+def _append_at(path: str, offset: int, data: bytes) -> int:
+    """Write ``data`` at ``offset``, dropping anything after it; returns the new size"""
+    with open(path, "r+b" if os.path.exists(path) else "wb") as fh:
+        fh.truncate(offset)
+        fh.seek(offset)
+        fh.write(data)
+    return offset + len(data)
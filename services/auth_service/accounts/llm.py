@@ -0,0 +1,113 @@
+# accounts/llm.py
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+Messages = List[Dict[str, str]]
+
+_provider = None
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class LLMProvider:
+    """Chat-completion backend used by the PDF chat endpoints"""
+
+    model = ""
+
+    def complete(self, messages: Messages) -> str:
+        return "".join(self.stream(messages))
+
+    def stream(self, messages: Messages) -> Iterator[str]:
+        """Yield answer text fragments as soon as the backend produces them"""
+        raise NotImplementedError
+
+
+class OpenAIProvider(LLMProvider):
+    def __init__(self, model: str = None, temperature: float = 0.2):
+        from openai import OpenAI
+
+        self.model = model or getattr(settings, "PDF_CHAT_MODEL", "gpt-4o-mini")
+        self.temperature = temperature
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def complete(self, messages: Messages) -> str:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+        )
+        return response.choices[0].message.content
+
+    def stream(self, messages: Messages) -> Iterator[str]:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            stream=True,
+        )
+        for event in response:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+
+class FakeLLMProvider(LLMProvider):
+    """
+    Local stand-in for tests and benchmarks. Answers with the first
+    sentence of the context, word by word, after configurable delays that
+    mimic provider time-to-first-token and inter-token latency.
+    """
+
+    model = "fake-llm"
+
+    def __init__(self, first_token_delay: float = 0.0, token_delay: float = 0.0):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+
+    def stream(self, messages: Messages) -> Iterator[str]:
+        prompt = messages[-1]["content"]
+        match = re.search(r"Context:\s*(.+?[.!?])(\s|$)", prompt, re.S)
+        answer = match.group(1).strip() if match else "I could not find that in the provided context."
+        if self.first_token_delay:
+            time.sleep(self.first_token_delay)
+        for i, word in enumerate(answer.split()):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+
+def get_llm_provider() -> LLMProvider:
+    """Return the process-wide provider configured by settings.PDF_CHAT_LLM_PROVIDER"""
+    global _provider
+    if _provider is None:
+        path = getattr(settings, "PDF_CHAT_LLM_PROVIDER", "accounts.llm.OpenAIProvider")
+        _provider = import_string(path)()
+    return _provider
+
+
+def set_llm_provider(provider: LLMProvider):
+    """Swap the process-wide provider, e.g. for a FakeLLMProvider in tests"""
+    global _provider
+    _provider = provider
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    """
+    Shared pool for concurrent completions. Its size, settings.PDF_CHAT_BATCH_CONCURRENCY,
+    caps provider calls in flight across all batch requests in this process.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "PDF_CHAT_BATCH_CONCURRENCY", 8),
+                thread_name_prefix="llm",
+            )
+        return _executor
@@ -0,0 +1,162 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from rest_framework.test import APIRequestFactory
+
+from accounts import benchmark
+from accounts.answer_cache import set_answer_cache
+from accounts.api import ChatWithPDFView
+from accounts.chunk_store import store_chunks
+from accounts.chunking import iter_chunks
+from accounts.embeddings import HashingEmbedder, get_embedder, set_embedder
+from accounts.llm import FakeLLMProvider, set_llm_provider
+from accounts.models import PDFDocument
+from accounts.retrieval import index_chunks, rebuild_index, retrieve_chunks
+from accounts.text_store import TextWriter, text_name_for
+from accounts.utils import iter_pdf_pages
+
+DEFAULT_HISTORY = os.path.join(settings.BASE_DIR, 'benchmarks', 'pdf_pipeline.jsonl')
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark PDF ingestion and question answering on synthetic legal filings. '
+        'Runs against a throwaway test database and index directory with a stub LLM, '
+        'and appends per-stage throughput, latency percentiles and peak RSS to a JSONL history.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=5)
+        parser.add_argument('--pages', type=int, default=20, help='Pages per document')
+        parser.add_argument('--questions', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-tokens', type=int, default=getattr(settings, 'PDF_CHUNK_MAX_TOKENS', 400))
+        parser.add_argument('--overlap-tokens', type=int, default=getattr(settings, 'PDF_CHUNK_OVERLAP_TOKENS', 50))
+        parser.add_argument('--top-k', type=int, default=getattr(settings, 'PDF_CHAT_TOP_K', 5))
+        parser.add_argument('--llm-first-token-ms', type=float, default=0.0,
+                            help='Simulated provider time to first token')
+        parser.add_argument('--configured-embedder', action='store_true',
+                            help='Use PDF_EMBEDDER instead of the local HashingEmbedder')
+        parser.add_argument('--history', default=DEFAULT_HISTORY)
+        parser.add_argument('--label', default='', help='Free-form note stored with the run')
+        parser.add_argument('--fail-on-regression', type=float, metavar='FRACTION',
+                            help='Exit non-zero if a stage is this much slower than the last matching run')
+
+    def handle(self, *args, **options):
+        params = {name: options[name] for name in (
+            'documents', 'pages', 'questions', 'seed', 'chunk_tokens', 'overlap_tokens', 'top_k',
+            'llm_first_token_ms', 'configured_embedder')}
+        rng = random.Random(options['seed'])
+        workdir = tempfile.mkdtemp(prefix='pdf-bench-')
+        stages = {}
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(PDF_INDEX_DIR=os.path.join(workdir, 'index'),
+                                   MEDIA_ROOT=os.path.join(workdir, 'media'),
+                                   PDF_ANSWER_CACHE='off'):
+                if not options['configured_embedder']:
+                    set_embedder(HashingEmbedder())
+                set_llm_provider(FakeLLMProvider(first_token_delay=options['llm_first_token_ms'] / 1000))
+                set_answer_cache(None)
+                rebuild_index()
+                stages = self.run_stages(options, rng, workdir)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.print_table(stages)
+        baseline = benchmark.previous_run(options['history'], params)
+        record = {
+            'ts': round(time.time(), 3),
+            'revision': benchmark.git_revision(str(settings.BASE_DIR)),
+            'label': options['label'],
+            'params': params,
+            'stages': stages,
+        }
+        benchmark.append_history(options['history'], record)
+        self.stdout.write(f'Recorded run in {options["history"]}')
+
+        if baseline is None:
+            return
+        threshold = options['fail_on_regression']
+        found = benchmark.regressions(stages, baseline['stages'], threshold if threshold is not None else 0.2)
+        for line in found:
+            self.stdout.write(self.style.WARNING(f'⚠️ {line} vs {baseline.get("revision") or "previous run"}'))
+        if found and threshold is not None:
+            raise CommandError(f'{len(found)} regressions over {threshold:.0%}')
+
+    def run_stages(self, options, rng, workdir):
+        generate = benchmark.StageRecorder('generate', 'pages')
+        extract = benchmark.StageRecorder('extract', 'pages')
+        chunk = benchmark.StageRecorder('chunk', 'chunks')
+        embed = benchmark.StageRecorder('embed', 'chunks')
+        store = benchmark.StageRecorder('store', 'chunks')
+        retrieve = benchmark.StageRecorder('retrieve', 'questions')
+        answer = benchmark.StageRecorder('answer', 'questions')
+        embedder = get_embedder()
+        batch_size = getattr(settings, 'PDF_INGEST_EMBED_BATCH', 256)
+
+        paths = []
+        with generate.running():
+            for i in range(options['documents']):
+                path = os.path.join(workdir, f'filing-{i}.pdf')
+                with generate.op(options['pages']):
+                    benchmark.write_pdf(path, benchmark.synthetic_pages(rng, options['pages']))
+                paths.append(path)
+
+        for i, path in enumerate(paths):
+            document = PDFDocument.objects.create(file=f'pdfs/filing-{i}.pdf', case_number=f'BENCH-{i}')
+            document.text_file = text_name_for(document)
+            with extract.running(), extract.op(options['pages']):
+                writer = TextWriter(document.text_file)
+                pages = list(writer.tee(iter_pdf_pages(path)))
+                text = writer.close()
+            document.save(update_fields=['text_file'])
+            with chunk.running():
+                started = time.perf_counter()
+                chunks = list(iter_chunks(pages, max_tokens=options['chunk_tokens'],
+                                          overlap_tokens=options['overlap_tokens']))
+                chunk.record(time.perf_counter() - started, len(chunks))
+            vectors = []
+            with embed.running():
+                for start in range(0, len(chunks), batch_size):
+                    batch = chunks[start:start + batch_size]
+                    with embed.op(len(batch)):
+                        vectors.extend(embedder.embed([c.content for c in batch]))
+            with store.running(), store.op(len(chunks)):
+                index_chunks(store_chunks(document, chunks, vectors, text=text).rows)
+            self.stdout.write(f'Ingested document {i + 1}/{len(paths)}: {len(pages)} pages, {len(chunks)} chunks')
+
+        questions = benchmark.synthetic_questions(rng, options['questions'])
+        with retrieve.running():
+            for question in questions:
+                with retrieve.op():
+                    retrieve_chunks(question, k=options['top_k'])
+
+        factory = APIRequestFactory()
+        view = ChatWithPDFView.as_view()
+        with answer.running():
+            for question in questions:
+                request = factory.post('/api/accounts/chat/', {'question': question}, format='json')
+                with answer.op():
+                    response = view(request)
+                    response.render()
+                if response.status_code != 200:
+                    raise CommandError(f'Chat request failed with {response.status_code}: {response.content[:200]}')
+
+        return {r.name: r.summary() for r in (generate, extract, chunk, embed, store, retrieve, answer)}
+
+    def print_table(self, stages):
+        self.stdout.write(f'{"stage":<10}{"items":>8}{"throughput":>24}{"p50 ms":>10}{"p95 ms":>10}'
+                          f'{"p99 ms":>10}{"peak RSS":>11}')
+        for name, s in stages.items():
+            throughput = f'{s["throughput"]} {s["unit"]}/s' if s['throughput'] is not None else '-'
+            self.stdout.write(f'{name:<10}{s["items"]:>8}{throughput:>24}{s["p50_ms"]:>10}{s["p95_ms"]:>10}'
+                              f'{s["p99_ms"]:>10}{s["peak_rss_mb"]:>8} MB')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from accounts.retrieval import get_index_dir, get_lexical_index, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the PDF chunk vector and BM25 indexes from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reembed',
+            action='store_true',
+            help='Recompute every chunk embedding, e.g. after changing PDF_EMBEDDER',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Rebuilding vector and BM25 indexes in {get_index_dir()}...')
+        index = rebuild_index(reembed=options['reembed'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Indexed {len(index)} chunks in {index.nlist} lists, '
+            f'{len(get_lexical_index().vocab)} BM25 terms'
+        ))
@@ -0,0 +1,39 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import OutboxRelay, outbox_stats
+
+
+class Command(BaseCommand):
+    help = 'Relay events from the transactional outbox to Kafka'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'OUTBOX_BATCH_SIZE', 500))
+        parser.add_argument('--poll-interval', type=float, default=getattr(settings, 'OUTBOX_POLL_INTERVAL', 0.5),
+                            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--stats-interval', type=float, default=60.0,
+                            help='Seconds between lag reports and purges of sent events')
+        parser.add_argument('--once', action='store_true', help='Drain what is pending now and exit')
+
+    def handle(self, *args, **options):
+        relay = OutboxRelay(batch_size=options['batch_size'])
+        stopping = []
+        # Finish the batch in hand on SIGTERM/SIGINT instead of abandoning it mid-flush
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stopping.append(True))
+
+        self.stdout.write(f'Relaying outbox events: {outbox_stats()}')
+        try:
+            if options['once']:
+                while not stopping and relay.relay_batch() == relay.batch_size:
+                    pass
+                relay.purge_sent()
+            else:
+                relay.run(poll_interval=options['poll_interval'], stats_interval=options['stats_interval'],
+                          should_stop=lambda: bool(stopping))
+        finally:
+            relay.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Relayed {relay.relayed} events ({relay.failed} failed attempts); {outbox_stats()}'))
@@ -0,0 +1,30 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.ingestion import get_ingestion_pool, resume_jobs
+
+
+class Command(BaseCommand):
+    help = 'Finish or rerun PDF ingestion jobs left queued or running by a stopped server; run before starting web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, default=0,
+                            help='Only resume jobs created more than this many minutes ago')
+
+    def handle(self, *args, **options):
+        older_than = None
+        if options['older_than']:
+            older_than = timezone.now() - timedelta(minutes=options['older_than'])
+        pool = get_ingestion_pool()
+        resumed = resume_jobs(pool, older_than=older_than)
+        self.stdout.write(f'Resuming {len(resumed)} ingestion jobs...')
+        # The pool's threads die with this process, so wait for them to drain
+        while True:
+            stats = pool.stats()
+            if not stats['active'] and not stats['queued']:
+                break
+            time.sleep(1)
+        self.stdout.write(self.style.SUCCESS(f'✅ Resumed {len(resumed)} ingestion jobs'))
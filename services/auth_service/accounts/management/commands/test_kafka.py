@@ -1,6 +1,5 @@
 from django.core.management.base import BaseCommand
 from accounts.kafka_producer import kafka_producer
-import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,14 +16,15 @@ class Command(BaseCommand):
             'email': 'test@example.com',
             'username': 'testuser',
             'user_type': 'PETITIONER',
-            'created_at': '2025-10-04T10:00:00Z'
+            'is_verified': False,
+            'created_at': '2025-10-04T10:00:00+00:00'
         }
         
         self.stdout.write(f'Kafka producer enabled: {kafka_producer.enabled}')
-        self.stdout.write(f'Kafka producer instance: {kafka_producer.producer is not None}')
         
-        # Try to send test message
-        result = kafka_producer.send_message('user_signed_up', json.dumps(test_data))
+        result = kafka_producer.send_and_wait('user_signed_up', test_data)
+        self.stdout.write(f'Kafka producer instance: {kafka_producer.producer is not None}')
+        self.stdout.write(f'Producer stats: {kafka_producer.stats()}')
         
         if result:
             self.stdout.write(self.style.SUCCESS('✅ Test message sent successfully'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_pdfdocument_pdfchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='embedding',
+            field=models.BinaryField(blank=True, help_text='Little-endian float32 vector from the configured PDF embedder', null=True),
+        ),
+    ]
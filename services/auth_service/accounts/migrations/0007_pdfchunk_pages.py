@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_pdfdocument_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='page_end',
+            field=models.PositiveIntegerField(blank=True, help_text='Last page (1-based) the chunk covers', null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='page_start',
+            field=models.PositiveIntegerField(blank=True, help_text='First page (1-based) the chunk covers', null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='token_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
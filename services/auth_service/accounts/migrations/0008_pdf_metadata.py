@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_owners(apps, schema_editor):
+    """Documents uploaded before this migration take the owner of their ingestion job"""
+    PDFDocument = apps.get_model('accounts', 'PDFDocument')
+    PDFChunk = apps.get_model('accounts', 'PDFChunk')
+    IngestionJob = apps.get_model('accounts', 'IngestionJob')
+    jobs = IngestionJob.objects.filter(owner__isnull=False).values_list('document_id', 'owner_id')
+    for document_id, owner_id in jobs.iterator():
+        PDFDocument.objects.filter(pk=document_id, owner__isnull=True).update(owner_id=owner_id)
+        PDFChunk.objects.filter(document_id=document_id, owner__isnull=True).update(owner_id=owner_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_pdfchunk_pages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='case_number',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pdf_chunks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='case_number',
+            field=models.CharField(blank=True, db_index=True, help_text='Case the filing belongs to', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pdf_documents', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='pdfchunk',
+            index=models.Index(fields=['owner', 'case_number'], name='pdfchunk_owner_case_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfchunk',
+            index=models.Index(fields=['document', 'page_start'], name='pdfchunk_doc_page_idx'),
+        ),
+        migrations.RunPython(backfill_owners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_pdf_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='text_end',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='text_start',
+            field=models.PositiveBigIntegerField(blank=True, help_text="Byte offset into the document's text file", null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='text_file',
+            field=models.CharField(blank=True, help_text='Extracted text under MEDIA_ROOT that chunk offsets point into', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='pdfchunk',
+            name='content',
+            field=models.TextField(blank=True, default='', help_text="Only set when the text is not in the document's text file"),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:57
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_pdf_text_offsets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Sent with the event so consumers can drop redeliveries', unique=True)),
+                ('topic', models.CharField(max_length=255)),
+                ('key', models.CharField(blank=True, help_text='Partition key, e.g. the user id', max_length=255)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(help_text='Earliest time the relay may (re)try the event')),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Outbox Event',
+                'verbose_name_plural': 'Outbox Events',
+                'indexes': [models.Index(fields=['sent_at', 'available_at', 'id'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
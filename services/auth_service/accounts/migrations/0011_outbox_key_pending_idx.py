@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-17 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['key', 'sent_at', 'id'], name='outbox_key_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-17 04:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_outbox_key_pending_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='is_public',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='is_public',
+            field=models.BooleanField(default=False, help_text='Searchable by everyone, including anonymous callers'),
+        ),
+        migrations.AlterField(
+            model_name='pdfchunk',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pdf_chunks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='pdfdocument',
+            name='owner',
+            field=models.ForeignKey(blank=True, help_text='Uploader; empty for anonymous uploads, which only is_public makes searchable', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pdf_documents', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
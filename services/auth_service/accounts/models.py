@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
@@ -173,8 +175,134 @@ class UserRole(models.Model):
 
 class PDFDocument(models.Model):
     file = models.FileField(upload_to="pdfs/")
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="SHA-256 of the file bytes, used to share extraction work between duplicate uploads"
+    )
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='pdf_documents',
+        help_text="Uploader; empty for anonymous uploads, which only is_public makes searchable"
+    )
+    case_number = models.CharField(max_length=100, blank=True, db_index=True, help_text="Case the filing belongs to")
+    is_public = models.BooleanField(default=False, help_text="Searchable by everyone, including anonymous callers")
+    text_file = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Extracted text under MEDIA_ROOT that chunk offsets point into"
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
 class PDFChunk(models.Model):
     document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE)
-    content = models.TextField()
+    # Copied from the document so retrieval filters never need a join
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='pdf_chunks'
+    )
+    case_number = models.CharField(max_length=100, blank=True, db_index=True)
+    is_public = models.BooleanField(default=False)
+    content = models.TextField(blank=True, default="", help_text="Only set when the text is not in the document's text file")
+    text_start = models.PositiveBigIntegerField(null=True, blank=True, help_text="Byte offset into the document's text file")
+    text_end = models.PositiveBigIntegerField(null=True, blank=True)
+    page_start = models.PositiveIntegerField(null=True, blank=True, help_text="First page (1-based) the chunk covers")
+    page_end = models.PositiveIntegerField(null=True, blank=True, help_text="Last page (1-based) the chunk covers")
+    token_count = models.PositiveIntegerField(default=0)
+    embedding = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Little-endian float32 vector from the configured PDF embedder"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'case_number'], name='pdfchunk_owner_case_idx'),
+            models.Index(fields=['document', 'page_start'], name='pdfchunk_doc_page_idx'),
+        ]
+
+    @property
+    def text(self) -> str:
+        """Chunk text, sliced from the document's memory-mapped text file when only offsets are stored"""
+        if self.text_start is None:
+            return self.content
+        from .text_store import read_text
+
+        return read_text(self.document.text_file, self.text_start, self.text_end)
+
+
+class IngestionJob(models.Model):
+    """Background extraction, chunking, embedding and storage of one PDFDocument"""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    batch_id = models.UUIDField(db_index=True, help_text="Groups the jobs of one upload request")
+    document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='ingestion_jobs')
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ingestion_jobs'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    stage = models.CharField(max_length=20, blank=True, help_text="Stage currently running")
+    stages = models.JSONField(
+        default=dict,
+        help_text="Per-stage progress and timings, keyed by stage name"
+    )
+    metrics = models.JSONField(default=dict, help_text="Summary metrics for the whole job")
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Ingestion of {self.document_id} - {self.status}"
+
+    class Meta:
+        verbose_name = "Ingestion Job"
+        verbose_name_plural = "Ingestion Jobs"
+        ordering = ['-created_at']
+
+
+class OutboxEvent(models.Model):
+    """
+    An event to publish to Kafka, written in the same transaction as the
+    change it describes and relayed afterwards by ``relay_outbox``.
+    """
+    event_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False,
+                                help_text="Sent with the event so consumers can drop redeliveries")
+    topic = models.CharField(max_length=255)
+    key = models.CharField(max_length=255, blank=True, help_text="Partition key, e.g. the user id")
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(help_text="Earliest time the relay may (re)try the event")
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.topic} {self.event_id} - {'sent' if self.sent_at else 'pending'}"
+
+    class Meta:
+        verbose_name = "Outbox Event"
+        verbose_name_plural = "Outbox Events"
+        indexes = [
+            models.Index(fields=['sent_at', 'available_at', 'id'], name='outbox_pending_idx'),
+            models.Index(fields=['key', 'sent_at', 'id'], name='outbox_key_pending_idx'),
+        ]
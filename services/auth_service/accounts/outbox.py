@@ -0,0 +1,189 @@
+# accounts/outbox.py
+
+import logging
+import random
+import time
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q
+from django.utils import timezone
+
+import event_schema
+from kafka import KafkaProducer
+
+from .kafka_producer import encode_message, producer_config
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def publish_event(topic: str, payload: dict, key=None) -> OutboxEvent:
+    """
+    Record an event for the relay to send. Call it inside the transaction
+    that makes the change, so the event exists exactly when the change
+    does; nothing here talks to Kafka. Payloads of registered events are
+    validated here, so a bad one fails the request rather than the relay.
+    """
+    if topic in event_schema.registry:
+        event_schema.registry.get(topic).encode_values(payload)
+    return OutboxEvent.objects.create(
+        topic=topic,
+        key="" if key is None else str(key),
+        payload=payload,
+        available_at=timezone.now(),
+    )
+
+
+def encode_event(event: OutboxEvent) -> bytes:
+    """Wire format of an outbox event; ``event_id`` lets consumers skip redeliveries"""
+    return encode_message(event.topic, event.payload, event_id=event.event_id)
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next attempt: exponential with full jitter, capped"""
+    cap = getattr(settings, "OUTBOX_MAX_BACKOFF", 60.0)
+    return random.uniform(0, min(cap, 0.5 * 2 ** attempts))
+
+
+def outbox_stats() -> dict:
+    """Backlog and lag as seen from the database, so any process can report them"""
+    now = timezone.now()
+    pending = OutboxEvent.objects.filter(sent_at__isnull=True).aggregate(
+        count=Count("id"),
+        oldest=Min("created_at"),
+        retrying=Count("id", filter=Q(attempts__gt=0)),
+    )
+    recent = OutboxEvent.objects.filter(sent_at__gte=now - timedelta(minutes=1)).aggregate(
+        count=Count("id"), last=Max("sent_at"))
+    return {
+        "pending": pending["count"],
+        "retrying": pending["retrying"],
+        "lag_seconds": round((now - pending["oldest"]).total_seconds(), 3) if pending["oldest"] else 0.0,
+        "sent_last_minute": recent["count"],
+        "last_sent_at": recent["last"].isoformat() if recent["last"] else None,
+    }
+
+
+class OutboxRelay:
+    """
+    Drains pending outbox events to Kafka in id order, in batches.
+
+    A batch is claimed in a short transaction with ``SELECT ... FOR UPDATE
+    SKIP LOCKED`` (where the database supports it, so several relays can
+    share the table): the claim pushes ``available_at`` past a lease of
+    ``OUTBOX_CLAIM_SECONDS`` and commits, so no row lock is held while
+    talking to the broker. The batch is then sent and flushed, and events
+    the broker acknowledged are marked sent; failed ones go back with a
+    backoff. A relay that dies mid-batch leaves its events to be claimed
+    again once the lease runs out: delivery is at-least-once, and consumers
+    deduplicate on ``event_id``.
+
+    Events with the same key are delivered in id order. An event is only
+    claimed once every earlier event with its key has been sent, so a
+    batch holds at most one event per key and a failed event holds back
+    the ones after it until its retry succeeds.
+    """
+
+    def __init__(self, producer=None, batch_size: Optional[int] = None,
+                 send_timeout: Optional[float] = None, claim_seconds: Optional[float] = None):
+        if producer is None:
+            # One request in flight stops producer retries from reordering a partition
+            producer = KafkaProducer(**producer_config(max_in_flight_requests_per_connection=1))
+        self.producer = producer
+        self.batch_size = batch_size or getattr(settings, "OUTBOX_BATCH_SIZE", 500)
+        self.send_timeout = send_timeout or getattr(settings, "OUTBOX_SEND_TIMEOUT", 10.0)
+        self.claim_seconds = claim_seconds or getattr(settings, "OUTBOX_CLAIM_SECONDS", 60.0)
+        if self.claim_seconds <= self.send_timeout:
+            raise ValueError("OUTBOX_CLAIM_SECONDS must be longer than OUTBOX_SEND_TIMEOUT")
+        self.relayed = 0
+        self.failed = 0
+
+    def claim_batch(self) -> list:
+        """Lease the next batch: due events with no earlier unsent event for the same key"""
+        now = timezone.now()
+        earlier = OutboxEvent.objects.filter(key=OuterRef("key"), sent_at__isnull=True, id__lt=OuterRef("id"))
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(sent_at__isnull=True, available_at__lte=now)
+                .filter(Q(key="") | ~Exists(earlier))
+                .order_by("id")[:self.batch_size]
+            )
+            if events:
+                OutboxEvent.objects.filter(id__in=[e.id for e in events]).update(
+                    available_at=now + timedelta(seconds=self.claim_seconds))
+        return events
+
+    def relay_batch(self) -> int:
+        """Send one batch; returns how many events were claimed"""
+        events = self.claim_batch()
+        if not events:
+            return 0
+
+        futures = []
+        for event in events:
+            try:
+                future = self.producer.send(event.topic, value=encode_event(event),
+                                            key=event.key.encode("utf-8") if event.key else None)
+            except Exception as e:
+                future = e
+            futures.append((event, future))
+        self.producer.flush(timeout=self.send_timeout)
+
+        sent, failed = [], []
+        for event, future in futures:
+            if not isinstance(future, Exception) and future.is_done and future.succeeded():
+                sent.append(event.id)
+                continue
+            if isinstance(future, Exception):
+                error = future
+            else:
+                error = future.exception if future.is_done else "not acknowledged in time"
+            event.attempts += 1
+            event.last_error = str(error)[:1000]
+            event.available_at = timezone.now() + timedelta(seconds=retry_delay(event.attempts))
+            failed.append(event)
+
+        with transaction.atomic():
+            OutboxEvent.objects.filter(id__in=sent).update(sent_at=timezone.now())
+            if failed:
+                OutboxEvent.objects.bulk_update(failed, ["attempts", "last_error", "available_at"])
+
+        self.relayed += len(sent)
+        self.failed += len(failed)
+        if failed:
+            logger.warning(f"Outbox relay: {len(failed)} of {len(events)} events failed, "
+                           f"first error: {failed[0].last_error}")
+        else:
+            logger.debug(f"Outbox relay: sent {len(sent)} events")
+        return len(events)
+
+    def purge_sent(self, retention: Optional[timedelta] = None) -> int:
+        if retention is None:
+            retention = timedelta(hours=getattr(settings, "OUTBOX_RETENTION_HOURS", 24))
+        deleted, _ = OutboxEvent.objects.filter(sent_at__lt=timezone.now() - retention).delete()
+        return deleted
+
+    def run(self, poll_interval: Optional[float] = None, stats_interval: float = 60.0,
+            should_stop=lambda: False):
+        """Relay until ``should_stop`` returns true, logging lag every ``stats_interval`` seconds"""
+        if poll_interval is None:
+            poll_interval = getattr(settings, "OUTBOX_POLL_INTERVAL", 0.5)
+        next_stats = time.monotonic() + stats_interval
+        while not should_stop():
+            claimed = self.relay_batch()
+            if time.monotonic() >= next_stats:
+                purged = self.purge_sent()
+                logger.info(f"Outbox relay stats: {outbox_stats()}, relayed {self.relayed}, "
+                            f"failed {self.failed}, purged {purged}")
+                next_stats = time.monotonic() + stats_interval
+            # A full batch means there is more waiting; only sleep once caught up
+            if claimed < self.batch_size:
+                time.sleep(poll_interval)
+
+    def close(self):
+        self.producer.flush(timeout=self.send_timeout)
+        self.producer.close(timeout=self.send_timeout)
@@ -0,0 +1,16 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients negotiate ``Accept: text/event-stream`` for streamed answers"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Streams are written by the view itself; this only covers error bodies
+        if isinstance(data, (bytes, str)):
+            return data
+        return f"event: error\ndata: {json.dumps(data)}\n\n"
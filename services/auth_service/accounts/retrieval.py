@@ -0,0 +1,431 @@
+# accounts/retrieval.py
+
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import Hashable, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from .embeddings import bytes_to_vector, get_embedder, vector_to_bytes
+from .lexical_index import BM25Index
+from .models import PDFChunk
+from .vector_index import IVFIndex
+
+logger = logging.getLogger(__name__)
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+_lock_state = threading.local()
+_lexical = None
+_lexical_mtime = None
+_scope_cache = OrderedDict()  # cache_key -> (index generation, expiry, sorted chunk ids)
+_scope_cache_ids = 0
+_scope_lock = threading.Lock()
+
+RRF_K = 60
+
+
+def get_index_dir() -> str:
+    return str(getattr(settings, "PDF_INDEX_DIR", os.path.join(settings.BASE_DIR, "pdf_index")))
+
+
+def get_lexical_dir() -> str:
+    return os.path.join(get_index_dir(), "bm25")
+
+
+def _meta_mtime(path: str):
+    try:
+        return os.stat(os.path.join(path, "meta.json")).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_vector_index() -> IVFIndex:
+    """
+    Return the process-wide chunk index, loading it from disk on first use.
+    The on-disk copy is re-opened when another worker process has saved a
+    newer version.
+
+    Building the index embeds the whole corpus, so it is never done here:
+    with no usable index on disk (none yet, or one made by another
+    embedder) this returns an empty one and logs that
+    ``manage.py rebuild_pdf_index`` needs to run. New uploads are still
+    indexed in the meantime.
+    """
+    global _index, _index_mtime
+    path = get_index_dir()
+    with _index_lock:
+        if _index is not None and _meta_mtime(path) == _index_mtime:
+            return _index
+
+    embedder = get_embedder()
+    with _index_file_lock(path, shared=True), _index_lock:
+        mtime = _meta_mtime(path)
+        if _index is not None and mtime == _index_mtime:
+            return _index
+
+        index = IVFIndex.load(path, max_tail=_max_tail())
+        if index is None or index.fingerprint != embedder.fingerprint:
+            if index is None:
+                logger.warning(f"No vector index in {path}; run `manage.py rebuild_pdf_index` "
+                               f"to index existing chunks")
+            else:
+                logger.error(
+                    f"Vector index was built with {index.fingerprint}, current embedder is "
+                    f"{embedder.fingerprint}; run `manage.py rebuild_pdf_index --reembed`"
+                )
+            index = _new_vector_index()
+
+        _index, _index_mtime = index, mtime
+        return _index
+
+
+def _max_tail() -> int:
+    return getattr(settings, "PDF_INDEX_MAX_TAIL", 4096)
+
+
+def _new_vector_index() -> IVFIndex:
+    embedder = get_embedder()
+    index = IVFIndex(embedder.dim, fingerprint=embedder.fingerprint,
+                     nprobe=getattr(settings, "PDF_INDEX_NPROBE", 8), max_tail=_max_tail())
+    # Empty but "built", so the first save replaces every file of an unusable old index
+    index.build(np.zeros(0, dtype=np.int64), np.zeros((0, embedder.dim), dtype=np.float32))
+    return index
+
+
+def _build_index_from_db(reembed: bool = False) -> IVFIndex:
+    ids, vectors, batch = [], [], []
+
+    def flush():
+        embed_missing_chunks(batch, force=reembed)
+        for chunk in batch:
+            ids.append(chunk.id)
+            vectors.append(bytes_to_vector(chunk.embedding))
+        batch.clear()
+
+    for chunk in PDFChunk.objects.select_related("document").order_by("id").iterator(chunk_size=2000):
+        batch.append(chunk)
+        if len(batch) >= 2000:
+            flush()
+    flush()
+
+    index = _new_vector_index()
+    if ids:
+        index.build(np.asarray(ids), np.vstack(vectors))
+    logger.info(f"Built vector index over {len(ids)} chunks")
+    return index
+
+
+def get_lexical_index() -> BM25Index:
+    """
+    Process-wide BM25 index over chunk text, kept alongside the vector
+    index. Like ``get_vector_index`` it is empty until
+    ``rebuild_pdf_index`` has run.
+    """
+    global _lexical, _lexical_mtime
+    path = get_lexical_dir()
+    with _index_lock:
+        if _lexical is not None and _meta_mtime(path) == _lexical_mtime:
+            return _lexical
+
+    with _index_file_lock(get_index_dir(), shared=True), _index_lock:
+        mtime = _meta_mtime(path)
+        if _lexical is not None and mtime == _lexical_mtime:
+            return _lexical
+
+        index = BM25Index.load(path)
+        if index is None:
+            logger.warning(f"No BM25 index in {path}; run `manage.py rebuild_pdf_index` "
+                           f"to index existing chunks")
+            index = BM25Index()
+            index.build([])
+
+        _lexical, _lexical_mtime = index, mtime
+        return _lexical
+
+
+def _build_lexical_from_db() -> BM25Index:
+    index = BM25Index()
+    chunks = PDFChunk.objects.select_related("document").order_by("id").defer("embedding")
+    index.build((chunk.id, chunk.text) for chunk in chunks.iterator(chunk_size=2000))
+    logger.info(f"Built BM25 index over {len(index)} chunks and {len(index.vocab)} terms")
+    return index
+
+
+def rebuild_index(reembed: bool = False) -> IVFIndex:
+    """
+    Rebuild both indexes from the database. They are built and saved into
+    a scratch directory without holding any lock, so searches and uploads
+    carry on meanwhile. Then, under the exclusive index lock, chunks that
+    uploads indexed in the meantime are added, and the new files replace
+    the old ones. Readers open the files under the shared lock, so they
+    see either the old pair of indexes or the new pair, never a mix.
+    """
+    global _index, _index_mtime, _lexical, _lexical_mtime
+    path = get_index_dir()
+    scratch = path.rstrip(os.sep) + ".rebuild"
+    shutil.rmtree(scratch, ignore_errors=True)
+    try:
+        index = _build_index_from_db(reembed=reembed)
+        lexical = _build_lexical_from_db()
+        index.save(scratch)
+        lexical.save(os.path.join(scratch, "bm25"))
+
+        with _index_file_lock(path):
+            live = IVFIndex.load(path)
+            if live is not None:
+                missed = np.setdiff1d(live.all_ids(), index.all_ids())
+                chunks = list(PDFChunk.objects.select_related("document").filter(id__in=missed.tolist()))
+                if chunks:
+                    embed_missing_chunks(chunks)
+                    index.add([c.id for c in chunks], np.vstack([bytes_to_vector(c.embedding) for c in chunks]))
+                    lexical.add((c.id, c.text) for c in chunks)
+                    index.save(scratch)
+                    lexical.save(os.path.join(scratch, "bm25"))
+                    logger.info(f"Added {len(chunks)} chunks indexed during the rebuild")
+            _swap_in(scratch, path)
+            with _index_lock:
+                _index, _index_mtime = None, None
+                _lexical, _lexical_mtime = None, None
+            return get_vector_index()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _swap_in(src: str, dest: str):
+    """Move the files under ``src`` over those in ``dest``, meta.json last in each directory"""
+    os.makedirs(dest, exist_ok=True)
+    names = sorted(os.listdir(src), key=lambda name: name == "meta.json")
+    for name in names:
+        source = os.path.join(src, name)
+        if os.path.isdir(source):
+            _swap_in(source, os.path.join(dest, name))
+        else:
+            os.replace(source, os.path.join(dest, name))
+
+
+def embed_missing_chunks(chunks: Iterable[PDFChunk], batch_size: int = 256,
+                         force: bool = False) -> List[PDFChunk]:
+    """
+    Compute and store embeddings for chunks that have none or whose stored
+    vector does not match the current embedder's dimension. With ``force``
+    every chunk is re-embedded, e.g. after switching embedding models.
+    """
+    embedder = get_embedder()
+    expected = embedder.dim * 4
+    pending = [
+        c for c in chunks
+        if force or c.embedding is None or len(c.embedding) != expected
+    ]
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        vectors = embedder.embed([c.text for c in batch])
+        for chunk, vector in zip(batch, vectors):
+            chunk.embedding = vector_to_bytes(vector)
+        PDFChunk.objects.bulk_update(batch, ["embedding"])
+    return pending
+
+
+@contextmanager
+def _index_file_lock(path: str, shared: bool = False):
+    """
+    Lock the index directory across worker processes: writers take it
+    exclusively, readers take it shared while opening the files. Nested
+    use within a thread is a no-op, so writers can call the loaders.
+    """
+    held = _lock_state.__dict__.setdefault("held", set())
+    if path in held:
+        yield
+        return
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, ".lock"), "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def index_chunks(chunks: Iterable[PDFChunk]):
+    """Embed freshly stored chunks and add them to the persistent indexes"""
+    global _index_mtime, _lexical_mtime
+    chunks = list(chunks)
+    if not chunks:
+        return
+    embed_missing_chunks(chunks)
+    path = get_index_dir()
+    with _index_file_lock(path):
+        index = get_vector_index()
+        index.add(
+            [c.id for c in chunks],
+            np.vstack([bytes_to_vector(c.embedding) for c in chunks]),
+        )
+        with _index_lock:
+            index.save(path)
+            _index_mtime = _meta_mtime(path)
+
+        lexical = get_lexical_index()
+        lexical.add((c.id, c.text) for c in chunks)
+        with _index_lock:
+            lexical.save(get_lexical_dir())
+            _lexical_mtime = _meta_mtime(get_lexical_dir())
+
+
+def chunk_filter(owner_id: Optional[int] = None, case_number: Optional[str] = None,
+                 document_id: Optional[int] = None, page_from: Optional[int] = None,
+                 page_to: Optional[int] = None) -> Optional[Q]:
+    """
+    Build a retrieval filter from chunk metadata. Page bounds select chunks
+    that overlap the range. Returns None when nothing is restricted.
+    """
+    q = Q()
+    if owner_id is not None:
+        q &= Q(owner_id=owner_id)
+    if case_number:
+        q &= Q(case_number=case_number)
+    if document_id is not None:
+        q &= Q(document_id=document_id)
+    if page_from is not None:
+        q &= Q(page_end__gte=page_from)
+    if page_to is not None:
+        q &= Q(page_start__lte=page_to)
+    return q if q else None
+
+
+def _query_ids(filters: Q) -> np.ndarray:
+    ids = PDFChunk.objects.filter(filters).order_by("id").values_list("id", flat=True)
+    return np.fromiter(ids, dtype=np.int64)
+
+
+def _allowed_ids(filters: Q, cache_key: Optional[Hashable] = None) -> np.ndarray:
+    """
+    Sorted ids of the chunks matching ``filters``, from an ids-only query.
+    With a ``cache_key`` naming the filter, e.g. a user's access scope, the
+    ids are kept until either index changes (new chunks may match) or
+    PDF_SCOPE_CACHE_SECONDS pass (roles or visibility may have changed).
+    """
+    global _scope_cache_ids
+    if cache_key is None:
+        return _query_ids(filters)
+    generation = (_index_mtime, _lexical_mtime)
+    now = time.monotonic()
+    with _scope_lock:
+        entry = _scope_cache.get(cache_key)
+        if entry is not None and entry[0] == generation and entry[1] > now:
+            _scope_cache.move_to_end(cache_key)
+            return entry[2]
+
+    ids = _query_ids(filters)
+    max_ids = getattr(settings, "PDF_SCOPE_CACHE_MAX_IDS", 5_000_000)
+    with _scope_lock:
+        old = _scope_cache.pop(cache_key, None)
+        if old is not None:
+            _scope_cache_ids -= len(old[2])
+        if len(ids) <= max_ids:
+            ttl = getattr(settings, "PDF_SCOPE_CACHE_SECONDS", 60)
+            _scope_cache[cache_key] = (generation, now + ttl, ids)
+            _scope_cache_ids += len(ids)
+            while _scope_cache_ids > max_ids:
+                _, (_, _, evicted) = _scope_cache.popitem(last=False)
+                _scope_cache_ids -= len(evicted)
+    return ids
+
+
+def _search_vectors(index: IVFIndex, queries: np.ndarray, k: int,
+                    allowed: Optional[np.ndarray]) -> List[List[Tuple[int, float]]]:
+    """
+    Vector search, restricted to ``allowed`` ids when given. Selections of
+    up to PDF_FILTER_EXACT_MAX chunks are scored exactly from the index's
+    own vectors; larger ones probe the IVF lists with an id mask.
+    """
+    if allowed is None:
+        return index.search_batch(queries, k)
+    if not len(allowed):
+        return [[] for _ in range(len(queries))]
+    if len(allowed) <= getattr(settings, "PDF_FILTER_EXACT_MAX", 20000):
+        return index.search_subset(queries, k, allowed)
+    # Masked lists hold fewer candidates, so probe more of them
+    return index.search_batch(queries, k, allowed=allowed, nprobe=index.nprobe * 4)
+
+
+def fuse_rankings(rankings: Sequence[Tuple[List[Tuple[int, float]], float]],
+                  k: int) -> List[Tuple[int, float]]:
+    """
+    Weighted Reciprocal Rank Fusion: each chunk scores the sum of
+    ``weight / (RRF_K + rank)`` over the rankings it appears in. Working
+    on ranks rather than raw scores means cosine similarities and BM25
+    scores need no calibration against each other.
+    """
+    fused = {}
+    for hits, weight in rankings:
+        for rank, (chunk_id, _) in enumerate(hits, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + weight / (RRF_K + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])[:k]
+
+
+def retrieve_chunks_batch(questions: Sequence[str], k: int = 5, filters: Optional[Q] = None,
+                          cache_key: Optional[Hashable] = None) -> List[List[PDFChunk]]:
+    """
+    Retrieve for many questions at once: one embedding call, one vectorised
+    search and one database fetch. ``filters`` (see ``chunk_filter``)
+    limits the search to matching chunks; pass a ``cache_key`` identifying
+    a filter that repeats across requests so its chunk ids are looked up
+    once rather than on every call (see ``_allowed_ids``).
+
+    PDF_RETRIEVAL_MODE picks "vector", "lexical" (BM25) or "hybrid", which
+    fuses the two so exact tokens such as section numbers and citations
+    rank alongside semantically similar passages.
+    """
+    questions = list(questions)
+    mode = getattr(settings, "PDF_RETRIEVAL_MODE", "hybrid")
+    depth = k * getattr(settings, "PDF_HYBRID_DEPTH", 4) if mode == "hybrid" else k
+
+    vector_index = get_vector_index() if mode != "lexical" else None
+    lexical_index = get_lexical_index() if mode != "vector" else None
+    allowed = None if filters is None else _allowed_ids(filters, cache_key)
+
+    vector_hits = lexical_hits = None
+    if vector_index is not None:
+        queries = np.asarray(get_embedder().embed(questions), dtype=np.float32)
+        vector_hits = _search_vectors(vector_index, queries, depth, allowed)
+    if lexical_index is not None:
+        if allowed is not None and not len(allowed):
+            lexical_hits = [[] for _ in questions]
+        else:
+            lexical_hits = lexical_index.search_batch(questions, depth, allowed=allowed)
+
+    if vector_hits is None:
+        hits = lexical_hits
+    elif lexical_hits is None:
+        hits = vector_hits
+    else:
+        lexical_weight = getattr(settings, "PDF_HYBRID_LEXICAL_WEIGHT", 1.0)
+        hits = [
+            fuse_rankings([(vector_row, 1.0), (lexical_row, lexical_weight)], k)
+            for vector_row, lexical_row in zip(vector_hits, lexical_hits)
+        ]
+    by_id = PDFChunk.objects.select_related("document").in_bulk({chunk_id for row in hits for chunk_id, _ in row})
+    return [[by_id[chunk_id] for chunk_id, _ in row if chunk_id in by_id] for row in hits]
+
+
+def retrieve_chunks(question: str, k: int = 5, filters: Optional[Q] = None,
+                    cache_key: Optional[Hashable] = None) -> List[PDFChunk]:
+    """Return the ``k`` chunks most relevant to the question, best first"""
+    return retrieve_chunks_batch([question], k, filters, cache_key)[0]
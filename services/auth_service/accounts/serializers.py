@@ -3,7 +3,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import UserProfile, UserRole
+from .models import IngestionJob, UserProfile, UserRole
 
 User = get_user_model()
 
@@ -130,3 +130,15 @@ class UserRoleCreateSerializer(serializers.ModelSerializer):
             )
         return data
 
+
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    document_name = serializers.CharField(source='document.file.name', read_only=True)
+
+    class Meta:
+        model = IngestionJob
+        fields = [
+            'id', 'batch_id', 'document', 'document_name', 'status', 'stage',
+            'stages', 'metrics', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
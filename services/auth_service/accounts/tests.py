@@ -1,3 +1,219 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, TestCase
+
+from .api import access_filter
+from .chunking import iter_chunks
+from .embeddings import HashingEmbedder
+from .lexical_index import BM25Index
+from .models import OutboxEvent, PDFChunk, PDFDocument, User, UserRole
+from .outbox import OutboxRelay, publish_event
+from .retrieval import RRF_K, fuse_rankings
+from .text_store import TextWriter
+from .vector_index import IVFIndex
+
+PASSAGES = [
+    "The petitioner filed a writ under Article 226 against the eviction order.",
+    "Section 138 of the Negotiable Instruments Act covers dishonoured cheques.",
+    "The respondent argued the arbitration clause barred the civil suit.",
+    "Bail was granted because the accused had no prior convictions.",
+    "The court held that the lease deed was unstamped and inadmissible.",
+    "Perjury in an affidavit attracts prosecution under Section 193.",
+    "The appellate bench remanded the matter for fresh consideration of evidence.",
+    "Maintenance under Section 125 was awarded to the wife and minor child.",
+]
+
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+
+class IVFIndexTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.embedder = HashingEmbedder()
+        self.vectors = self.embedder.embed(PASSAGES)
+        self.ids = np.arange(100, 100 + len(PASSAGES), dtype=np.int64)
+
+    def make_index(self, **options):
+        index = IVFIndex(self.embedder.dim, fingerprint=self.embedder.fingerprint,
+                         nprobe=64, **options)
+        index.build(self.ids, self.vectors)
+        return index
+
+    def test_search_finds_nearest_passage(self):
+        index = self.make_index()
+        hits = index.search(self.embedder.embed_one("cheque dishonoured under Section 138"), k=3)
+        self.assertEqual(hits[0][0], 101)
+        self.assertEqual(len(hits), 3)
+
+    def test_search_respects_allowed_ids(self):
+        index = self.make_index()
+        query = self.embedder.embed_one(PASSAGES[1])
+        allowed = np.array([103, 105], dtype=np.int64)
+        for hits in (index.search(query, k=5, allowed=allowed), index.search_subset(query[None, :], 5, allowed)[0]):
+            self.assertEqual({chunk_id for chunk_id, _ in hits}, {103, 105})
+
+    def test_added_vectors_are_searchable_past_the_tail(self):
+        index = self.make_index(max_tail=2)
+        extra = ["Anticipatory bail requires a reasonable apprehension of arrest.",
+                 "Specific performance of the sale agreement was refused.",
+                 "The tribunal quashed the dismissal for want of a hearing."]
+        index.add([200, 201, 202], self.embedder.embed(extra))
+
+        self.assertTrue(index.segments)
+        self.assertEqual(len(index), len(PASSAGES) + 3)
+        hits = index.search(self.embedder.embed_one(extra[1]), k=1)
+        self.assertEqual(hits[0][0], 201)
+
+    def test_save_load_round_trip(self):
+        index = self.make_index(max_tail=2)
+        index.add([200, 201, 202], self.embedder.embed(PASSAGES[:3]))
+        index.save(self.tmp)
+
+        loaded = IVFIndex.load(self.tmp, max_tail=2)
+        self.assertEqual(loaded.fingerprint, self.embedder.fingerprint)
+        self.assertEqual(sorted(loaded.all_ids().tolist()), sorted(index.all_ids().tolist()))
+        queries = self.embedder.embed(["eviction writ", "perjury affidavit"])
+        self.assertEqual(loaded.search_batch(queries, k=4), index.search_batch(queries, k=4))
+
+    def test_load_missing_index_returns_none(self):
+        self.assertIsNone(IVFIndex.load(self.tmp))
+
+
+class BM25IndexTests(TempDirMixin, SimpleTestCase):
+    def make_index(self):
+        index = BM25Index()
+        index.build(enumerate(PASSAGES, start=1))
+        return index
+
+    def test_rare_term_ranks_its_passage_first(self):
+        hits = self.make_index().search("perjury affidavit", k=3)
+        self.assertEqual(hits[0][0], 6)
+        self.assertGreater(hits[0][1], 0)
+
+    def test_search_respects_allowed_ids(self):
+        hits = self.make_index().search("section", k=5, allowed=np.array([2, 8], dtype=np.int64))
+        self.assertEqual({chunk_id for chunk_id, _ in hits}, {2, 8})
+
+    def test_incremental_adds_score_like_a_full_build(self):
+        incremental = BM25Index()
+        incremental.build(enumerate(PASSAGES[:3], start=1))
+        incremental.add((i, text) for i, text in enumerate(PASSAGES, start=1) if i > 3)
+
+        queries = ["section cheque", "bail accused", "the court"]
+        for got, expected in zip(incremental.search_batch(queries, k=5), self.make_index().search_batch(queries, k=5)):
+            self.assertEqual([c for c, _ in got], [c for c, _ in expected])
+            np.testing.assert_allclose([s for _, s in got], [s for _, s in expected], rtol=1e-5)
+
+    def test_save_load_round_trip(self):
+        index = self.make_index()
+        index.save(self.tmp)
+        index.add([(20, "A later order on perjury costs.")])
+        index.save(self.tmp)
+
+        loaded = BM25Index.load(self.tmp)
+        self.assertEqual(len(loaded), len(PASSAGES) + 1)
+        self.assertEqual(loaded.search("perjury", k=5), index.search("perjury", k=5))
+
+
+class FuseRankingsTests(SimpleTestCase):
+    def test_chunks_in_both_rankings_rank_first(self):
+        vector = [(1, 0.9), (2, 0.8), (3, 0.7)]
+        lexical = [(3, 12.0), (4, 9.0)]
+        fused = fuse_rankings([(vector, 1.0), (lexical, 1.0)], k=4)
+
+        self.assertEqual([chunk_id for chunk_id, _ in fused[:2]], [3, 1])
+        self.assertEqual({chunk_id for chunk_id, _ in fused[2:]}, {2, 4})
+        self.assertAlmostEqual(fused[0][1], 1 / (RRF_K + 3) + 1 / (RRF_K + 1))
+
+    def test_weights_and_k(self):
+        fused = fuse_rankings([([(1, 0.9)], 1.0), ([(2, 5.0)], 2.0)], k=1)
+        self.assertEqual(fused, [(2, 2.0 / (RRF_K + 1))])
+
+
+class ChunkOffsetTests(TempDirMixin, SimpleTestCase):
+    def test_chunk_offsets_match_text_file_byte_spans(self):
+        pages = [
+            "Section 1. The appellant’s plea — filed late — was condoned. Costs follow.",
+            "Clause 2. Ünïcode names such as Zoë and Søren appear here. The bench agreed.",
+            "",
+            "Para 3. A final page with a résumé of the findings. Appeal dismissed.",
+        ]
+        with self.settings(MEDIA_ROOT=self.tmp):
+            writer = TextWriter("pdf_text/test.txt")
+            chunks = list(iter_chunks(writer.tee(pages), max_tokens=20, overlap_tokens=5))
+            mapped = writer.close()
+
+        self.assertGreater(len(chunks), 2)
+        for chunk in chunks:
+            self.assertEqual(mapped.text(*mapped.byte_span(chunk.start, chunk.end)), chunk.content)
+        self.assertEqual(mapped.page(2), pages[1])
+
+
+class AccessFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username="alice", email="alice@example.com", password="x")
+        cls.bob = User.objects.create_user(username="bob", email="bob@example.com", password="x")
+        UserRole.objects.create(user=cls.alice, role="DEFENSE", case_number="CASE-1")
+        UserRole.objects.create(user=cls.alice, role="WITNESS", case_number="CASE-2", is_active=False)
+        cls.docs = {
+            "alice_own": PDFDocument.objects.create(file="pdfs/a.pdf", owner=cls.alice),
+            "case_1": PDFDocument.objects.create(file="pdfs/b.pdf", owner=cls.bob, case_number="CASE-1"),
+            "case_2": PDFDocument.objects.create(file="pdfs/c.pdf", owner=cls.bob, case_number="CASE-2"),
+            "public": PDFDocument.objects.create(file="pdfs/d.pdf", is_public=True),
+            "anonymous": PDFDocument.objects.create(file="pdfs/e.pdf"),
+        }
+        for doc in cls.docs.values():
+            PDFChunk.objects.create(document=doc, owner=doc.owner, case_number=doc.case_number,
+                                    is_public=doc.is_public, content="text")
+
+    def visible(self, user, model=PDFDocument):
+        names = {doc.pk: name for name, doc in self.docs.items()}
+        field = "pk" if model is PDFDocument else "document_id"
+        return {names[pk] for pk in model.objects.filter(access_filter(user)).values_list(field, flat=True)}
+
+    def test_user_sees_own_active_case_and_public_documents(self):
+        expected = {"alice_own", "case_1", "public"}
+        self.assertEqual(self.visible(self.alice), expected)
+        self.assertEqual(self.visible(self.alice, PDFChunk), expected)
+
+    def test_other_user_does_not_see_uploads_without_access(self):
+        self.assertEqual(self.visible(self.bob), {"case_1", "case_2", "public"})
+
+    def test_anonymous_sees_only_public_documents(self):
+        self.assertEqual(self.visible(AnonymousUser()), {"public"})
+        self.assertEqual(self.visible(AnonymousUser(), PDFChunk), {"public"})
+
+
+class OutboxClaimTests(TestCase):
+    def make_relay(self):
+        return OutboxRelay(producer=object(), batch_size=10, send_timeout=1, claim_seconds=30)
+
+    def test_claims_in_id_order_one_event_per_key(self):
+        first = publish_event("user_events", {"n": 1}, key=1)
+        other = publish_event("user_events", {"n": 2}, key=2)
+        publish_event("user_events", {"n": 3}, key=1)
+        unkeyed = [publish_event("user_events", {"n": n}) for n in (4, 5)]
+
+        claimed = self.make_relay().claim_batch()
+        self.assertEqual([e.id for e in claimed], [first.id, other.id] + [e.id for e in unkeyed])
+
+    def test_later_event_waits_until_earlier_one_is_sent(self):
+        first = publish_event("user_events", {"n": 1}, key=1)
+        second = publish_event("user_events", {"n": 2}, key=1)
+        relay = self.make_relay()
+
+        self.assertEqual([e.id for e in relay.claim_batch()], [first.id])
+        # The first event is leased, and its follower stays blocked behind it
+        self.assertEqual(relay.claim_batch(), [])
+
+        OutboxEvent.objects.filter(id=first.id).update(sent_at=first.created_at)
+        self.assertEqual([e.id for e in relay.claim_batch()], [second.id])
@@ -0,0 +1,172 @@
+# accounts/text_store.py
+
+import bisect
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .chunking import PAGE_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+TEXT_DIR = "pdf_text"
+# Bumped when the file layout changes, so files in an older layout are
+# never mixed with offsets computed for the new one
+TEXT_LAYOUT = 2
+
+
+def get_media_root() -> str:
+    return str(getattr(settings, "MEDIA_ROOT", "") or settings.BASE_DIR)
+
+
+def text_name_for(document) -> str:
+    """
+    Path of a document's text file relative to MEDIA_ROOT. Files are keyed
+    by content hash, so duplicate uploads share one copy.
+    """
+    key = document.content_hash or f"doc-{document.pk}"
+    return os.path.join(TEXT_DIR, key[:2], f"{key}-v{TEXT_LAYOUT}.txt")
+
+
+def _absolute(name: str) -> str:
+    return os.path.join(get_media_root(), name)
+
+
+def _index_path(path: str) -> str:
+    return path + ".pages.npy"
+
+
+class TextWriter:
+    """
+    Streams page texts into a flat UTF-8 file as they are extracted, so the
+    whole document is never held as one string. Each page is followed by
+    ``PAGE_SEPARATOR``, matching the character offsets ``iter_chunks``
+    reports. A sidecar ``.pages.npy`` records the byte and character offset
+    at which each page starts, plus the end of the text.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.path = _absolute(name)
+        self._tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fh = open(self._tmp, "wb")
+        self._bytes = [0]
+        self._chars = [0]
+
+    def add_page(self, text: str):
+        text += PAGE_SEPARATOR
+        data = text.encode("utf-8")
+        self._fh.write(data)
+        self._bytes.append(self._bytes[-1] + len(data))
+        self._chars.append(self._chars[-1] + len(text))
+
+    def tee(self, pages: Iterable[str]) -> Iterator[str]:
+        """Pass pages through while writing them"""
+        for page in pages:
+            self.add_page(page)
+            yield page
+
+    def close(self) -> "MappedText":
+        self._fh.close()
+        index_tmp = _index_path(self._tmp)
+        with open(index_tmp, "wb") as fh:
+            np.save(fh, np.array([self._bytes, self._chars], dtype=np.int64))
+        os.replace(index_tmp, _index_path(self.path))
+        os.replace(self._tmp, self.path)
+        _maps.pop(self.path, None)
+        return open_text(self.name)
+
+    def abort(self):
+        self._fh.close()
+        for path in (self._tmp, _index_path(self._tmp)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class MappedText:
+    """
+    Read-only view of a document's text file through ``mmap``. Spans are
+    sliced straight out of the page cache; only the requested bytes are
+    decoded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        offsets = np.load(_index_path(path))
+        self.page_bytes, self.page_chars = offsets[0], offsets[1]
+        with open(path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            # mmap cannot map an empty file
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @property
+    def pages(self) -> int:
+        return len(self.page_bytes) - 1
+
+    def span(self, start: int, end: int) -> memoryview:
+        """Bytes [start, end) without copying"""
+        return memoryview(self._map)[start:end]
+
+    def text(self, start: int, end: int) -> str:
+        return str(self.span(start, end), "utf-8")
+
+    def page(self, number: int) -> str:
+        """Text of a 1-based page, without its separator"""
+        text = self.text(int(self.page_bytes[number - 1]), int(self.page_bytes[number]))
+        return text[:-len(PAGE_SEPARATOR)] if text.endswith(PAGE_SEPARATOR) else text
+
+    def byte_span(self, char_start: int, char_end: int) -> Tuple[int, int]:
+        """Byte offsets of a character range of the text, as ``iter_chunks`` counts it"""
+        return self._to_byte(char_start), self._to_byte(char_end)
+
+    def _to_byte(self, char: int) -> int:
+        page = max(0, bisect.bisect_right(self.page_chars, char) - 1)
+        page = min(page, self.pages - 1) if self.pages else 0
+        base_char, base_byte = int(self.page_chars[page]), int(self.page_bytes[page])
+        if char == base_char:
+            return base_byte
+        end = int(self.page_bytes[page + 1]) if page < self.pages else base_byte
+        prefix = self.text(base_byte, end)[:char - base_char]
+        return base_byte + len(prefix.encode("utf-8"))
+
+
+_maps = OrderedDict()
+_maps_lock = threading.Lock()
+
+
+def open_text(name: str) -> Optional[MappedText]:
+    """
+    Mapped text for a MEDIA_ROOT-relative name, or None if it is missing.
+    Recently used maps stay open; evicted ones are closed by the garbage
+    collector once no span refers to them.
+    """
+    path = _absolute(name)
+    with _maps_lock:
+        mapped = _maps.get(path)
+        if mapped is not None:
+            _maps.move_to_end(path)
+            return mapped
+    try:
+        mapped = MappedText(path)
+    except FileNotFoundError:
+        return None
+    with _maps_lock:
+        _maps[path] = mapped
+        while len(_maps) > getattr(settings, "PDF_TEXT_MAX_OPEN_MAPS", 256):
+            _maps.popitem(last=False)
+    return mapped
+
+
+def read_text(name: str, start: int, end: int) -> str:
+    mapped = open_text(name)
+    if mapped is None:
+        logger.warning(f"Text file {name} is missing; returning empty chunk text")
+        return ""
+    return mapped.text(start, end)
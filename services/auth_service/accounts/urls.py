@@ -3,7 +3,7 @@ from django.urls import path
 
 from .api import LoginView, SignupView, ProfileView, EmailVerificationView
 from rest_framework_simplejwt.views import TokenRefreshView
-from .api import UploadPDFView, ChatWithPDFView
+from .api import UploadPDFView, ChatWithPDFView, BatchChatView, AnswerCacheStatsView, OutboxStatsView, IngestionJobView, IngestionBatchView
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -17,7 +17,12 @@ urlpatterns = [
     path('verify-email/', EmailVerificationView.as_view(), name='verify_email'),
     # path('profile/details/', UserProfileDetailView.as_view(), name='profile_details'),
     path("upload-pdf/", UploadPDFView.as_view()),
+    path("ingest-jobs/<uuid:job_id>/", IngestionJobView.as_view(), name="ingest_job"),
+    path("ingest-batches/<uuid:batch_id>/", IngestionBatchView.as_view(), name="ingest_batch"),
     path("chat/", ChatWithPDFView.as_view()),
+    path("chat/batch/", BatchChatView.as_view(), name="chat_batch"),
+    path("chat/cache-stats/", AnswerCacheStatsView.as_view(), name="answer_cache_stats"),
+    path("outbox/stats/", OutboxStatsView.as_view(), name="outbox_stats"),
     
 ]
 
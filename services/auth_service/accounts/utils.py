@@ -1,16 +1,13 @@
-from pypdf import PdfReader
+# Page extraction is shared with chatpdf_service
+from pdf_extract import count_pdf_pages, iter_pdf_pages  # noqa: F401
+
 
 def extract_text_from_pdf(pdf_path: str) -> str:
-    reader = PdfReader(pdf_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() or ""
-    return text
+    return "".join(iter_pdf_pages(pdf_path))
+
 
+def chunk_text(text: str, chunk_size=500, overlap=0):
+    """Chunk an already-extracted string; see chunking.iter_chunks for streaming use"""
+    from .chunking import iter_chunks
 
-def chunk_text(text: str, chunk_size=500):
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size):
-        chunks.append(" ".join(words[i:i+chunk_size]))
-    return chunks
+    return [c.content for c in iter_chunks([text], max_tokens=chunk_size, overlap_tokens=overlap)]
@@ -0,0 +1,402 @@
+# accounts/vector_index.py
+
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+SUBSET_CACHE_SIZE = 128
+
+
+@dataclass
+class _Segment:
+    """Vectors assigned to the trained centroids after training, stored list by list like the base"""
+    name: str
+    ids: np.ndarray
+    vectors: np.ndarray
+    offsets: np.ndarray
+    saved: bool = False
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest neighbour index over unit vectors.
+
+    Vectors are clustered around ``nlist`` k-means centroids and stored
+    contiguously list by list, so a query only scores the ``nprobe`` lists
+    whose centroids are closest to it. The trained lists are saved as plain
+    ``.npy`` files and loaded with ``mmap_mode='r'``, so opening an index of
+    millions of chunks costs no RAM up front and pages are shared between
+    worker processes.
+
+    Newly added vectors go to an in-memory tail of at most ``max_tail``
+    vectors that is scanned exhaustively. A full tail is assigned to the
+    nearest existing centroids and written out as an append-only segment;
+    segments of similar size are merged, so there are only a few of them.
+    Adds never retrain: once segments hold more than ``rebuild_ratio`` of
+    the trained size, ``manage.py rebuild_pdf_index`` should be run to
+    recluster.
+    """
+
+    def __init__(self, dim: int, fingerprint: str = "", nprobe: int = 8,
+                 max_tail: int = 4096, rebuild_ratio: float = 0.2):
+        self.dim = dim
+        self.fingerprint = fingerprint
+        self.nprobe = nprobe
+        self.max_tail = max_tail
+        self.rebuild_ratio = rebuild_ratio
+
+        self.centroids = np.zeros((0, dim), dtype=np.float32)
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.segments: List[_Segment] = []
+
+        self._tail_vectors: List[np.ndarray] = []
+        self._tail_ids: List[int] = []
+        self._next_segment = 0
+        self._lock = threading.RLock()
+        self._trained_dirty = False
+        # Positions of recent search_subset selections; cleared whenever vectors move
+        self._subset_rows = OrderedDict()
+
+    def __len__(self):
+        return len(self.ids) + sum(len(s) for s in self.segments) + len(self._tail_ids)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    # ---------------------------------------------------------------- build
+
+    @staticmethod
+    def _choose_nlist(n: int) -> int:
+        return int(min(4096, max(1, np.sqrt(n))))
+
+    @staticmethod
+    def _kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+        """Spherical k-means on a sample of the data"""
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(data), max(k * 64, 10000))
+        sample = data[rng.choice(len(data), sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=k) == 0
+            sums[empty] = centroids[empty]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        return centroids
+
+    def _assign(self, data: np.ndarray, batch: int = 65536) -> np.ndarray:
+        out = np.empty(len(data), dtype=np.int64)
+        for start in range(0, len(data), batch):
+            out[start:start + batch] = np.argmax(
+                data[start:start + batch] @ self.centroids.T, axis=1
+            )
+        return out
+
+    def _by_list(self, ids: np.ndarray, vectors: np.ndarray,
+                 assign: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Reorder vectors list by list; returns ids, vectors and list offsets"""
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=self.nlist)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        return ids[order], vectors[order], offsets
+
+    def build(self, ids: np.ndarray, vectors: np.ndarray):
+        """(Re)train the index from scratch on the given vectors"""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if len(ids) == 0:
+                self.centroids = np.zeros((0, self.dim), dtype=np.float32)
+                self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+                self.ids = np.zeros(0, dtype=np.int64)
+                self.offsets = np.zeros(1, dtype=np.int64)
+            else:
+                self.centroids = self._kmeans(vectors, self._choose_nlist(len(ids)))
+                self.ids, self.vectors, self.offsets = self._by_list(ids, vectors, self._assign(vectors))
+            self.segments = []
+            self._tail_vectors = []
+            self._tail_ids = []
+            self._trained_dirty = True
+            self._subset_rows.clear()
+
+    def add(self, ids, vectors: np.ndarray):
+        """
+        Add vectors to the tail, moving a full tail into a segment. Ids that
+        are already indexed are skipped.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            fresh = ~np.isin(ids, self.all_ids())
+            ids, vectors = ids[fresh], vectors[fresh]
+            if not len(ids):
+                return
+            self._tail_vectors.extend(vectors)
+            self._tail_ids.extend(int(i) for i in ids)
+            self._subset_rows.clear()
+            if len(self._tail_ids) >= self.max_tail:
+                self._flush_tail()
+
+    def _flush_tail(self):
+        tail_ids, tail_vectors = self._tail_arrays()
+        if not self.nlist:
+            # Never trained; the tail is small enough to train on here
+            self.build(tail_ids, tail_vectors)
+            return
+        self.segments.append(self._new_segment(
+            *self._by_list(tail_ids, tail_vectors, self._assign(tail_vectors))))
+        self._tail_vectors = []
+        self._tail_ids = []
+        # Merge while the newest segment has caught up with the one before it,
+        # which keeps segment sizes growing geometrically
+        while len(self.segments) >= 2 and len(self.segments[-2]) <= 2 * len(self.segments[-1]):
+            newer, older = self.segments.pop(), self.segments.pop()
+            self.segments.append(self._merge(older, newer))
+        assigned = sum(len(s) for s in self.segments)
+        if assigned > len(self.ids) * self.rebuild_ratio:
+            logger.warning(
+                f"{assigned} vectors were added after the index was trained on {len(self.ids)}; "
+                f"run `manage.py rebuild_pdf_index` to recluster"
+            )
+
+    def _new_segment(self, ids: np.ndarray, vectors: np.ndarray, offsets: np.ndarray) -> _Segment:
+        segment = _Segment(f"segment-{self._next_segment}", ids, vectors, offsets)
+        self._next_segment += 1
+        return segment
+
+    def _merge(self, older: _Segment, newer: _Segment) -> _Segment:
+        lists = np.arange(self.nlist)
+        assign = np.concatenate([np.repeat(lists, np.diff(older.offsets)), np.repeat(lists, np.diff(newer.offsets))])
+        ids = np.concatenate([older.ids, newer.ids])
+        vectors = np.concatenate([np.asarray(older.vectors), np.asarray(newer.vectors)])
+        return self._new_segment(*self._by_list(ids, vectors, assign))
+
+    def all_ids(self) -> np.ndarray:
+        """Ids of every indexed vector, trained, in segments and in the tail"""
+        with self._lock:
+            return np.concatenate([self.ids] + [s.ids for s in self.segments]
+                                  + [np.asarray(self._tail_ids, dtype=np.int64)])
+
+    def _tail_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        if not self._tail_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.dim), dtype=np.float32)
+        return np.asarray(self._tail_ids, dtype=np.int64), np.vstack(self._tail_vectors)
+
+    # --------------------------------------------------------------- search
+
+    def search(self, query: np.ndarray, k: int = 5,
+               allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Return up to ``k`` (id, score) pairs, best first"""
+        return self.search_batch(np.asarray(query, dtype=np.float32)[None, :], k, allowed)[0]
+
+    def search_batch(self, queries: np.ndarray, k: int = 5,
+                     allowed: Optional[np.ndarray] = None,
+                     nprobe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """
+        ``allowed`` restricts results to a sorted array of ids. It is applied
+        before scoring, so rows outside the filter are never multiplied.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            centroids = self.centroids
+            parts = [(self.ids, self.vectors, self.offsets)]
+            parts.extend((s.ids, s.vectors, s.offsets) for s in self.segments)
+            tail_ids, tail_vectors = self._tail_arrays()
+
+        if allowed is not None:
+            keep = member(tail_ids, allowed)
+            tail_ids, tail_vectors = tail_ids[keep], tail_vectors[keep]
+
+        nprobe = min(nprobe or self.nprobe, len(centroids))
+        probes = None
+        if nprobe:
+            centroid_scores = queries @ centroids.T
+            probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        results = []
+        for qi, query in enumerate(queries):
+            cand_ids = [tail_ids]
+            cand_scores = [tail_vectors @ query]
+            if probes is not None:
+                for lst in probes[qi]:
+                    for ids, vectors, offsets in parts:
+                        start, end = offsets[lst], offsets[lst + 1]
+                        if start == end:
+                            continue
+                        list_ids = ids[start:end]
+                        if allowed is None:
+                            cand_ids.append(list_ids)
+                            cand_scores.append(vectors[start:end] @ query)
+                            continue
+                        rows = np.flatnonzero(member(list_ids, allowed))
+                        if len(rows):
+                            cand_ids.append(list_ids[rows])
+                            cand_scores.append(vectors[start + rows] @ query)
+            results.append(top_k(np.concatenate(cand_ids), np.concatenate(cand_scores), k))
+        return results
+
+    def search_subset(self, queries: np.ndarray, k: int,
+                      allowed: np.ndarray) -> List[List[Tuple[int, float]]]:
+        """
+        Exact search over the vectors whose ids are in the sorted array
+        ``allowed``, for selections small enough that scoring all of them
+        beats probing lists. Where a selection sits in the index is found
+        once and reused until the index next changes, so a repeated
+        selection costs one gather and one matrix product.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        key = np.asarray(allowed, dtype=np.int64).tobytes()
+        with self._lock:
+            parts = [(self.ids, self.vectors)]
+            parts.extend((s.ids, s.vectors) for s in self.segments)
+            parts.append(self._tail_arrays())
+            rows = self._subset_rows.get(key)
+            if rows is None:
+                rows = [np.flatnonzero(member(ids, allowed)) for ids, _ in parts]
+                self._subset_rows[key] = rows
+                if len(self._subset_rows) > SUBSET_CACHE_SIZE:
+                    self._subset_rows.popitem(last=False)
+            else:
+                self._subset_rows.move_to_end(key)
+
+        cand_ids = np.concatenate([ids[r] for (ids, _), r in zip(parts, rows)])
+        matrix = np.concatenate([np.asarray(vectors[r]) for (_, vectors), r in zip(parts, rows)])
+        scores = queries @ matrix.T
+        return [top_k(cand_ids, row, k) for row in scores]
+
+    # ---------------------------------------------------------- persistence
+
+    def save(self, path: str):
+        """
+        Persist the index under ``path``. The trained lists are only
+        rewritten after a (re)build and each segment is written once, so
+        routine adds only rewrite the bounded tail.
+        """
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            if self._trained_dirty or not os.path.exists(os.path.join(path, "meta.json")):
+                tmp = path.rstrip(os.sep) + ".tmp"
+                shutil.rmtree(tmp, ignore_errors=True)
+                os.makedirs(tmp)
+                np.save(os.path.join(tmp, "centroids.npy"), self.centroids)
+                np.save(os.path.join(tmp, "vectors.npy"), np.asarray(self.vectors))
+                np.save(os.path.join(tmp, "ids.npy"), self.ids)
+                np.save(os.path.join(tmp, "offsets.npy"), self.offsets)
+                for name in ("centroids.npy", "vectors.npy", "ids.npy", "offsets.npy"):
+                    os.replace(os.path.join(tmp, name), os.path.join(path, name))
+                shutil.rmtree(tmp, ignore_errors=True)
+                self._trained_dirty = False
+
+            for segment in self.segments:
+                if not segment.saved:
+                    for part in ("ids", "vectors", "offsets"):
+                        atomic_save(os.path.join(path, f"{segment.name}.{part}.npy"),
+                                    np.asarray(getattr(segment, part)))
+                    segment.saved = True
+
+            tail_ids, tail_vectors = self._tail_arrays()
+            atomic_save(os.path.join(path, "tail_ids.npy"), tail_ids)
+            atomic_save(os.path.join(path, "tail_vectors.npy"), tail_vectors)
+
+            meta = {
+                "version": INDEX_FORMAT_VERSION,
+                "dim": self.dim,
+                "fingerprint": self.fingerprint,
+                "nprobe": self.nprobe,
+                "trained": int(len(self.ids)),
+                "segments": [s.name for s in self.segments],
+                "next_segment": self._next_segment,
+                "tail": int(len(tail_ids)),
+            }
+            meta_path = os.path.join(path, "meta.json")
+            with open(meta_path + ".tmp", "w") as fh:
+                json.dump(meta, fh)
+            os.replace(meta_path + ".tmp", meta_path)
+
+            # Segments that were merged away or dropped by a rebuild; open maps keep their data
+            live = {s.name for s in self.segments}
+            for name in os.listdir(path):
+                if name.startswith("segment-") and name.split(".", 1)[0] not in live:
+                    os.remove(os.path.join(path, name))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, **options) -> Optional["IVFIndex"]:
+        """
+        Load an index saved with ``save``; returns None if there is none.
+        ``options`` are passed to the constructor, e.g. ``max_tail``.
+        """
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        if meta.get("version") != INDEX_FORMAT_VERSION:
+            logger.warning(f"Ignoring vector index at {path} with unknown format {meta.get('version')}")
+            return None
+
+        mode = "r" if mmap else None
+        index = cls(meta["dim"], fingerprint=meta.get("fingerprint", ""), nprobe=meta.get("nprobe", 8), **options)
+        index.centroids = np.load(os.path.join(path, "centroids.npy"))
+        index.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode)
+        index.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode=mode)
+        index.offsets = np.load(os.path.join(path, "offsets.npy"))
+        for name in meta.get("segments", []):
+            index.segments.append(_Segment(
+                name,
+                np.load(os.path.join(path, f"{name}.ids.npy"), mmap_mode=mode),
+                np.load(os.path.join(path, f"{name}.vectors.npy"), mmap_mode=mode),
+                np.load(os.path.join(path, f"{name}.offsets.npy")),
+                saved=True,
+            ))
+        index._next_segment = meta.get("next_segment", 0)
+        tail_ids = np.load(os.path.join(path, "tail_ids.npy"))
+        tail_vectors = np.load(os.path.join(path, "tail_vectors.npy"))
+        index._tail_ids = [int(i) for i in tail_ids]
+        index._tail_vectors = list(tail_vectors)
+        return index
+
+
+def member(ids: np.ndarray, allowed: np.ndarray) -> np.ndarray:
+    """Boolean mask of ``ids`` present in the sorted array ``allowed``"""
+    if len(allowed) == 0 or len(ids) == 0:
+        return np.zeros(len(ids), dtype=bool)
+    pos = np.searchsorted(allowed, ids)
+    pos[pos == len(allowed)] = 0
+    return allowed[pos] == ids
+
+
+def top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """The ``k`` best (id, score) pairs, best first"""
+    if len(ids) == 0:
+        return []
+    if len(ids) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def atomic_save(path: str, array: np.ndarray):
+    """Write ``array`` to ``path`` so readers see either the old file or the new one"""
+    tmp = path + ".tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
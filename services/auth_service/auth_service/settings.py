@@ -92,7 +92,66 @@ DATABASES = {
 
 
 KAFKA_BOOTSTRAP_SERVERS = os.getenv('KAFKA_BOOTSTRAP_SERVERS', "localhost:9092")
-KAFKA_ENABLED = os.getenv('KAFKA_ENABLED', 'True').lower() == 'true'
+KAFKA_ENABLED = os.getenv('KAFKA_ENABLED', 'False').lower() == 'true'
+KAFKA_ACKS = os.getenv('KAFKA_ACKS', '1')
+KAFKA_ACKS = int(KAFKA_ACKS) if KAFKA_ACKS.isdigit() else KAFKA_ACKS  # 0, 1 or 'all'
+KAFKA_LINGER_MS = int(os.getenv('KAFKA_LINGER_MS', '20'))
+KAFKA_BATCH_SIZE = int(os.getenv('KAFKA_BATCH_SIZE', str(64 * 1024)))
+KAFKA_COMPRESSION = os.getenv('KAFKA_COMPRESSION', 'gzip')  # gzip, snappy, lz4, zstd or empty for none
+KAFKA_MAX_BLOCK_MS = int(os.getenv('KAFKA_MAX_BLOCK_MS', '5000'))  # how long send() may wait for metadata/buffer space
+
+# Transactional outbox: events are written with the change and sent by `manage.py relay_outbox`
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '500'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '0.5'))
+OUTBOX_SEND_TIMEOUT = float(os.getenv('OUTBOX_SEND_TIMEOUT', '10'))
+OUTBOX_CLAIM_SECONDS = float(os.getenv('OUTBOX_CLAIM_SECONDS', '60'))  # lease on a claimed batch; longer than the send timeout
+OUTBOX_MAX_BACKOFF = float(os.getenv('OUTBOX_MAX_BACKOFF', '60'))
+OUTBOX_RETENTION_HOURS = float(os.getenv('OUTBOX_RETENTION_HOURS', '24'))
+
+# PDF chat retrieval
+PDF_EMBEDDER = os.getenv('PDF_EMBEDDER', 'accounts.embeddings.OpenAIEmbedder')
+PDF_EMBEDDING_MODEL = os.getenv('PDF_EMBEDDING_MODEL', 'text-embedding-3-small')
+PDF_EMBEDDING_DIM = int(os.getenv('PDF_EMBEDDING_DIM', '1536'))
+PDF_INDEX_DIR = os.getenv('PDF_INDEX_DIR', str(BASE_DIR / 'pdf_index'))
+PDF_INDEX_NPROBE = int(os.getenv('PDF_INDEX_NPROBE', '8'))
+PDF_INDEX_MAX_TAIL = int(os.getenv('PDF_INDEX_MAX_TAIL', '4096'))  # unclustered vectors before they are assigned to lists
+PDF_CHAT_TOP_K = int(os.getenv('PDF_CHAT_TOP_K', '5'))
+PDF_FILTER_EXACT_MAX = int(os.getenv('PDF_FILTER_EXACT_MAX', '20000'))  # larger filtered sets use the masked index
+PDF_SCOPE_CACHE_SECONDS = int(os.getenv('PDF_SCOPE_CACHE_SECONDS', '60'))  # how long a user's searchable chunk ids are reused
+PDF_SCOPE_CACHE_MAX_IDS = int(os.getenv('PDF_SCOPE_CACHE_MAX_IDS', '5000000'))  # ids held across all cached scopes
+PDF_RETRIEVAL_MODE = os.getenv('PDF_RETRIEVAL_MODE', 'hybrid')  # hybrid, vector or lexical
+PDF_HYBRID_DEPTH = int(os.getenv('PDF_HYBRID_DEPTH', '4'))  # candidates per retriever = top_k * depth
+PDF_HYBRID_LEXICAL_WEIGHT = float(os.getenv('PDF_HYBRID_LEXICAL_WEIGHT', '1.0'))
+PDF_CONTEXT_TOKEN_BUDGET = int(os.getenv('PDF_CONTEXT_TOKEN_BUDGET', '3000'))
+PDF_CONTEXT_MIN_PARTIAL_TOKENS = int(os.getenv('PDF_CONTEXT_MIN_PARTIAL_TOKENS', '100'))  # smallest partial chunk worth sending
+PDF_CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv('PDF_CONTEXT_DUPLICATE_THRESHOLD', '0.8'))  # skip chunks this much covered
+PDF_CHAT_LLM_PROVIDER = os.getenv('PDF_CHAT_LLM_PROVIDER', 'accounts.llm.OpenAIProvider')
+PDF_CHAT_MODEL = os.getenv('PDF_CHAT_MODEL', 'gpt-4o-mini')
+PDF_CHAT_BATCH_CONCURRENCY = int(os.getenv('PDF_CHAT_BATCH_CONCURRENCY', '8'))
+PDF_CHAT_BATCH_MAX_QUESTIONS = int(os.getenv('PDF_CHAT_BATCH_MAX_QUESTIONS', '50'))
+
+# Cache of generated answers: "memory" (per process), "redis" (shared) or "off"
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+PDF_ANSWER_CACHE = os.getenv('PDF_ANSWER_CACHE', 'memory')
+PDF_ANSWER_CACHE_TTL = int(os.getenv('PDF_ANSWER_CACHE_TTL', '3600'))
+PDF_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('PDF_ANSWER_CACHE_MAX_ENTRIES', '1024'))
+
+# Background PDF ingestion
+PDF_INGEST_WORKERS = int(os.getenv('PDF_INGEST_WORKERS', '4'))
+PDF_INGEST_MAX_PER_OWNER = int(os.getenv('PDF_INGEST_MAX_PER_OWNER', '2'))
+PDF_INGEST_EMBED_BATCH = int(os.getenv('PDF_INGEST_EMBED_BATCH', '256'))
+PDF_INGEST_INSERT_BATCH = int(os.getenv('PDF_INGEST_INSERT_BATCH', '500'))
+PDF_INGEST_USE_COPY = os.getenv('PDF_INGEST_USE_COPY', 'False').lower() == 'true'  # PostgreSQL only
+PDF_CHUNK_MAX_TOKENS = int(os.getenv('PDF_CHUNK_MAX_TOKENS', '400'))
+PDF_CHUNK_OVERLAP_TOKENS = int(os.getenv('PDF_CHUNK_OVERLAP_TOKENS', '50'))
+# PDF_EXTRACT_PROCESSES (extraction processes, default one per CPU) is read from the environment by pdf_extract
+
+# Content-addressed cache of extracted text, chunks and embeddings
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', str(BASE_DIR / 'pdf_cache'))
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+
+# Extracted text lives in MEDIA_ROOT/pdf_text; chunk rows hold byte offsets into it
+PDF_TEXT_MAX_OPEN_MAPS = int(os.getenv('PDF_TEXT_MAX_OPEN_MAPS', '256'))
 
 # Logging Configuration
 LOGGING = {
@@ -178,6 +237,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploads (pdfs/) and extracted text (pdf_text/); defaults to where uploads have always landed
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', str(BASE_DIR))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
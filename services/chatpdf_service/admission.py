@@ -0,0 +1,206 @@
+import asyncio
+import ipaddress
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+MAX_CONNECTIONS = int(os.getenv("CHAT_MAX_CONNECTIONS", "500"))
+MAX_INFLIGHT_LLM = int(os.getenv("CHAT_MAX_INFLIGHT_LLM", "64"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("CHAT_LLM_QUEUE_TIMEOUT", "2"))
+RATE_PER_MINUTE = float(os.getenv("CHAT_RATE_PER_MINUTE", "20"))
+RATE_BURST = int(os.getenv("CHAT_RATE_BURST", "5"))
+SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "256"))
+MAX_TRACKED_CLIENTS = 10000
+# Peers whose X-Forwarded-For is believed: the gateway and anything else on the private network
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(net.strip())
+    for net in os.getenv("CHAT_TRUSTED_PROXIES", "127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16").split(",")
+    if net.strip()
+]
+
+# WebSocket close code for "try again later"
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class Overloaded(Exception):
+    def __init__(self, reason, retry_after=1.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class SlowConsumer(Exception):
+    pass
+
+
+def busy_frame(reason, retry_after=1.0):
+    """Control frame telling the client to back off; normal frames are plain answer text"""
+    return json.dumps({"type": "busy", "reason": reason, "retry_after": round(retry_after, 2)})
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Spend one token; returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Admission for the /ws endpoint: a cap on open connections, a global
+    semaphore on in-flight LLM calls (waiting at most ``queue_timeout``
+    for a slot) and a per-client token bucket on messages.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_inflight=MAX_INFLIGHT_LLM,
+                 queue_timeout=LLM_QUEUE_TIMEOUT, rate_per_minute=RATE_PER_MINUTE,
+                 burst=RATE_BURST):
+        self.max_connections = max_connections
+        self.max_inflight = max_inflight
+        self.queue_timeout = queue_timeout
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.connections = 0
+        self.inflight = 0
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self._buckets = OrderedDict()
+        self.rejected = {"connections": 0, "rate_limited": 0, "llm_busy": 0, "slow_consumer": 0}
+
+    def try_connect(self):
+        if self.connections >= self.max_connections:
+            self.rejected["connections"] += 1
+            return False
+        self.connections += 1
+        return True
+
+    def disconnect(self):
+        self.connections -= 1
+
+    def check_rate(self, client_key):
+        bucket = self._buckets.get(client_key)
+        if bucket is None:
+            bucket = self._buckets[client_key] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(client_key)
+        wait = bucket.take()
+        if wait:
+            self.rejected["rate_limited"] += 1
+            raise Overloaded("rate_limited", wait)
+
+    @asynccontextmanager
+    async def llm_slot(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected["llm_busy"] += 1
+            raise Overloaded("llm_busy", self.queue_timeout)
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "connections": self.connections,
+            "max_connections": self.max_connections,
+            "llm_inflight": self.inflight,
+            "max_inflight_llm": self.max_inflight,
+            "tracked_clients": len(self._buckets),
+            "rejected": dict(self.rejected),
+        }
+
+
+class BoundedSender:
+    """
+    Sends frames from a bounded queue on a background task, so the
+    producer never blocks on a slow socket. A full queue means the client
+    is not keeping up and raises SlowConsumer.
+    """
+
+    def __init__(self, websocket, maxsize=SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize)
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            text = await self.queue.get()
+            if text is None:
+                return
+            await self.websocket.send_text(text)
+
+    def send(self, text):
+        if self.task.done():
+            # Surfaces the socket error that stopped the writer
+            self.task.result()
+            raise SlowConsumer("sender closed")
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            raise SlowConsumer(f"{self.queue.qsize()} frames pending")
+
+    async def aclose(self, timeout=5.0):
+        """Flush what is queued (for at most ``timeout`` seconds) and stop"""
+        if not self.task.done():
+            try:
+                self.queue.put_nowait(None)
+                await asyncio.wait_for(asyncio.shield(self.task), timeout)
+            except Exception:
+                pass  # queue still full, flush timed out or the socket is gone
+        self.task.cancel()
+        try:
+            await self.task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+def _is_trusted(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in net for net in TRUSTED_PROXIES)
+
+
+def client_key(websocket):
+    """
+    Rate-limit key: the client address as seen by the first trusted proxy.
+    X-Forwarded-For is only read when the peer is a trusted proxy, and then
+    from the right: each proxy appends the address it got the connection
+    from, while anything to the left of that came from the client and can
+    be forged to get a fresh bucket per connection.
+    """
+    address = websocket.client.host if websocket.client else "unknown"
+    if not _is_trusted(address):
+        return address
+    for hop in reversed(websocket.headers.get("x-forwarded-for", "").split(",")):
+        address = hop.strip() or address
+        if not _is_trusted(address):
+            break
+    return address
+
+
+_controller = None
+
+
+def get_admission_controller():
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
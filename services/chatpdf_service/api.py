@@ -1,4 +1,9 @@
-from pypdf import PdfReader
+import hashlib
+import mmap
+import threading
+from collections import OrderedDict
+
+from pdf_extract import iter_pdf_pages
 from openai import OpenAI
 import google.generativeai as genai
 from dotenv import load_dotenv
@@ -10,10 +15,91 @@ client = OpenAI(api_key="YOUR_OPENAI_API_KEY")
 
 def load_pdf_text(pdf_path: str) -> str:
     """Extract text from PDF"""
-    reader = PdfReader(pdf_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() + "\n"
+    return "".join(f"{page}\n" for page in iter_pdf_pages(pdf_path))
+
+
+TEXT_CACHE_DIR = os.getenv("PDF_TEXT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".pdf_text_cache"))
+TEXT_CACHE_MAX_BYTES = int(os.getenv("PDF_TEXT_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+HASH_MEMO_SIZE = int(os.getenv("PDF_HASH_MEMO_SIZE", "1024"))
+_hash_memo = OrderedDict()
+_hash_memo_lock = threading.Lock()
+
+
+def file_sha256(pdf_path: str) -> str:
+    """SHA-256 of the file bytes, memoised on (path, size, mtime) for the most recently used files"""
+    st = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), st.st_size, st.st_mtime_ns)
+    with _hash_memo_lock:
+        if key in _hash_memo:
+            _hash_memo.move_to_end(key)
+            return _hash_memo[key]
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    with _hash_memo_lock:
+        _hash_memo[key] = digest.hexdigest()
+        while len(_hash_memo) > HASH_MEMO_SIZE:
+            _hash_memo.popitem(last=False)
+    return digest.hexdigest()
+
+
+def _evict_text_cache():
+    entries = []
+    for e in os.scandir(TEXT_CACHE_DIR):
+        if not e.name.endswith(".txt"):
+            continue
+        try:
+            st = e.stat()
+        except FileNotFoundError:
+            # Evicted by another worker meanwhile
+            continue
+        entries.append((st.st_mtime, st.st_size, e.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= TEXT_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _read_mapped(path: str) -> str:
+    """Decode a UTF-8 file straight from its memory map, without an intermediate bytes copy"""
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, "utf-8")
+
+
+def load_pdf_text_cached(pdf_path: str) -> str:
+    """
+    Extracted text keyed by the PDF's content hash, kept on disk under a
+    byte budget with least-recently-used eviction, so the same file is
+    parsed once however many questions are asked about it. Pages are
+    written to the cache file as they are extracted and read back through
+    mmap.
+    """
+    cache_path = os.path.join(TEXT_CACHE_DIR, f"{file_sha256(pdf_path)}.txt")
+    try:
+        text = _read_mapped(cache_path)
+        os.utime(cache_path)
+        return text
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(TEXT_CACHE_DIR, exist_ok=True)
+    tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        for page in iter_pdf_pages(pdf_path):
+            fh.write(f"{page}\n")
+    os.replace(tmp, cache_path)
+    # Read before evicting, which removes this very file if it alone exceeds the budget
+    text = _read_mapped(cache_path)
+    _evict_text_cache()
     return text
 
 
@@ -47,7 +133,7 @@ def load_pdf_text(pdf_path: str) -> str:
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 def chat_with_pdf(pdf_path: str, question: str) -> str:
-    pdf_text = load_pdf_text(pdf_path)
+    pdf_text = load_pdf_text_cached(pdf_path)
 
     model = genai.GenerativeModel("gemini-1.5-flash")
 
@@ -0,0 +1,118 @@
+"""
+Per-message logging overhead on the /ws hot path: the old print-based
+logging versus the queue-backed structured logger.
+
+    python bench_logging.py --messages 2000 --chunks 40 --sink file
+
+Each simulated message logs what one chat turn logged: the inbound
+message, the Gemini request and response, and one entry per streamed
+chunk. Only the time spent on the calling thread is counted, since that
+is what delays the event loop. Queue drain time is reported separately.
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import chat_logging
+
+
+def fake_turn(chunks):
+    history = [{"role": "user", "parts": [{"text": "What does Docextract.ai do? " * 8}]}] * 6
+    headers = {"content-type": "application/json; charset=UTF-8", "server": "scaffolding on HTTPServer2",
+               "x-xss-protection": "0", "x-frame-options": "SAMEORIGIN", "alt-svc": 'h3=":443"; ma=2592000'}
+    lines = [f'{{"candidates": [{{"content": {{"parts": [{{"text": "token {i} "}}]}}}}]}}' for i in range(chunks)]
+    return history, headers, lines
+
+
+def old_style(data, history, headers, lines):
+    print("=" * 60)
+    print(f"📥 RECEIVED MESSAGE FROM CLIENT: '{data}'")
+    print(f"📏 Message length: {len(data)} characters")
+    print("=" * 60)
+    print(f"🔥 Starting Gemini API call with history: {len(history)} messages")
+    print("📤 Sending request to Gemini API...")
+    print(f"📋 Request body: {{'contents': {history}}}")
+    print("📡 Response status: 200")
+    print(f"📡 Response headers: {headers}")
+    for line in lines:
+        print(f"🔍 Raw line: {line}")
+    for i, line in enumerate(lines, start=1):
+        print(f"📦 Chunk {i}: 'token {i} '")
+    print(f"✅ Finished streaming. Total chunks: {len(lines)}")
+
+
+def new_style(logger, data, history, headers, lines):
+    logger.info("ws.message", extra={"client": "bench", "chars": len(data)})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("ws.message_body", extra={"client": "bench", "text": data})
+    logger.info("gemini.request", extra={"messages": len(history)})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("gemini.request_body", extra={"body": {"contents": history}})
+        logger.debug("gemini.response_headers", extra={"status": 200, "headers": headers})
+    for i, line in enumerate(lines, start=1):
+        if i == 1:
+            logger.info("gemini.first_chunk", extra={"ms": 1.0})
+        logger.debug("gemini.chunk", extra={"chunk": i, "chars": len(line)})
+    logger.info("gemini.done", extra={"chunks": len(lines), "ms": 10.0})
+
+
+def measure(fn, messages):
+    samples = []
+    for _ in range(messages):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[int(len(samples) * 0.99) - 1],
+    }
+
+
+def open_sink(kind, directory):
+    if kind == "devnull":
+        return open(os.devnull, "w")
+    if kind == "memory":
+        return io.StringIO()
+    return open(os.path.join(directory, f"{kind}.log"), "w", buffering=1)  # line buffered, like a tty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--sink", choices=["file", "devnull", "memory"], default="file")
+    parser.add_argument("--level", default="INFO")
+    args = parser.parse_args()
+
+    history, headers, lines = fake_turn(args.chunks)
+    data = "What does Docextract.ai do?"
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open_sink(args.sink, directory) as sink, contextlib.redirect_stdout(sink):
+            before = measure(lambda: old_style(data, history, headers, lines), args.messages)
+
+        with open_sink(args.sink, directory) as sink:
+            chat_logging.setup_logging(stream=sink, level=args.level.upper())
+            logger = chat_logging.get_logger("bench")
+            after = measure(lambda: new_style(logger, data, history, headers, lines), args.messages)
+            started = time.perf_counter()
+            chat_logging.stop_logging()
+            drain_ms = (time.perf_counter() - started) * 1000
+
+    print(f"{args.messages} messages x {args.chunks} chunks, sink={args.sink}, level={args.level.upper()}")
+    for name, result in (("print", before), ("queued", after)):
+        print(f"  {name:<7} mean {result['mean_us']:8.1f} us  p50 {result['p50_us']:8.1f} us  "
+              f"p99 {result['p99_us']:8.1f} us per message")
+    print(f"  speedup {before['mean_us'] / after['mean_us']:.1f}x on the calling thread; "
+          f"queue drained in {drain_ms:.1f} ms, {chat_logging.DroppingQueueHandler.dropped} records dropped")
+
+
+if __name__ == "__main__":
+    main()
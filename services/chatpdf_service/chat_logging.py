@@ -0,0 +1,128 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("CHAT_LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("CHAT_LOG_QUEUE_SIZE", "10000"))
+# Per-event sample rates, e.g. "gemini.chunk=0.01,http.request=0.1"
+LOG_SAMPLE = os.getenv("CHAT_LOG_SAMPLE", "gemini.chunk=0.01,http.request=0.1")
+
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener = None
+
+
+def parse_sample_rates(spec):
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = float(rate)
+    return rates
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, then the event's fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of high-volume events; warnings and errors always pass"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.msg)
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without blocking the event loop.
+    Records are not pre-formatted here, and when the queue is full they
+    are counted and dropped rather than stalling a request.
+    """
+
+    dropped = 0
+
+    def handle(self, record):
+        # queue.Queue is already thread-safe, so skip Handler's lock
+        if self.filter(record):
+            self.enqueue(record)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def setup_logging(stream=None, level=LOG_LEVEL, sample=LOG_SAMPLE):
+    """
+    Route the chat service's loggers through a bounded queue to a
+    background thread that writes JSON lines. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter())
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_sample_rates(sample)))
+
+    root = logging.getLogger("chatpdf")
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    setup_logging()
+    return logging.getLogger(f"chatpdf.{name}")
+
+
+class Timer:
+    """Elapsed milliseconds for log fields"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+
+    @property
+    def ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 2)
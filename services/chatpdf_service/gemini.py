@@ -1,16 +1,83 @@
+import json
+import logging
 import os
-import httpx
 from dotenv import load_dotenv
 
+from chat_logging import Timer, get_logger
+from http_client import request_timeout, stream_request
+
+logger = get_logger(__name__)
+
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-print("GEMINI_API_KEY:", GEMINI_API_KEY)  # Debugging line to check if the key is loaded
+if not GEMINI_API_KEY:
+    logger.warning("gemini.no_api_key")
 
 GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent"
 
-async def stream_from_gemini(history):
-    print(f"🔥 Starting Gemini API call with history: {len(history)} messages")
+class JSONArrayStreamParser:
+    """
+    Incrementally parses a streamed top-level JSON array such as
+    ``[{...},\n{...}]``. Feed it text as it arrives; it returns each
+    element as soon as that element's closing brace has been received.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._scan = 0          # next character of the buffer to inspect
+        self._start = None      # where the element being read begins
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        self._buffer += text
+        items = []
+        buf = self._buffer
+        i = self._scan
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0 and ch == "{":
+                    self._start = i
+                if self._depth > 0 or ch == "{":
+                    self._depth += 1
+            elif ch in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    items.append(self._decoder.raw_decode(buf, self._start)[0])
+                    self._start = None
+            i += 1
+        # Drop everything before the element in progress so the buffer stays small
+        keep = self._start if self._start is not None else len(buf)
+        self._buffer = buf[keep:]
+        self._scan = i - keep
+        if self._start is not None:
+            self._start = 0
+        return items
+
+
+def candidate_text(item):
+    """Text of the first candidate in one streamGenerateContent response object"""
+    candidates = item.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+async def stream_from_gemini(history, system_instruction=None, read_timeout=None):
     headers = {
         "Content-Type": "application/json"
     }
@@ -24,57 +91,42 @@ async def stream_from_gemini(history):
             "maxOutputTokens": 100
         }
     }
-    print(f"📤 Sending request to Gemini API...")
-    print(f"📋 Request body: {body}")
+    if system_instruction:
+        body["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+    logger.info("gemini.request", extra={"messages": len(history)})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("gemini.request_body", extra={"body": body})
+    timer = Timer()
 
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
-            async with client.stream("POST", GEMINI_URL, params=params, headers=headers, json=body) as response:
-                print(f"📡 Response status: {response.status_code}")
-                print(f"📡 Response headers: {dict(response.headers)}")
-                
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    print(f"❌ API Error: {response.status_code} - {error_text.decode()}")
-                    return
-                
-                chunk_count = 0
-                full_response = ""
-                async for line in response.aiter_lines():
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    print(f"🔍 Raw line: {line}")
-                    full_response += line
-                
-                # Parse the complete response once we have it all
-                try:
-                    import json
-                    print(f"🔧 Attempting to parse complete response ({len(full_response)} chars)")
-                    response_data = json.loads(full_response)
-                    
-                    # Handle array of response objects
-                    if isinstance(response_data, list):
-                        for item in response_data:
-                            if "candidates" in item and len(item["candidates"]) > 0:
-                                candidate = item["candidates"][0]
-                                if "content" in candidate and "parts" in candidate["content"]:
-                                    parts = candidate["content"]["parts"]
-                                    if len(parts) > 0 and "text" in parts[0]:
-                                        text_content = parts[0]["text"]
-                                        chunk_count += 1
-                                        print(f"📦 Chunk {chunk_count}: '{text_content}'")
-                                        yield text_content
-                    
-                except json.JSONDecodeError as je:
-                    print(f"❌ Failed to parse complete response: {je}")
-                    print(f"Response preview: {full_response[:200]}...")
-                except Exception as parse_error:
-                    print(f"❌ Parse error: {parse_error}")
-                
-                print(f"✅ Finished streaming. Total chunks: {chunk_count}")
-    
+        async with stream_request("POST", GEMINI_URL, params=params, headers=headers, json=body,
+                                  timeout=request_timeout(read_timeout)) as response:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("gemini.response_headers", extra={"status": response.status_code,
+                                                               "headers": dict(response.headers)})
+            
+            if response.status_code != 200:
+                error_text = await response.aread()
+                logger.error("gemini.http_error", extra={"status": response.status_code,
+                                                         "body": error_text.decode(errors="replace")[:500]})
+                return
+            
+            chunk_count = 0
+            parser = JSONArrayStreamParser()
+            async for text in response.aiter_text():
+                for item in parser.feed(text):
+                    if "error" in item:
+                        logger.error("gemini.stream_error", extra={"error": item["error"]})
+                        return
+                    text_content = candidate_text(item)
+                    if text_content:
+                        chunk_count += 1
+                        if chunk_count == 1:
+                            logger.info("gemini.first_chunk", extra={"ms": timer.ms})
+                        logger.debug("gemini.chunk", extra={"chunk": chunk_count, "chars": len(text_content)})
+                        yield text_content
+            
+            logger.info("gemini.done", extra={"chunks": chunk_count, "ms": timer.ms})
+
     except Exception as e:
-        print(f"💥 Exception in Gemini API call: {e}")
-        print(f"💥 Exception type: {type(e).__name__}")
\ No newline at end of file
+        logger.error("gemini.failed", extra={"error": str(e), "error_type": type(e).__name__})
\ No newline at end of file
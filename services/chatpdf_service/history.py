@@ -0,0 +1,118 @@
+import math
+import os
+import re
+from collections import deque
+
+MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "8"))
+TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "300"))
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    """Rough token count, about one token per four characters of each word"""
+    return sum(max(1, math.ceil(len(w) / 4)) for w in _WORD.findall(text))
+
+
+def condense_turn(role, text, max_chars=160):
+    """One summary line for a turn: its first sentence, clipped"""
+    first = _SENTENCE_END.split(" ".join(text.split()), maxsplit=1)[0]
+    if len(first) > max_chars:
+        first = first[:max_chars - 1].rstrip() + "…"
+    return f"{'User' if role == 'user' else 'Assistant'}: {first}"
+
+
+class ConversationHistory:
+    """
+    What gets sent to Gemini for one conversation.
+
+    The system instruction is held once and sent as ``systemInstruction``.
+    The most recent ``max_turns`` messages are kept verbatim as long as
+    they fit ``token_budget``; older ones are folded into a rolling
+    summary capped at ``summary_token_budget`` (oldest lines drop first).
+    Memory per conversation is therefore bounded however long it runs.
+    """
+
+    def __init__(self, system_instruction, greeting=None, max_turns=MAX_TURNS,
+                 token_budget=TOKEN_BUDGET, summary_token_budget=SUMMARY_TOKEN_BUDGET):
+        self.system_instruction = system_instruction
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.turns = deque()          # (role, text, tokens)
+        self.turn_tokens = 0
+        self.summary_lines = deque()  # (line, tokens)
+        self.summary_tokens = 0
+        if greeting:
+            self.add("model", greeting)
+
+    def add(self, role, text):
+        tokens = estimate_tokens(text)
+        self.turns.append((role, text, tokens))
+        self.turn_tokens += tokens
+        self._trim()
+
+    def _trim(self):
+        # Always keep the newest message verbatim, even if it alone is over budget
+        while len(self.turns) > 1 and (len(self.turns) > self.max_turns or self.turn_tokens > self.token_budget):
+            self._fold(*self.turns.popleft())
+            # Fold whole exchanges so the window still opens with a user turn
+            while len(self.turns) > 1 and self.turns[0][0] != "user":
+                self._fold(*self.turns.popleft())
+
+    def add_user(self, text):
+        self.add("user", text)
+
+    def add_model(self, text):
+        if text.strip():
+            self.add("model", text)
+
+    def _fold(self, role, text, tokens):
+        self.turn_tokens -= tokens
+        line = condense_turn(role, text)
+        self._add_summary_line(line)
+
+    def _add_summary_line(self, line):
+        tokens = estimate_tokens(line)
+        self.summary_lines.append((line, tokens))
+        self.summary_tokens += tokens
+        while self.summary_lines and self.summary_tokens > self.summary_token_budget:
+            self.summary_tokens -= self.summary_lines.popleft()[1]
+
+    @property
+    def summary(self):
+        return "\n".join(line for line, _ in self.summary_lines)
+
+    def system_text(self):
+        if not self.summary_lines:
+            return self.system_instruction
+        return f"{self.system_instruction}\n\nSummary of the earlier conversation:\n{self.summary}"
+
+    def contents(self):
+        """The ``contents`` list for a generateContent request"""
+        return [{"role": role, "parts": [{"text": text}]} for role, text, _ in self.turns]
+
+    def to_dict(self):
+        """Serializable state for a session store; the system instruction is not included"""
+        return {
+            "turns": [[role, text] for role, text, _ in self.turns],
+            "summary": [line for line, _ in self.summary_lines],
+        }
+
+    @classmethod
+    def from_dict(cls, data, system_instruction, **kwargs):
+        """Rebuild a stored conversation under the current instruction and budgets"""
+        history = cls(system_instruction, **kwargs)
+        for line in data.get("summary", []):
+            history._add_summary_line(line)
+        for role, text in data.get("turns", []):
+            tokens = estimate_tokens(text)
+            history.turns.append((role, text, tokens))
+            history.turn_tokens += tokens
+        history._trim()
+        return history
+
+    def token_estimate(self):
+        return estimate_tokens(self.system_instruction) + self.summary_tokens + self.turn_tokens
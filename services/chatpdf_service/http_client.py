@@ -0,0 +1,146 @@
+import asyncio
+import importlib.util
+import os
+import random
+from contextlib import asynccontextmanager
+
+import httpx
+
+from chat_logging import get_logger
+
+logger = get_logger(__name__)
+
+MAX_CONNECTIONS = int(os.getenv("GEMINI_HTTP_MAX_CONNECTIONS", "200"))
+MAX_KEEPALIVE = int(os.getenv("GEMINI_HTTP_MAX_KEEPALIVE", "50"))
+KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("GEMINI_HTTP2", "true").lower() == "true"
+CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "60"))
+POOL_TIMEOUT = float(os.getenv("GEMINI_POOL_TIMEOUT", "10"))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "4"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Failures that happen before the provider has started answering
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+_client = None
+_stats = {"requests": 0, "in_flight": 0, "retries": 0, "failures": 0}
+
+
+def request_timeout(read=None):
+    """Timeout for one call; ``read`` bounds the gap between streamed chunks"""
+    return httpx.Timeout(
+        connect=CONNECT_TIMEOUT,
+        read=READ_TIMEOUT if read is None else read,
+        write=CONNECT_TIMEOUT,
+        pool=POOL_TIMEOUT,
+    )
+
+
+def create_client():
+    http2 = HTTP2 and importlib.util.find_spec("h2") is not None
+    if HTTP2 and not http2:
+        logger.warning("http.h2_missing")
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=request_timeout(),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def start_http_client():
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client():
+    """The application-wide client; created on first use outside the app lifespan"""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, honouring a numeric Retry-After"""
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+@asynccontextmanager
+async def stream_request(method, url, retries=None, **kwargs):
+    """
+    ``client.stream`` on the shared client, retried with jittered backoff on
+    connection failures and 429/5xx responses. Retries only happen before
+    the response is handed to the caller, never once it has been read.
+    """
+    client = get_http_client()
+    retries = MAX_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        yielded = False
+        retry_after = None
+        _stats["requests"] += 1
+        _stats["in_flight"] += 1
+        try:
+            async with client.stream(method, url, **kwargs) as response:
+                if response.status_code in RETRY_STATUSES and attempt < retries:
+                    retry_after = response.headers.get("retry-after")
+                    logger.warning("http.retry", extra={"status": response.status_code, "attempt": attempt + 1})
+                else:
+                    yielded = True
+                    yield response
+                    return
+        except RETRY_EXCEPTIONS as e:
+            if yielded or attempt >= retries:
+                _stats["failures"] += 1
+                raise
+            logger.warning("http.retry", extra={"error_type": type(e).__name__, "attempt": attempt + 1})
+        except Exception:
+            if not yielded:
+                _stats["failures"] += 1
+            raise
+        finally:
+            _stats["in_flight"] -= 1
+        attempt += 1
+        _stats["retries"] += 1
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+
+def http_pool_stats():
+    """Request counters plus a snapshot of the connection pool"""
+    stats = dict(_stats)
+    stats["limits"] = {
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive_connections": MAX_KEEPALIVE,
+        "keepalive_expiry": KEEPALIVE_EXPIRY,
+    }
+    # httpx does not expose its pool publicly; read httpcore's view when available
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    stats["connections"] = {
+        "total": len(connections),
+        "idle": sum(1 for c in connections if c.is_idle()),
+        "http2": sum(1 for c in connections if "HTTP/2" in repr(c)),
+    }
+    stats["http2_enabled"] = bool(_client is not None and getattr(pool, "_http2", False))
+    return stats
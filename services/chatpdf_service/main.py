@@ -1,17 +1,59 @@
-from fastapi import FastAPI, WebSocket, Request
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from gemini import stream_from_gemini
+from admission import (
+    CLOSE_TRY_AGAIN_LATER,
+    BoundedSender,
+    Overloaded,
+    SlowConsumer,
+    busy_frame,
+    client_key,
+    get_admission_controller,
+)
+from chat_logging import Timer, get_logger, setup_logging, stop_logging
+from history import ConversationHistory
+from http_client import close_http_client, http_pool_stats, start_http_client
+from sessions import close_session_store, get_session_store, new_session_id, session_frame, valid_session_id
+
+logger = get_logger(__name__)
+
+SYSTEM_INSTRUCTION = (
+    "You are an AI assistant for Docextract.ai. Only talk about Docextract, services, or support. "
+    "Do not answer unrelated questions."
+)
+GREETING = (
+    "Hello! I'm your Docextract.ai assistant. I can help you with information about Docextract.ai, "
+    "services, and support. How can I assist you today?"
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for the whole process, so WebSocket turns reuse
+    # keep-alive (and HTTP/2) connections to Gemini instead of reconnecting
+    setup_logging()
+    await start_http_client()
+    yield
+    await close_http_client()
+    await close_session_store()
+    stop_logging()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    print(f"🌐 HTTP Request: {request.method} {request.url}")
+    timer = Timer()
     response = await call_next(request)
-    print(f"📤 Response: {response.status_code}")
+    # Sampled via CHAT_LOG_SAMPLE, so this stays cheap on busy endpoints
+    logger.info("http.request", extra={"method": request.method, "path": request.url.path,
+                                       "status": response.status_code, "ms": timer.ms})
     return response
 
 # Enable CORS for frontend
@@ -24,73 +66,110 @@ app.add_middleware(
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    print("=" * 60)
-    print("🚀 WEBSOCKET ENDPOINT HIT - CLIENT ATTEMPTING CONNECTION")
-    print(f"Client: {websocket.client}")
-    print(f"Headers: {websocket.headers}")
-    print("=" * 60)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("ws.connect_headers", extra={"client": str(websocket.client),
+                                                  "headers": dict(websocket.headers)})
+    admission = get_admission_controller()
     await websocket.accept()
-    print("✅ WEBSOCKET CONNECTION ACCEPTED AND ESTABLISHED!")
-    print("=" * 60)
-
-    history = [
-        {
-            "role": "model",
-            "parts": [
-                {
-                    "text": "Hello! I'm your Docextract.ai assistant. I can help you with information about Docextract.ai, services, and support. How can I assist you today?"
-                }
-            ]
-        }
-    ]
+    if not admission.try_connect():
+        logger.warning("ws.rejected", extra={"client": str(websocket.client),
+                                             "connections": admission.connections})
+        await websocket.send_text(busy_frame("too_many_connections", 5.0))
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+        return
+    logger.info("ws.connected", extra={"client": str(websocket.client)})
+
+    try:
+        await chat_session(websocket, admission)
+    finally:
+        admission.disconnect()
+
+
+async def load_history(store, session_id):
+    """The stored conversation for a session id, or a fresh one"""
+    state = await store.load(session_id) if valid_session_id(session_id) else None
+    if state is None:
+        return ConversationHistory(SYSTEM_INSTRUCTION, greeting=GREETING), False
+    return ConversationHistory.from_dict(state, SYSTEM_INSTRUCTION), True
+
+
+async def chat_session(websocket: WebSocket, admission):
+    # Clients reconnect with ws://.../ws?session_id=<id> to resume on any worker
+    store = get_session_store()
+    session_id = websocket.query_params.get("session_id")
+    history, resumed = await load_history(store, session_id)
+    if not resumed and not valid_session_id(session_id):
+        session_id = new_session_id()
+    sender = BoundedSender(websocket)
+    sender.send(session_frame(session_id, resumed))
+    key = client_key(websocket)
+    logger.info("session.start", extra={"client": key, "session": session_id, "resumed": resumed})
 
     while True:
         try:
             data = await websocket.receive_text()
-            print("=" * 60)
-            print(f"📥 RECEIVED MESSAGE FROM CLIENT: '{data}'")
-            print(f"📏 Message length: {len(data)} characters")
-            print("=" * 60)
+            logger.info("ws.message", extra={"client": key, "chars": len(data)})
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("ws.message_body", extra={"client": key, "text": data})
             
             if data.lower() == "exit":
+                await sender.aclose()
                 await websocket.close()
-                print("WebSocket connection closed")
+                logger.info("ws.closed", extra={"client": key})
                 break
             
-            # Add system instruction with the user message
-            user_message = f"You are an AI assistant for Docextract.ai. Only talk about Docextract, services, or support. Do not answer unrelated questions. User question: {data}"
-            
-            history.append({
-                "role": "user",
-                "parts": [{"text": user_message}]
-            })
-
-            full_response = ""
-            async for chunk in stream_from_gemini(history):
-                full_response += chunk
-                await websocket.send_text(chunk)
+            try:
+                admission.check_rate(key)
+                async with admission.llm_slot():
+                    history.add_user(data)
+                    full_response = ""
+                    async for chunk in stream_from_gemini(history.contents(), system_instruction=history.system_text()):
+                        full_response += chunk
+                        sender.send(chunk)
+            except Overloaded as e:
+                logger.warning("ws.busy", extra={"client": key, "reason": e.reason,
+                                                 "retry_after": round(e.retry_after, 2)})
+                sender.send(busy_frame(e.reason, e.retry_after))
+                continue
             
             # Add the complete response to history for context
-            if full_response.strip():
-                history.append({
-                    "role": "model",
-                    "parts": [{"text": full_response}]
-                })
+            history.add_model(full_response)
+            await store.save(session_id, history.to_dict())
 
+        except SlowConsumer as e:
+            admission.rejected["slow_consumer"] += 1
+            logger.warning("ws.slow_consumer", extra={"client": key, "detail": str(e)})
+            await sender.aclose(timeout=0)
+            try:
+                await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+            except Exception:
+                pass
+            break
+        except WebSocketDisconnect as e:
+            logger.info("ws.disconnected", extra={"client": key, "code": e.code})
+            break
         except Exception as e:
-            print(f"Error: {e}")
+            logger.error("ws.error", extra={"client": key, "error": str(e)}, exc_info=True)
             break
 
+    await sender.aclose(timeout=0)
+
 # Add a simple HTTP endpoint to test if the server is working
 @app.get("/test")
 async def test_endpoint():
-    print("🧪 Test endpoint hit!")
     return {"message": "Server is working!", "websocket_available": True}
 
+@app.get("/stats/http")
+async def http_stats():
+    return http_pool_stats()
+
+@app.get("/stats/admission")
+async def admission_stats():
+    return get_admission_controller().stats()
+
 # Add a direct route for the main page to debug
 @app.get("/debug")
 async def debug_page():
-    print("🏠 Debug page accessed!")
     return HTMLResponse("""
     <!DOCTYPE html>
     <html>
@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+
+from chat_logging import get_logger
+
+SESSION_STORE = os.getenv("CHAT_SESSION_STORE", "memory")
+SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", str(24 * 3600)))
+MAX_LOCAL_SESSIONS = int(os.getenv("CHAT_MAX_LOCAL_SESSIONS", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+logger = get_logger(__name__)
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def valid_session_id(session_id):
+    return bool(session_id) and bool(_SESSION_ID.match(session_id))
+
+
+def session_frame(session_id, resumed):
+    """Control frame telling the client which id to reconnect with"""
+    return json.dumps({"type": "session", "session_id": session_id, "resumed": resumed})
+
+
+class SessionStore:
+    """Conversation state keyed by session id, saved after every completed turn"""
+
+    async def load(self, session_id):
+        raise NotImplementedError
+
+    async def save(self, session_id, state):
+        raise NotImplementedError
+
+    async def delete(self, session_id):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Sessions held by this process only. Fine for a single worker; a
+    reconnect that lands on another worker starts a new conversation.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_LOCAL_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # id -> (expires_at, state)
+
+    async def load(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return entry[1]
+
+    async def save(self, session_id, state):
+        self._sessions[session_id] = (time.monotonic() + self.ttl, state)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def delete(self, session_id):
+        self._sessions.pop(session_id, None)
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions shared by every worker and node through Redis, stored as JSON
+    with a sliding TTL. If Redis is unavailable the conversation carries on
+    in memory for this connection and is simply not resumable.
+    """
+
+    def __init__(self, url=REDIS_URL, ttl=SESSION_TTL, prefix="chatpdf:session:"):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    async def load(self, session_id):
+        try:
+            raw = await self.client.get(self.prefix + session_id)
+        except Exception as e:
+            logger.warning("session.load_failed", extra={"error": str(e)})
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def save(self, session_id, state):
+        try:
+            await self.client.set(self.prefix + session_id, json.dumps(state), ex=self.ttl)
+        except Exception as e:
+            logger.warning("session.save_failed", extra={"error": str(e)})
+
+    async def delete(self, session_id):
+        try:
+            await self.client.delete(self.prefix + session_id)
+        except Exception as e:
+            logger.warning("session.delete_failed", extra={"error": str(e)})
+
+    async def close(self):
+        # redis-py 5.0.1 renamed close() to aclose()
+        await getattr(self.client, "aclose", self.client.close)()
+
+
+_store = None
+
+
+def get_session_store():
+    """Process-wide store chosen by CHAT_SESSION_STORE ("memory" or "redis")"""
+    global _store
+    if _store is None:
+        _store = RedisSessionStore() if SESSION_STORE == "redis" else InMemorySessionStore()
+    return _store
+
+
+async def close_session_store():
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
@@ -0,0 +1,22 @@
+"""
+Versioned schemas for events exchanged over Kafka, shared by every service.
+
+Producers call ``encode(topic, payload, event_id)``; consumers call
+``decode(value)`` on messages where ``is_encoded(value)`` is true and treat
+anything else as legacy JSON.
+
+The package is imported from ``services/``, which the Docker image puts on
+``PYTHONPATH``; outside Docker, run the services with
+``PYTHONPATH=<repo>/services``.
+"""
+
+from .events import registry
+from .registry import MAGIC, Event, EventSchema, Field, SchemaError, SchemaRegistry, UnknownEvent, is_encoded
+
+encode = registry.encode
+decode = registry.decode
+
+__all__ = [
+    "MAGIC", "Event", "EventSchema", "Field", "SchemaError", "SchemaRegistry", "UnknownEvent",
+    "decode", "encode", "is_encoded", "registry",
+]
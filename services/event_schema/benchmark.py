@@ -0,0 +1,80 @@
+# event_schema/benchmark.py
+#
+# Payload size and encode/decode CPU per message, schema encoding vs the
+# JSON the services used to exchange:
+#
+#     cd services && python -m event_schema.benchmark --messages 50000
+
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from . import decode, encode, registry
+
+SAMPLE_VALUES = {
+    "str": lambda rng, name: f"{name}-{rng.randrange(10 ** 6)}",
+    "int": lambda rng, name: rng.randrange(10 ** 6),
+    "float": lambda rng, name: rng.random() * 1000,
+    "bool": lambda rng, name: rng.random() < 0.5,
+    "datetime": lambda rng, name: (datetime(2025, 1, 1, tzinfo=timezone.utc)
+                                   + timedelta(seconds=rng.randrange(10 ** 8), microseconds=rng.randrange(10 ** 6))
+                                   ).isoformat(),
+}
+
+
+def sample_payloads(name, count, rng):
+    schema = registry.get(name)
+    payloads = []
+    for _ in range(count):
+        payload = {f.name: SAMPLE_VALUES[f.type](rng, f.name) for f in schema.fields}
+        if "email" in payload:
+            payload["email"] = f"user{rng.randrange(10 ** 6)}@example.com"
+        payload["event_id"] = str(uuid.UUID(int=rng.getrandbits(128)))
+        payloads.append(payload)
+    return payloads
+
+
+def _cpu_us(fn, items):
+    started = time.process_time()
+    for item in items:
+        fn(item)
+    return (time.process_time() - started) / len(items) * 1e6
+
+
+def measure(name, payloads):
+    json_messages = [json.dumps(p).encode("utf-8") for p in payloads]
+    schema_messages = [encode(name, p) for p in payloads]
+    return {
+        "event": name,
+        "json_bytes": sum(map(len, json_messages)) / len(payloads),
+        "schema_bytes": sum(map(len, schema_messages)) / len(payloads),
+        "json_encode_us": _cpu_us(lambda p: json.dumps(p).encode("utf-8"), payloads),
+        "schema_encode_us": _cpu_us(lambda p: encode(name, p), payloads),
+        "json_decode_us": _cpu_us(lambda m: json.loads(m.decode("utf-8")), json_messages),
+        "schema_decode_us": _cpu_us(decode, schema_messages),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000, help="Messages per event type")
+    parser.add_argument("--events", default=",".join(registry.names()))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"{'event':<26}{'JSON B':>8}{'schema B':>10}{'size':>7}"
+          f"{'enc JSON us':>13}{'enc schema us':>15}{'dec JSON us':>13}{'dec schema us':>15}")
+    for name in args.events.split(","):
+        r = measure(name, sample_payloads(name, args.messages, rng))
+        print(f"{name:<26}{r['json_bytes']:>8.1f}{r['schema_bytes']:>10.1f}"
+              f"{r['schema_bytes'] / r['json_bytes']:>7.0%}"
+              f"{r['json_encode_us']:>13.2f}{r['schema_encode_us']:>15.2f}"
+              f"{r['json_decode_us']:>13.2f}{r['schema_decode_us']:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# event_schema/events.py
+#
+# Every inter-service event and its versions. Schema ids go on the wire and
+# must never be reused; evolve an event by registering another version that
+# appends optional fields.
+
+from .registry import Field, SchemaRegistry
+
+registry = SchemaRegistry()
+
+registry.register("user_signed_up", 1, [
+    Field("user_id", "str"),
+    Field("email", "str"),
+    Field("username", "str"),
+    Field("user_type", "str"),
+    Field("is_verified", "bool"),
+    Field("created_at", "datetime"),
+])
+
+registry.register("user_verified", 2, [
+    Field("user_id", "str"),
+    Field("email", "str"),
+    Field("username", "str"),
+    Field("user_type", "str"),
+    Field("verified_at", "datetime"),
+])
+
+registry.register("user_logged_in", 3, [
+    Field("user_id", "str"),
+    Field("email", "str"),
+    Field("username", "str"),
+    Field("user_type", "str"),
+    Field("login_time", "datetime", required=False),
+])
+
+registry.register("password_reset_requested", 4, [
+    Field("user_id", "str"),
+    Field("email", "str"),
+    Field("reset_token", "str"),
+    Field("username", "str", required=False),
+])
+
+registry.register("hearing_scheduled", 5, [
+    Field("user_id", "str"),
+    Field("email", "str"),
+    Field("case_number", "str"),
+    Field("hearing_date", "str"),
+])
@@ -0,0 +1,212 @@
+# event_schema/registry.py
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import msgpack
+
+# Never produced by msgpack itself and not valid as the start of JSON text,
+# so a consumer can tell schema-encoded messages from legacy JSON ones
+MAGIC = b"\xc1"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class SchemaError(ValueError):
+    """A payload does not match its event schema"""
+
+
+class UnknownEvent(SchemaError):
+    """No schema is registered for an event name or id"""
+
+
+def _encode_datetime(value):
+    # Microseconds since the epoch: 5-9 bytes on the wire instead of a 32-character ISO string
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _decode_datetime(value):
+    return (_EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def _format_uuid(raw: bytes) -> str:
+    # str(uuid.UUID(bytes=raw)) without building the UUID object
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+# type name -> (types accepted on encode, encoder, types accepted on decode, decoder)
+FIELD_TYPES = {
+    "str": ((str,), None, (str,), None),
+    "int": ((int,), None, (int,), None),
+    "float": ((int, float), float, (int, float), float),
+    "bool": ((bool,), None, (bool,), None),
+    "datetime": ((datetime, str), _encode_datetime, (int,), _decode_datetime),
+}
+
+
+class Field(NamedTuple):
+    name: str
+    type: str
+    required: bool = True
+    default: Any = None
+
+
+class Event(NamedTuple):
+    """A decoded event; ``data`` holds the fields of the latest schema version this process knows"""
+    name: str
+    version: int
+    event_id: Optional[str]
+    data: Dict[str, Any]
+
+
+class EventSchema:
+    """
+    One version of an event. Fields are encoded positionally, so names are
+    never sent; a new version may only append optional fields, which keeps
+    old messages readable by new consumers and new messages readable by old
+    ones (they ignore the extra trailing values).
+    """
+
+    def __init__(self, name: str, schema_id: int, version: int, fields: List[Field]):
+        unknown = [f.type for f in fields if f.type not in FIELD_TYPES]
+        if unknown:
+            raise SchemaError(f"{name} v{version}: unknown field types {unknown}")
+        self.name = name
+        self.schema_id = schema_id
+        self.version = version
+        self.fields = list(fields)
+        self.required = sum(1 for f in fields if f.required)
+        self._encoders = [(f, *FIELD_TYPES[f.type][:2]) for f in fields]
+        self._decoders = [(f, *FIELD_TYPES[f.type][2:]) for f in fields]
+        # Fast path for a complete message with no nulls: one isinstance per field, then zip
+        self._names = [f.name for f in fields]
+        self._types = [FIELD_TYPES[f.type][2] for f in fields]
+        self._converters = [(f.name, FIELD_TYPES[f.type][3]) for f in fields if FIELD_TYPES[f.type][3]]
+
+    def encode_values(self, payload: Dict[str, Any]) -> list:
+        values = []
+        for field, accepted, convert in self._encoders:
+            value = payload.get(field.name, field.default)
+            if value is None:
+                if field.required:
+                    raise SchemaError(f"{self.name}: missing required field {field.name!r}")
+            elif not isinstance(value, accepted) or (field.type == "int" and isinstance(value, bool)):
+                raise SchemaError(f"{self.name}: field {field.name!r} expects {field.type}, "
+                                  f"got {type(value).__name__}")
+            elif convert is not None:
+                try:
+                    value = convert(value)
+                except ValueError as e:
+                    raise SchemaError(f"{self.name}: field {field.name!r}: {e}") from None
+            values.append(value)
+        return values
+
+    def decode_values(self, values: list) -> Dict[str, Any]:
+        if len(values) >= len(self._names) and all(map(isinstance, values, self._types)):
+            data = dict(zip(self._names, values))
+            for name, convert in self._converters:
+                data[name] = convert(data[name])
+            return data
+        if len(values) < self.required:
+            raise SchemaError(f"{self.name}: expected at least {self.required} fields, got {len(values)}")
+        data = {}
+        count = len(values)
+        for i, (field, accepted, convert) in enumerate(self._decoders):
+            value = values[i] if i < count else field.default
+            if value is None:
+                if field.required:
+                    raise SchemaError(f"{self.name}: missing required field {field.name!r}")
+            elif not isinstance(value, accepted):
+                raise SchemaError(f"{self.name}: field {field.name!r} expects {field.type}, "
+                                  f"got {type(value).__name__}")
+            elif convert is not None:
+                value = convert(value)
+            data[field.name] = value
+        return data
+
+
+class SchemaRegistry:
+    """
+    Event schemas by name and by the small integer id that goes on the wire.
+
+    Message layout: ``MAGIC`` followed by the msgpack array
+    ``[schema_id, version, event_id (16 bytes or nil), *field values]``.
+    """
+
+    def __init__(self):
+        self._latest = {}   # name -> EventSchema
+        self._by_id = {}    # schema_id -> EventSchema (latest version)
+        self._versions = {}  # (name, version) -> EventSchema
+
+    def register(self, name: str, schema_id: int, fields: List[Field]) -> EventSchema:
+        """Register the next version of ``name``; versions count up from 1"""
+        previous = self._latest.get(name)
+        if previous is None:
+            if schema_id in self._by_id:
+                raise SchemaError(f"Schema id {schema_id} is already used by {self._by_id[schema_id].name}")
+            version = 1
+        else:
+            if schema_id != previous.schema_id:
+                raise SchemaError(f"{name} keeps schema id {previous.schema_id} across versions")
+            if fields[:len(previous.fields)] != previous.fields or any(
+                    f.required for f in fields[len(previous.fields):]):
+                raise SchemaError(f"{name}: a new version may only append optional fields")
+            version = previous.version + 1
+        schema = EventSchema(name, schema_id, version, fields)
+        self._latest[name] = schema
+        self._by_id[schema_id] = schema
+        self._versions[(name, version)] = schema
+        return schema
+
+    def get(self, name: str, version: Optional[int] = None) -> EventSchema:
+        schema = self._latest.get(name) if version is None else self._versions.get((name, version))
+        if schema is None:
+            raise UnknownEvent(f"No schema registered for {name}" + (f" v{version}" if version else ""))
+        return schema
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._latest
+
+    def names(self) -> List[str]:
+        return sorted(self._latest)
+
+    def encode(self, name: str, payload: Dict[str, Any], event_id=None) -> bytes:
+        schema = self.get(name)
+        if event_id is None:
+            event_id = payload.get("event_id")
+        if event_id is not None and not isinstance(event_id, uuid.UUID):
+            event_id = uuid.UUID(str(event_id))
+        values = [schema.schema_id, schema.version, event_id.bytes if event_id else None]
+        values.extend(schema.encode_values(payload))
+        return MAGIC + msgpack.packb(values, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Event:
+        if not is_encoded(data):
+            raise SchemaError("Not a schema-encoded event")
+        try:
+            values = msgpack.unpackb(memoryview(data)[1:], raw=False, strict_map_key=True)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise SchemaError(f"Malformed event: {e}") from None
+        if not isinstance(values, list) or len(values) < 3:
+            raise SchemaError("Malformed event header")
+        schema_id, version, raw_id = values[0], values[1], values[2]
+        if type(schema_id) is not int or type(version) is not int:
+            raise SchemaError("Malformed event header: schema id and version must be integers")
+        schema = self._by_id.get(schema_id)
+        if schema is None:
+            raise UnknownEvent(f"No schema registered for id {schema_id!r}")
+        if raw_id is not None and not (isinstance(raw_id, bytes) and len(raw_id) == 16):
+            raise SchemaError(f"{schema.name}: malformed event id")
+        event_id = _format_uuid(raw_id) if raw_id is not None else None
+        return Event(schema.name, version, event_id, schema.decode_values(values[3:]))
+
+
+def is_encoded(data) -> bool:
+    return data[:1] == MAGIC
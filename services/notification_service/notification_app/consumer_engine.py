@@ -0,0 +1,259 @@
+import logging
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from confluent_kafka import Consumer, KafkaError, KafkaException, Producer, TopicPartition
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Headers a dead-lettered message carries, read back by replay_dead_letters
+DLQ_TOPIC_HEADER = 'dlq.topic'
+DLQ_PARTITION_HEADER = 'dlq.partition'
+DLQ_OFFSET_HEADER = 'dlq.offset'
+DLQ_ERROR_HEADER = 'dlq.error'
+DLQ_ATTEMPTS_HEADER = 'dlq.attempts'
+
+
+class PermanentError(Exception):
+    """Raised by a handler when retrying cannot help, e.g. a malformed event; the message is dead-lettered at once"""
+
+
+class DeadLetterError(Exception):
+    """Failed messages could not be written to the dead-letter topic, so the batch must not be committed"""
+
+
+def ordering_key(msg):
+    """
+    Messages with the same key are handled in order, one at a time; producers
+    key user events by user_id. Unkeyed messages carry no ordering promise
+    and are handled independently.
+    """
+    key = msg.key()
+    return (msg.topic(), key) if key is not None else None
+
+
+def group_by_key(messages) -> List[list]:
+    """Split a batch into lanes that keep each key's messages in offset order"""
+    lanes, by_key = [], {}
+    for msg in messages:
+        key = ordering_key(msg)
+        if key is None:
+            lanes.append([msg])
+        elif key in by_key:
+            by_key[key].append(msg)
+        else:
+            by_key[key] = lane = [msg]
+            lanes.append(lane)
+    return lanes
+
+
+class ConsumerEngine:
+    """
+    Fetches messages in batches with ``consume(num_messages=...)`` and runs
+    ``handler`` on a pool of worker threads. A batch is split into per-key
+    lanes; lanes run concurrently and each lane runs its messages in order.
+    The next batch is fetched once every lane of the current one has
+    finished, so a key's messages from consecutive batches never overlap.
+
+    Offsets are committed by hand, once per batch and only after every
+    message in it was either handled or written to the dead-letter topic:
+    delivery is at-least-once, and a crash redelivers the uncommitted batch.
+    A failing message is retried with exponential backoff, up to
+    ``max_retries`` times (``PermanentError`` skips the retries), then
+    dead-lettered with its origin and error in headers. Backoff sleeps share
+    a per-batch budget (``KAFKA_CONSUMER_RETRY_BUDGET``) that keeps the time
+    between polls below ``max.poll.interval.ms``; a message whose next retry
+    would overrun it is dead-lettered instead.
+
+    ``housekeeping``, if given, is called from the poll loop at start-up
+    and then every ``KAFKA_CONSUMER_HOUSEKEEPING_INTERVAL`` seconds.
+
+    Several engines (processes) with the same ``group.id`` share the
+    subscribed partitions through the group rebalance.
+    """
+
+    def __init__(self, handler: Callable, config: dict, batch_size: Optional[int] = None,
+                 workers: Optional[int] = None, poll_timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None, dlq_topic: Optional[str] = None,
+                 housekeeping: Optional[Callable] = None):
+        self.handler = handler
+        self.config = dict(config, **{'enable.auto.commit': False})
+        self.batch_size = batch_size or getattr(settings, 'KAFKA_CONSUMER_BATCH_SIZE', 100)
+        self.workers = workers or getattr(settings, 'KAFKA_CONSUMER_WORKERS', 8)
+        self.poll_timeout = poll_timeout or getattr(settings, 'KAFKA_CONSUMER_POLL_TIMEOUT', 1.0)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'KAFKA_CONSUMER_MAX_RETRIES', 3)
+        self.retry_backoff = getattr(settings, 'KAFKA_CONSUMER_RETRY_BACKOFF', 0.5)
+        self.retry_backoff_max = getattr(settings, 'KAFKA_CONSUMER_RETRY_BACKOFF_MAX', 30.0)
+        self.retry_budget = getattr(settings, 'KAFKA_CONSUMER_RETRY_BUDGET', 60.0)
+        max_poll_interval = self.config.get('max.poll.interval.ms', 300000) / 1000
+        if self.retry_budget >= max_poll_interval:
+            raise ValueError(f"KAFKA_CONSUMER_RETRY_BUDGET ({self.retry_budget}s) must be below "
+                             f"max.poll.interval.ms ({max_poll_interval:.0f}s)")
+        self.housekeeping = housekeeping
+        self.housekeeping_interval = getattr(settings, 'KAFKA_CONSUMER_HOUSEKEEPING_INTERVAL', 3600.0)
+        self.dlq_topic = dlq_topic or getattr(settings, 'KAFKA_DLQ_TOPIC', 'notification_service.dlq')
+        self.consumer = None
+        self.producer = None
+        self.running = False
+        self.handled = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self._dlq_errors = []
+        self._retry_deadline = 0.0
+        self._stats_lock = threading.Lock()
+
+    def run(self, topics: List[str]):
+        self.consumer = Consumer(self.config)
+        self.producer = Producer({'bootstrap.servers': self.config['bootstrap.servers']})
+        self.consumer.subscribe(topics)
+        self.running = True
+        logger.info(f"Consuming {topics} in batches of {self.batch_size} with {self.workers} workers")
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='kafka-worker') as pool:
+            next_housekeeping = time.monotonic()
+            try:
+                while self.running:
+                    if self.housekeeping is not None and time.monotonic() >= next_housekeeping:
+                        self.run_housekeeping()
+                        next_housekeeping = time.monotonic() + self.housekeeping_interval
+                    messages = self.consumer.consume(num_messages=self.batch_size, timeout=self.poll_timeout)
+                    batch = [m for m in messages if self._usable(m)]
+                    if batch:
+                        self.process_batch(pool, batch)
+                        self.commit(batch)
+            finally:
+                self.consumer.close()
+                self.producer.flush(10)
+                logger.info(f"Kafka consumer closed; handled {self.handled}, failed {self.failed}, "
+                            f"dead-lettered {self.dead_lettered}")
+
+    def stop(self):
+        """Finish the batch in hand, then close"""
+        self.running = False
+
+    def run_housekeeping(self):
+        close_old_connections()
+        try:
+            self.housekeeping()
+        except Exception as e:
+            logger.error(f"Consumer housekeeping failed: {e}")
+        finally:
+            close_old_connections()
+
+    def _usable(self, msg) -> bool:
+        error = msg.error()
+        if error is None:
+            return True
+        if error.code() == KafkaError._PARTITION_EOF:
+            logger.debug(f"End of partition reached {msg.topic()} [{msg.partition()}] at offset {msg.offset()}")
+        else:
+            logger.error(f"Consumer error: {error}")
+        return False
+
+    def process_batch(self, pool, batch):
+        started = time.perf_counter()
+        self._retry_deadline = time.monotonic() + self.retry_budget
+        lanes = group_by_key(batch)
+        # list() waits for every lane; run_lane never raises
+        list(pool.map(self.run_lane, lanes))
+        # Delivery callbacks run inside flush(); only then are dead-letter failures known
+        undelivered = self.producer.flush(10)
+        if undelivered or self._dlq_errors:
+            errors, self._dlq_errors = self._dlq_errors or [f"{undelivered} still queued"], []
+            self.running = False
+            raise DeadLetterError(f"Could not dead-letter {len(errors)} messages: {errors[0]}")
+        logger.debug(f"Handled batch of {len(batch)} messages in {len(lanes)} lanes "
+                     f"in {time.perf_counter() - started:.3f}s")
+
+    def run_lane(self, lane):
+        close_old_connections()
+        try:
+            for msg in lane:
+                ok = self.handle_with_retry(msg)
+                with self._stats_lock:
+                    if ok:
+                        self.handled += 1
+                    else:
+                        self.failed += 1
+        finally:
+            close_old_connections()
+
+    def handle_with_retry(self, msg) -> bool:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.handler(msg)
+                return True
+            except PermanentError as e:
+                error = e
+                break
+            except Exception as e:
+                error = e
+                if attempt > self.max_retries:
+                    break
+                delay = min(self.retry_backoff_max, self.retry_backoff * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.0)
+                if time.monotonic() + delay > self._retry_deadline:
+                    logger.warning(f"Retry budget of the batch is spent; not retrying {msg.topic()} "
+                                   f"[{msg.partition()}] at offset {msg.offset()}")
+                    break
+                logger.warning(f"Attempt {attempt} failed for {msg.topic()} [{msg.partition()}] "
+                               f"at offset {msg.offset()}: {e}; retrying in {delay:.2f}s")
+                time.sleep(delay)
+        logger.error(f"Error processing message from {msg.topic()} [{msg.partition()}] at offset "
+                     f"{msg.offset()} after {attempt} attempts: {error}; sending to {self.dlq_topic}")
+        self.dead_letter(msg, error, attempt)
+        return False
+
+    def dead_letter(self, msg, error, attempts):
+        headers = [
+            (DLQ_TOPIC_HEADER, msg.topic()),
+            (DLQ_PARTITION_HEADER, str(msg.partition())),
+            (DLQ_OFFSET_HEADER, str(msg.offset())),
+            (DLQ_ERROR_HEADER, f"{type(error).__name__}: {error}"[:1000]),
+            (DLQ_ATTEMPTS_HEADER, str(attempts)),
+        ]
+        try:
+            self.producer.produce(self.dlq_topic, value=msg.value(), key=msg.key(), headers=headers,
+                                  on_delivery=self._dead_lettered)
+        except (BufferError, KafkaException) as e:
+            self._dlq_errors.append(str(e))
+
+    def _dead_lettered(self, err, msg):
+        if err is not None:
+            self._dlq_errors.append(str(err))
+        else:
+            with self._stats_lock:
+                self.dead_lettered += 1
+
+    def commit(self, batch):
+        """Commit the offset after the last message of each partition in the batch"""
+        last = {}
+        for msg in batch:
+            tp = (msg.topic(), msg.partition())
+            last[tp] = max(last.get(tp, -1), msg.offset())
+        try:
+            self.consumer.commit(offsets=[TopicPartition(t, p, o + 1) for (t, p), o in last.items()],
+                                 asynchronous=False)
+        except KafkaException as e:
+            # e.g. the partitions were revoked; the batch is redelivered and idempotency keys skip done work
+            logger.warning(f"Offset commit failed: {e}")
+
+
+def run_consumer_process(topics, batch_size=None, workers=None):
+    """Entry point of one consumer process started by ``consume_notifications --processes``"""
+    import django
+    django.setup()
+    from .kafka_consumer import KafkaConsumer
+
+    consumer = KafkaConsumer()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: consumer.stop_consuming())
+    consumer.start_consuming(topics, batch_size=batch_size, workers=workers)
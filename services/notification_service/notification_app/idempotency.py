@@ -0,0 +1,45 @@
+import logging
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import ProcessedEvent
+
+logger = logging.getLogger(__name__)
+
+
+def is_processed(key: str) -> bool:
+    return ProcessedEvent.objects.filter(key=key).exists()
+
+
+def mark_processed(key: str, topic: str = ''):
+    try:
+        ProcessedEvent.objects.create(key=key, topic=topic)
+    except IntegrityError:
+        # Another delivery finished the same work first
+        pass
+
+
+def run_once(key: str, action: Callable, topic: str = ''):
+    """
+    Run ``action`` unless ``key`` is recorded as done, and record it once
+    ``action`` returns. A crash in between repeats the action on redelivery,
+    so this narrows duplicates to that window rather than ruling them out.
+    """
+    if is_processed(key):
+        logger.info(f"Skipping {key}: already done")
+        return None
+    result = action()
+    mark_processed(key, topic)
+    return result
+
+
+def purge_processed(older_than: timedelta = None) -> int:
+    """Forget keys older than the longest a message can plausibly be redelivered after"""
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, 'KAFKA_IDEMPOTENCY_RETENTION_DAYS', 7))
+    deleted, _ = ProcessedEvent.objects.filter(processed_at__lt=timezone.now() - older_than).delete()
+    return deleted
@@ -1,4 +1,9 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from notification_app.consumer_engine import run_consumer_process
 from notification_app.kafka_consumer import KafkaConsumer
 
 
@@ -11,10 +16,26 @@ class Command(BaseCommand):
             type=str,
             help='Comma-separated list of topics to consume from',
         )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=getattr(settings, 'KAFKA_CONSUMER_PROCESSES', 1),
+            help='Consumer processes to run in the same consumer group',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'KAFKA_CONSUMER_WORKERS', 8),
+            help='Handler threads per process',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'KAFKA_CONSUMER_BATCH_SIZE', 100),
+            help='Messages fetched per consume() call',
+        )
 
     def handle(self, *args, **options):
-        consumer = KafkaConsumer()
-        
         topics = options.get('topics')
         if topics:
             topics = topics.split(',')
@@ -26,9 +47,45 @@ class Command(BaseCommand):
                 self.style.SUCCESS('Starting Kafka consumer for all notification topics')
             )
         
+        if options['processes'] > 1:
+            self.run_processes(topics, options)
+            return
+
+        consumer = KafkaConsumer()
         try:
-            consumer.start_consuming(topics)
+            consumer.start_consuming(topics, batch_size=options['batch_size'], workers=options['workers'])
         except KeyboardInterrupt:
             self.stdout.write(
                 self.style.WARNING('Kafka consumer stopped by user')
             )
+
+    def run_processes(self, topics, options):
+        # Spawned rather than forked: each child builds its own Kafka client and DB connections
+        context = multiprocessing.get_context('spawn')
+        processes = [
+            context.Process(
+                target=run_consumer_process,
+                args=(topics, options['batch_size'], options['workers']),
+                name=f'notification-consumer-{i}',
+            )
+            for i in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f'Started {len(processes)} consumer processes in group '
+                          f'{getattr(settings, "KAFKA_CONSUMER_GROUP", "notification_service")}')
+
+        def forward(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for process in processes:
+            process.join()
+        failed = [p.name for p in processes if p.exitcode not in (0, -signal.SIGTERM)]
+        if failed:
+            self.stdout.write(self.style.ERROR(f'Consumer processes exited abnormally: {failed}'))
+        else:
+            self.stdout.write(self.style.WARNING('Kafka consumers stopped'))
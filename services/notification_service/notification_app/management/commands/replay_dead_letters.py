@@ -0,0 +1,82 @@
+import time
+
+from confluent_kafka import Consumer, KafkaException, Producer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from notification_app.consumer_engine import (
+    DLQ_ATTEMPTS_HEADER, DLQ_ERROR_HEADER, DLQ_OFFSET_HEADER, DLQ_TOPIC_HEADER,
+)
+
+
+class Command(BaseCommand):
+    help = ('Republish dead-lettered notification events to their original topics. '
+            'Progress is committed in a dedicated consumer group, so each message is replayed once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topic', help='Only replay messages that came from this topic')
+        parser.add_argument('--limit', type=int, help='Stop after this many messages')
+        parser.add_argument('--dry-run', action='store_true', help='List messages without replaying or committing')
+        parser.add_argument('--idle-timeout', type=float, default=5.0,
+                            help='Stop once no message has arrived for this many seconds')
+        parser.add_argument('--group', default=f"{getattr(settings, 'KAFKA_CONSUMER_GROUP', 'notification_service')}.dlq-replay")
+
+    def handle(self, *args, **options):
+        servers = getattr(settings, 'KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
+        dlq_topic = getattr(settings, 'KAFKA_DLQ_TOPIC', 'notification_service.dlq')
+        consumer = Consumer({
+            'bootstrap.servers': servers,
+            'group.id': options['group'],
+            'auto.offset.reset': 'earliest',
+            'enable.auto.commit': False,
+        })
+        producer = Producer({'bootstrap.servers': servers})
+        consumer.subscribe([dlq_topic])
+
+        replayed = skipped = 0
+        # A partition with a filtered-out message keeps its offset there, so that message stays
+        # in the queue; anything replayed after it may be replayed again by a later run
+        held = set()
+        last_message = time.monotonic()
+        try:
+            while options['limit'] is None or replayed < options['limit']:
+                msg = consumer.poll(timeout=1.0)
+                if msg is None:
+                    if time.monotonic() - last_message > options['idle_timeout']:
+                        break
+                    continue
+                if msg.error():
+                    self.stderr.write(f'Consumer error: {msg.error()}')
+                    continue
+                last_message = time.monotonic()
+
+                headers = {k: v.decode('utf-8', 'replace') for k, v in (msg.headers() or []) if v is not None}
+                origin = headers.get(DLQ_TOPIC_HEADER)
+                described = (f'{origin} offset {headers.get(DLQ_OFFSET_HEADER)} '
+                             f'({headers.get(DLQ_ATTEMPTS_HEADER)} attempts): {headers.get(DLQ_ERROR_HEADER)}')
+                if origin is None:
+                    self.stderr.write(f'Skipping message at offset {msg.offset()} without {DLQ_TOPIC_HEADER} header')
+                    skipped += 1
+                elif options['topic'] and origin != options['topic']:
+                    held.add(msg.partition())
+                    skipped += 1
+                    continue
+                elif options['dry_run']:
+                    self.stdout.write(f'Would replay {described}')
+                    replayed += 1
+                    continue
+                else:
+                    producer.produce(origin, value=msg.value(), key=msg.key())
+                    # The replayed copy must be on the broker before the DLQ offset moves past it
+                    if producer.flush(10) > 0:
+                        raise CommandError(f'Timed out republishing {described}')
+                    self.stdout.write(f'Replayed {described}')
+                    replayed += 1
+                if not options['dry_run'] and msg.partition() not in held:
+                    consumer.commit(message=msg, asynchronous=False)
+        except KafkaException as e:
+            raise CommandError(f'Replay failed: {e}')
+        finally:
+            consumer.close()
+
+        verb = 'Would replay' if options['dry_run'] else 'Replayed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {replayed} messages, skipped {skipped}'))
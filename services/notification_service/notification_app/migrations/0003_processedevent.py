@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-17 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification_app', '0002_alter_notification_user_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True)),
+                ('topic', models.CharField(blank=True, max_length=100)),
+                ('processed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Processed Event',
+                'verbose_name_plural': 'Processed Events',
+            },
+        ),
+    ]
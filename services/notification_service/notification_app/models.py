@@ -151,3 +151,21 @@ class NotificationPreference(models.Model):
     class Meta:
         verbose_name = "Notification Preference"
         verbose_name_plural = "Notification Preferences"
+
+
+class ProcessedEvent(models.Model):
+    """
+    Idempotency keys of event work already done: the event_id of a handled
+    Kafka message, or ``<event_id>:<step>`` for each side effect of a
+    handler, so redelivered messages skip what has been done already
+    """
+    key = models.CharField(max_length=200, unique=True)
+    topic = models.CharField(max_length=100, blank=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.key} ({self.topic})"
+    
+    class Meta:
+        verbose_name = "Processed Event"
+        verbose_name_plural = "Processed Events"
@@ -1,3 +1,147 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from .consumer_engine import (
+    DLQ_ATTEMPTS_HEADER, DLQ_OFFSET_HEADER, DLQ_TOPIC_HEADER, ConsumerEngine, DeadLetterError, PermanentError,
+)
+
+
+class FakeMessage:
+    def __init__(self, topic, partition, offset, key=None, value=b'{}'):
+        self._topic, self._partition, self._offset = topic, partition, offset
+        self._key, self._value = key, value
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def error(self):
+        return None
+
+
+class FakeProducer:
+    """Records produced messages and reports them delivered on flush, or failed if ``fail`` is set"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.produced = []
+        self._pending = []
+
+    def produce(self, topic, value=None, key=None, headers=None, on_delivery=None):
+        self.produced.append({'topic': topic, 'value': value, 'key': key, 'headers': dict(headers or [])})
+        self._pending.append(on_delivery)
+
+    def flush(self, timeout=None):
+        pending, self._pending = self._pending, []
+        for callback in pending:
+            callback('broker unavailable' if self.fail else None, None)
+        return 0
+
+
+class FakeConsumer:
+    def __init__(self):
+        self.commits = []
+
+    def commit(self, offsets=None, asynchronous=True):
+        self.commits.append(sorted((tp.topic, tp.partition, tp.offset) for tp in offsets))
+
+
+@override_settings(KAFKA_CONSUMER_RETRY_BACKOFF=0.0, KAFKA_CONSUMER_RETRY_BACKOFF_MAX=0.0)
+class ConsumerEngineTests(SimpleTestCase):
+    def make_engine(self, handler, max_retries=2, producer=None):
+        engine = ConsumerEngine(handler, {'bootstrap.servers': 'localhost:9092'}, workers=4,
+                                max_retries=max_retries, dlq_topic='test.dlq')
+        engine.consumer = FakeConsumer()
+        engine.producer = producer or FakeProducer()
+        return engine
+
+    def run_batch(self, engine, batch):
+        with ThreadPoolExecutor(max_workers=engine.workers) as pool:
+            engine.process_batch(pool, batch)
+        engine.commit(batch)
+
+    def test_commits_offset_after_last_message_of_each_partition(self):
+        engine = self.make_engine(lambda msg: None)
+        batch = [FakeMessage('users', 0, 5), FakeMessage('users', 1, 2),
+                 FakeMessage('users', 0, 7), FakeMessage('orders', 0, 1)]
+        self.run_batch(engine, batch)
+
+        self.assertEqual(engine.consumer.commits, [[('orders', 0, 2), ('users', 0, 8), ('users', 1, 3)]])
+        self.assertEqual(engine.handled, 4)
+        self.assertEqual(engine.producer.produced, [])
+
+    def test_same_key_messages_run_in_offset_order(self):
+        seen = []
+        engine = self.make_engine(lambda msg: seen.append(msg.offset()))
+        batch = [FakeMessage('users', 0, offset, key=b'user-1') for offset in range(20)]
+        self.run_batch(engine, batch)
+
+        self.assertEqual(seen, list(range(20)))
+
+    def test_transient_failure_is_retried(self):
+        attempts = []
+
+        def handler(msg):
+            attempts.append(msg.offset())
+            if len(attempts) < 3:
+                raise RuntimeError('database is locked')
+
+        engine = self.make_engine(handler, max_retries=2)
+        self.run_batch(engine, [FakeMessage('users', 0, 0)])
+
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual((engine.handled, engine.failed, engine.dead_lettered), (1, 0, 0))
+        self.assertEqual(engine.producer.produced, [])
+
+    def test_exhausted_retries_dead_letter_the_message(self):
+        def handler(msg):
+            raise RuntimeError('smtp down')
+
+        engine = self.make_engine(handler, max_retries=2)
+        self.run_batch(engine, [FakeMessage('users', 3, 41, key=b'user-1', value=b'{"a": 1}')])
+
+        self.assertEqual((engine.handled, engine.failed, engine.dead_lettered), (0, 1, 1))
+        [dead] = engine.producer.produced
+        self.assertEqual((dead['topic'], dead['key'], dead['value']), ('test.dlq', b'user-1', b'{"a": 1}'))
+        self.assertEqual(dead['headers'][DLQ_TOPIC_HEADER], 'users')
+        self.assertEqual(dead['headers'][DLQ_OFFSET_HEADER], '41')
+        self.assertEqual(dead['headers'][DLQ_ATTEMPTS_HEADER], '3')
+        # Dead-lettered messages count as done, so the batch is still committed
+        self.assertEqual(engine.consumer.commits, [[('users', 3, 42)]])
+
+    def test_permanent_error_skips_retries(self):
+        attempts = []
+
+        def handler(msg):
+            attempts.append(msg.offset())
+            raise PermanentError('malformed event')
+
+        engine = self.make_engine(handler, max_retries=5)
+        self.run_batch(engine, [FakeMessage('users', 0, 0)])
+
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(engine.producer.produced[0]['headers'][DLQ_ATTEMPTS_HEADER], '1')
+
+    def test_failed_dead_letter_blocks_commit(self):
+        def handler(msg):
+            raise PermanentError('malformed event')
+
+        engine = self.make_engine(handler, producer=FakeProducer(fail=True))
+        engine.running = True
+        with self.assertRaises(DeadLetterError):
+            self.run_batch(engine, [FakeMessage('users', 0, 0)])
+
+        self.assertFalse(engine.running)
+        self.assertEqual(engine.consumer.commits, [])
@@ -198,6 +198,7 @@ class NotificationService:
             if not preferences.welcome_emails:
                 return {
                     'success': False,
+                    'skipped': True,
                     'message': 'User has disabled welcome emails'
                 }
             
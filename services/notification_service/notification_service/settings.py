@@ -137,6 +137,18 @@ DEFAULT_FROM_EMAIL = 'tashwani475@gmail.com'  # Add your from email
 # Kafka Settings
 KAFKA_BOOTSTRAP_SERVERS = 'localhost:9092'
 KAFKA_CONSUMER_GROUP = 'notification_service'
+KAFKA_CONSUMER_PROCESSES = 1     # consume_notifications --processes
+KAFKA_CONSUMER_WORKERS = 8       # handler threads per process
+KAFKA_CONSUMER_BATCH_SIZE = 100  # messages per consume() call
+KAFKA_CONSUMER_POLL_TIMEOUT = 1.0
+KAFKA_CONSUMER_MAX_RETRIES = 3       # retries before a message is dead-lettered
+KAFKA_CONSUMER_RETRY_BACKOFF = 0.5    # seconds, doubled per attempt
+KAFKA_CONSUMER_RETRY_BACKOFF_MAX = 30.0
+KAFKA_CONSUMER_RETRY_BUDGET = 60.0         # seconds of backoff per batch; must stay below max.poll.interval.ms
+KAFKA_CONSUMER_MAX_POLL_INTERVAL_MS = 300000
+KAFKA_CONSUMER_HOUSEKEEPING_INTERVAL = 3600.0  # seconds between idempotency key purges
+KAFKA_DLQ_TOPIC = 'notification_service.dlq'
+KAFKA_IDEMPOTENCY_RETENTION_DAYS = 7
 
 # Platform Settings
 FRONTEND_BASE_URL = 'http://localhost:3000'
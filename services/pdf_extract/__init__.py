@@ -0,0 +1,11 @@
+"""
+Parallel PDF page extraction shared by the services that read uploaded
+filings (auth_service's ingestion and chatpdf_service).
+
+Like ``event_schema``, the package is imported from ``services/``, which
+the Docker image puts on ``PYTHONPATH``.
+"""
+
+from .pages import count_pdf_pages, get_extraction_pool, iter_pdf_pages
+
+__all__ = ["count_pdf_pages", "get_extraction_pool", "iter_pdf_pages"]
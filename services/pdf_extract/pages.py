@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+from pypdf import PdfReader
+
+_process_pool = None
+_process_pool_workers = 1
+_process_pool_lock = threading.Lock()
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """Extract pages [start, end) of a PDF; runs inside a pool process"""
+    reader = PdfReader(pdf_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """
+    Shared process pool for page extraction, created once per process with
+    PDF_EXTRACT_PROCESSES workers (one per CPU when unset). Uses the spawn
+    start method because it is created from threaded web workers, where a
+    forked child could inherit a lock held by another thread.
+    """
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = int(os.getenv("PDF_EXTRACT_PROCESSES", "0")) or os.cpu_count() or 1
+            _process_pool_workers = workers
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    return len(PdfReader(pdf_path).pages)
+
+
+def iter_pdf_pages(pdf_path: str, pages_per_task: int = 16,
+                   max_in_flight: Optional[int] = None,
+                   parallel: Optional[bool] = None) -> Iterator[str]:
+    """
+    Yield the text of each page in order.
+
+    Page ranges of ``pages_per_task`` pages are extracted concurrently in
+    the shared process pool. At most ``max_in_flight`` ranges are
+    outstanding at a time, so only a bounded window of pages is held in
+    memory however large the document is, and ranges not yet started are
+    cancelled if the caller stops reading early. Small documents are
+    extracted in-process, where pool overhead would dominate.
+    """
+    reader = PdfReader(pdf_path)
+    total = len(reader.pages)
+    if parallel is None:
+        parallel = total > pages_per_task
+    if not parallel:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+    del reader
+
+    pool = get_extraction_pool()
+    if max_in_flight is None:
+        max_in_flight = 2 * _process_pool_workers
+    ranges = iter([(s, min(s + pages_per_task, total)) for s in range(0, total, pages_per_task)])
+    pending = []
+    try:
+        for start, end in ranges:
+            pending.append(pool.submit(_extract_page_range, pdf_path, start, end))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            pages = pending.pop(0).result()
+            nxt = next(ranges, None)
+            if nxt is not None:
+                pending.append(pool.submit(_extract_page_range, pdf_path, *nxt))
+            yield from pages
+    finally:
+        # The consumer stopped early (an error, or the generator was closed):
+        # don't leave the shared pool extracting pages nobody will read
+        for future in pending:
+            future.cancel()